@@ -0,0 +1,204 @@
+"""
+Admission control: per-client rate limiting and load shedding.
+
+- Every request except health checks and metrics scrapes takes a token from
+  its client's bucket (`RATE_LIMIT_RPS` / `RATE_LIMIT_BURST`); routes in the
+  LLM pool also take one from a stricter LLM bucket. Clients are identified
+  by `X-API-Key` when it is one of the configured `RATE_LIMIT_API_KEYS`,
+  otherwise by address (`TRUSTED_PROXIES` says how many proxy hops of
+  X-Forwarded-For to trust). Unknown keys are ignored, so a client cannot
+  mint fresh buckets by sending a new key per request. Empty bucket -> 429.
+- Views decorated with `@limit('llm')` or `@limit('cpu')` run in a bounded
+  pool of concurrent slots. A request waits for a slot only while the
+  expected queueing delay fits the pool's latency budget; otherwise, or when
+  the queue is full, it is shed at once with 503. Slow LLM traffic therefore
+  cannot starve the cheap routes of worker threads.
+
+Both responses carry `Retry-After`. All state is per worker process, so the
+effective limits scale with the number of gunicorn workers.
+"""
+
+import hashlib
+import math
+import os
+import threading
+import time
+from collections import OrderedDict
+from functools import wraps
+
+from flask import current_app, jsonify, request
+
+import metrics
+
+RATE_LIMIT_RPS = float(os.getenv('RATE_LIMIT_RPS', '10'))
+RATE_LIMIT_BURST = float(os.getenv('RATE_LIMIT_BURST', '30'))
+LLM_RATE_LIMIT_RPS = float(os.getenv('LLM_RATE_LIMIT_RPS', '0.5'))
+LLM_RATE_LIMIT_BURST = float(os.getenv('LLM_RATE_LIMIT_BURST', '5'))
+TRUSTED_PROXIES = int(os.getenv('TRUSTED_PROXIES', '0'))
+MAX_TRACKED_CLIENTS = int(os.getenv('RATE_LIMIT_MAX_CLIENTS', '10000'))
+# Comma-separated keys that get their own bucket; kept only as digests
+API_KEY_DIGESTS = frozenset(
+    hashlib.sha256(key.strip().encode()).hexdigest()
+    for key in os.getenv('RATE_LIMIT_API_KEYS', '').split(',') if key.strip()
+)
+
+POOL_SETTINGS = {
+    # pool: (concurrent slots, max queued requests, queueing budget in seconds)
+    'llm': (int(os.getenv('LLM_MAX_CONCURRENCY', '4')), int(os.getenv('LLM_MAX_QUEUE', '2')),
+            float(os.getenv('LLM_QUEUE_BUDGET', '5'))),
+    'cpu': (int(os.getenv('CPU_MAX_CONCURRENCY', '6')), int(os.getenv('CPU_MAX_QUEUE', '2')),
+            float(os.getenv('CPU_QUEUE_BUDGET', '1')))
+}
+
+EXEMPT_PATHS = {'/api/health', '/metrics'}
+
+
+class TokenBuckets:
+    """Token bucket per client (`rate` tokens/s up to `burst`), bounded LRU of clients"""
+
+    def __init__(self, rate, burst, max_clients=MAX_TRACKED_CLIENTS):
+        self.rate = rate
+        self.burst = burst
+        self.max_clients = max_clients
+        self._buckets = OrderedDict()  # client -> (tokens, updated at)
+        self._lock = threading.Lock()
+
+    def take(self, client, cost=1.0):
+        """0 when admitted, else seconds until the client has enough tokens"""
+        if self.rate <= 0:
+            return 0.0
+        now = time.monotonic()
+        with self._lock:
+            entry = self._buckets.get(client)
+            tokens = self.burst if entry is None else min(self.burst, entry[0] + (now - entry[1]) * self.rate)
+            admitted = tokens >= cost
+            if admitted:
+                tokens -= cost
+            self._buckets[client] = (tokens, now)
+            self._buckets.move_to_end(client)
+            while len(self._buckets) > self.max_clients:
+                self._buckets.popitem(last=False)
+        return 0.0 if admitted else (cost - tokens) / self.rate
+
+
+class Overloaded(Exception):
+    """Raised when a pool sheds a request"""
+
+    def __init__(self, pool, retry_after):
+        super().__init__(f"{pool} pool overloaded")
+        self.pool = pool
+        self.retry_after = retry_after
+
+
+class Pool:
+    """Bounded concurrency with a latency budget for queueing"""
+
+    def __init__(self, name, size, max_queue, budget):
+        self.name = name
+        self.size = size
+        self.max_queue = max_queue
+        self.budget = budget
+        self.active = 0
+        self.waiting = 0
+        self.avg_service = None  # EWMA of time spent holding a slot
+        self._slots = threading.BoundedSemaphore(size)
+        self._lock = threading.Lock()
+
+    def expected_wait(self):
+        """Queueing delay a new request should expect (call with the lock held)"""
+        if self.active < self.size:
+            return 0.0
+        service = self.avg_service if self.avg_service is not None else self.budget
+        return (self.waiting + 1) * service / self.size
+
+    def acquire(self):
+        with self._lock:
+            expected = self.expected_wait()
+            if self.waiting >= self.max_queue or expected > self.budget:
+                raise Overloaded(self.name, expected)
+            self.waiting += 1
+        started = time.monotonic()
+        acquired = self._slots.acquire(timeout=self.budget)
+        with self._lock:
+            self.waiting -= 1
+            if acquired:
+                self.active += 1
+            else:
+                expected = self.expected_wait()
+        metrics.ADMISSION_QUEUE_WAIT.labels(self.name).observe(time.monotonic() - started)
+        if not acquired:
+            raise Overloaded(self.name, expected)
+
+    def release(self, service_time):
+        with self._lock:
+            self.active -= 1
+            self.avg_service = service_time if self.avg_service is None else (
+                0.8 * self.avg_service + 0.2 * service_time)
+        self._slots.release()
+
+
+pools = {name: Pool(name, *settings) for name, settings in POOL_SETTINGS.items()}
+request_buckets = TokenBuckets(RATE_LIMIT_RPS, RATE_LIMIT_BURST)
+llm_buckets = TokenBuckets(LLM_RATE_LIMIT_RPS, LLM_RATE_LIMIT_BURST)
+
+
+def client_id():
+    api_key = request.headers.get('X-API-Key')
+    if api_key and API_KEY_DIGESTS:
+        digest = hashlib.sha256(api_key.encode()).hexdigest()
+        if digest in API_KEY_DIGESTS:
+            return 'key:' + digest[:16]
+    if TRUSTED_PROXIES:
+        route = request.access_route
+        if len(route) >= TRUSTED_PROXIES:
+            return 'ip:' + route[-TRUSTED_PROXIES]
+    return f"ip:{request.remote_addr}"
+
+
+def reject(status, message, retry_after, pool, reason):
+    metrics.ADMISSION_REJECTIONS.labels(pool, reason).inc()
+    seconds = max(1, math.ceil(retry_after))
+    response = jsonify({'error': message, 'retry_after': seconds})
+    response.status_code = status
+    response.headers['Retry-After'] = str(seconds)
+    return response
+
+
+def limit(pool_name):
+    """Run the view in the named concurrency pool ('llm' or 'cpu')"""
+    pool = pools[pool_name]
+
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            try:
+                pool.acquire()
+            except Overloaded as e:
+                return reject(503, 'Server is busy, please retry shortly', e.retry_after, pool_name, 'overloaded')
+            started = time.monotonic()
+            try:
+                return view(*args, **kwargs)
+            finally:
+                pool.release(time.monotonic() - started)
+        wrapper.admission_pool = pool_name
+        return wrapper
+    return decorator
+
+
+def init_app(app):
+    """Rate limit every request before it reaches a view"""
+
+    @app.before_request
+    def _rate_limit():
+        if request.method == 'OPTIONS' or request.path in EXEMPT_PATHS:
+            return None
+        client = client_id()
+        retry_after = request_buckets.take(client)
+        if retry_after:
+            return reject(429, 'Rate limit exceeded', retry_after, 'all', 'rate_limited')
+        view = current_app.view_functions.get(request.endpoint)
+        if getattr(view, 'admission_pool', None) == 'llm':
+            retry_after = llm_buckets.take(client)
+            if retry_after:
+                return reject(429, 'Rate limit exceeded for AI requests', retry_after, 'llm', 'rate_limited')
+        return None
@@ -1,24 +1,53 @@
-from flask import Flask, request, jsonify, send_from_directory
+from flask import Flask, request, jsonify, send_from_directory, Response
 from flask_cors import CORS
 import os
 import json
-import requests
+import time
+import threading
 from datetime import datetime
 import logging
 from werkzeug.utils import secure_filename
-import google.generativeai as genai
 from dotenv import load_dotenv
 import re
 import string
+from ids import new_id, new_ids
+import storage
+import underwriting
+import rules
+import metrics
+import profiling
+import serialization
+import compression
+import conditional
+import cache
+import singleflight
+import admission
+import schemas
+import logs
+import retention
+import resumable
+import extraction
+import image_checks
+import features
+from results import FILE_FACTORS, FILE_ISSUES, FileSecurityResult, InvestmentAssessment, unique
 
 # Load environment variables
 load_dotenv()
 
-# Configure logging
-logging.basicConfig(level=logging.INFO)
+# Configure logging (JSON records, written by a background thread)
+logs.configure()
 logger = logging.getLogger(__name__)
+# Keyword fallback answers are frequent; LOG_SAMPLE_RATES samples them
+fallback_logger = logger.getChild('fallback')
 
 app = Flask(__name__)
+app.json = serialization.OrjsonProvider(app)
+logs.init_app(app)
+metrics.init_app(app)
+profiling.init_app(app)
+compression.init_app(app)
+conditional.init_app(app)
+admission.init_app(app)
 
 # Configure CORS properly for production
 CORS(app, resources={
@@ -30,47 +59,144 @@ CORS(app, resources={
             "https://*.onrender.com"
         ],
         "methods": ["GET", "POST", "PUT", "DELETE", "OPTIONS"],
-        "allow_headers": ["Content-Type", "Authorization"]
+        "allow_headers": ["Content-Type", "Authorization", "X-API-Key", "X-Upload-Offset", "X-Chunk-SHA256"]
     }
 })
 
 # Configuration
 app.config['MAX_CONTENT_LENGTH'] = 16 * 1024 * 1024  # 16MB max file size
-UPLOAD_FOLDER = 'uploads'
+UPLOAD_FOLDER = retention.UPLOAD_FOLDER
 ALLOWED_EXTENSIONS = {'txt', 'pdf', 'png', 'jpg', 'jpeg', 'gif', 'doc', 'docx'}
 
 # Create upload folder if it doesn't exist
 os.makedirs(UPLOAD_FOLDER, exist_ok=True)
 
-# Initialize Gemini AI
+# Create policy/claim tables if they don't exist
+storage.init_db()
+
+# Gemini AI is initialized on first use - importing the SDK dominates cold start
 GEMINI_API_KEY = os.getenv('GEMINI_API_KEY')
-if GEMINI_API_KEY:
-    genai.configure(api_key=GEMINI_API_KEY)
-    model = genai.GenerativeModel('models/gemini-1.5-flash-latest')
-else:
-    model = None
+GEMINI_MODEL_NAME = 'models/gemini-1.5-flash-latest'
+_gemini_model = None
+_gemini_lock = threading.Lock()
+if not GEMINI_API_KEY:
     logger.warning("Google API key not found. Some features may not work.")
 
 # Ollama configuration for fallback
 OLLAMA_BASE_URL = os.getenv('OLLAMA_BASE_URL', 'http://localhost:11434')
 OLLAMA_MODEL = os.getenv('OLLAMA_MODEL', 'llama2')
 
+# Ask the LLM for extra underwriting insights by default (clients can also opt in per request)
+UNDERWRITING_AI_ENRICHMENT = os.getenv('UNDERWRITING_AI_ENRICHMENT', 'false').lower() == 'true'
+
+# How long clients may reuse responses (seconds); revalidation within this window skips the view
+FAQ_MAX_AGE = int(os.getenv('FAQ_MAX_AGE', '3600'))
+
+# Concurrent identical prompts share one upstream call; waiters give up after this many seconds
+LLM_COALESCE_TIMEOUT = float(os.getenv('LLM_COALESCE_TIMEOUT', '65'))
+llm_calls = singleflight.SingleFlight('llm')
+POLICY_MAX_AGE = int(os.getenv('POLICY_MAX_AGE', '300'))
+
+# Inputs the memoized analyses depend on; other request fields do not affect the cache key
+# (profiles are keyed by their feature version, see features.py)
+INVESTMENT_FIELDS = ('type', 'amount', 'duration', 'expected_return', 'risk_level')
+
+def get_gemini_model():
+    """Return the Gemini model, importing and configuring the SDK on first call"""
+    global _gemini_model
+    if not GEMINI_API_KEY:
+        return None
+    if _gemini_model is None:
+        with _gemini_lock:
+            if _gemini_model is None:
+                import google.generativeai as genai
+                genai.configure(api_key=GEMINI_API_KEY)
+                _gemini_model = genai.GenerativeModel(GEMINI_MODEL_NAME)
+    return _gemini_model
+
+def warmup(build_clients=True):
+    """Load tables and heavy libraries ahead of the first request
+
+    Called by gunicorn.conf.py: in the master with --preload (so forked
+    workers share the loaded state), otherwise in each worker after boot.
+    API clients and the upload sweeper thread are only started when
+    `build_clients` is set, i.e. never in a process that is about to fork.
+    """
+    started = time.perf_counter()
+    underwriting.get_engine()
+    rules.get_engine()
+    import numpy  # noqa: F401 - used by the quote grid
+    import requests  # noqa: F401 - used for Ollama calls
+    import PIL.Image  # noqa: F401 - used by claim photo checks
+    if GEMINI_API_KEY:
+        import google.generativeai  # noqa: F401
+        if build_clients:
+            get_gemini_model()
+    if build_clients:
+        retention.start_sweeper()
+    logger.info("Warmup finished in %.2fs", time.perf_counter() - started)
+
 def allowed_file(filename):
     return '.' in filename and filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
 
+# Optional policy fields stored alongside the required ones
+OPTIONAL_POLICY_FIELDS = ['premium_amount', 'start_date', 'end_date', 'beneficiary']
+
+def build_policy(policy_id, data, user_id=None):
+    """Build the stored/returned policy object from request data"""
+    policy = {
+        'id': policy_id,
+        'type': data['policy_type'],
+        'coverage_amount': data['coverage_amount'],
+        'term': data['term'],
+        'created_at': datetime.now().isoformat(),
+        'status': 'active'
+    }
+    for field in OPTIONAL_POLICY_FIELDS:
+        if field in data:
+            policy[field] = data[field]
+    user_id = user_id or data.get('user_id')
+    if user_id:
+        policy['user_id'] = user_id
+    return policy
+
+def observe_analysis(analysis, started):
+    """Record time spent in analysis code since `started` (metrics and Server-Timing)"""
+    elapsed = time.perf_counter() - started
+    metrics.ANALYSIS_DURATION.labels(analysis).observe(elapsed)
+    profiling.record('scoring', elapsed)
+
+@profiling.timed('llm')
 def call_llm_with_fallback(prompt, max_retries=3):
+    """Call the LLM, sharing one upstream call among concurrent identical prompts"""
+    key = singleflight.fingerprint(GEMINI_MODEL_NAME, OLLAMA_MODEL, prompt)
+    try:
+        return llm_calls.do(key, lambda: call_llm_providers(prompt), timeout=LLM_COALESCE_TIMEOUT)
+    except singleflight.CoalesceTimeout as e:
+        logger.warning("%s; answering from keyword fallback", e)
+        return provide_fallback_response(prompt)
+
+def call_llm_providers(prompt):
     """Call LLM with Gemini as primary and Ollama as fallback"""
     
     # Try Gemini first
+    model = get_gemini_model()
     if model:
+        started = time.perf_counter()
         try:
             response = model.generate_content(prompt)
             if response and response.text:
+                metrics.LLM_LATENCY.labels('gemini').observe(time.perf_counter() - started)
+                metrics.LLM_RESPONSES.labels('gemini').inc()
                 return response.text
         except Exception as e:
-            logger.error(f"Gemini API error: {e}")
+            metrics.LLM_ERRORS.labels('gemini').inc()
+            logger.error("Gemini API error: %s", e)
+        metrics.LLM_LATENCY.labels('gemini').observe(time.perf_counter() - started)
     
-    # Fallback to Ollama
+    # Fallback to Ollama (requests is imported here to keep it off the cold start path)
+    import requests
+    started = time.perf_counter()
     try:
         ollama_url = f"{OLLAMA_BASE_URL}/api/generate"
         payload = {
@@ -80,27 +206,38 @@ def call_llm_with_fallback(prompt, max_retries=3):
         }
         
         response = requests.post(ollama_url, json=payload, timeout=30)
+        metrics.LLM_LATENCY.labels('ollama').observe(time.perf_counter() - started)
         if response.status_code == 200:
             result = response.json()
+            metrics.LLM_RESPONSES.labels('ollama').inc()
             return result.get('response', 'I apologize, but I could not generate a response.')
         else:
-            logger.error(f"Ollama API error: {response.status_code}")
+            metrics.LLM_ERRORS.labels('ollama').inc()
+            logger.error("Ollama API error: %s", response.status_code)
     except Exception as e:
-        logger.error(f"Ollama fallback error: {e}")
+        metrics.LLM_LATENCY.labels('ollama').observe(time.perf_counter() - started)
+        metrics.LLM_ERRORS.labels('ollama').inc()
+        logger.error("Ollama fallback error: %s", e)
     
     # Final fallback - provide intelligent responses based on keywords
+    metrics.LLM_RESPONSES.labels('keyword_fallback').inc()
     return provide_fallback_response(prompt)
 
+def parse_json_response(response_text):
+    """Decode an LLM answer that should be JSON; None if it is not"""
+    try:
+        return json.loads(response_text)
+    except ValueError:
+        return None
+
 def provide_fallback_response(prompt):
     """Provide intelligent fallback responses when LLM is not available"""
     # Clean the prompt by removing punctuation and converting to lowercase
     prompt_clean = prompt.lower().translate(str.maketrans('', '', string.punctuation))
-    logger.info(f"Fallback triggered for prompt: {prompt}")
-    logger.info(f"Cleaned prompt: {prompt_clean}")
 
     # Simple word matching without regex
     if any(word in prompt_clean for word in ['sip', 'investment', 'mutual', 'portfolio']):
-        logger.info("Matched: investment")
+        fallback_logger.info("Keyword fallback answered: %s", 'investment', extra={'prompt_chars': len(prompt)})
         return """SIP (Systematic Investment Plan) is a disciplined approach to investing where you invest a fixed amount regularly in mutual funds.
 
 **Key Benefits:**
@@ -120,7 +257,7 @@ def provide_fallback_response(prompt):
 **Risk**: Market fluctuations, but long-term returns are generally positive."""
     
     elif any(word in prompt_clean for word in ['insurance', 'term', 'coverage', 'life']):
-        logger.info("Matched: insurance")
+        fallback_logger.info("Keyword fallback answered: %s", 'insurance', extra={'prompt_chars': len(prompt)})
         return """Life insurance provides financial protection for your family in case of your untimely death.
 
 **How Much Coverage You Need:**
@@ -140,7 +277,7 @@ def provide_fallback_response(prompt):
 **Avoid**: ULIPs and endowment plans for pure protection needs."""
     
     elif any(word in prompt_clean for word in ['loan', 'emi', 'credit', 'debt', 'trap']):
-        logger.info("Matched: loan")
+        fallback_logger.info("Keyword fallback answered: %s", 'loan', extra={'prompt_chars': len(prompt)})
         return """Common loan traps to avoid:
 
 **1. Hidden Charges:**
@@ -173,7 +310,7 @@ def provide_fallback_response(prompt):
 - Maintain good credit score for better rates"""
     
     elif any(word in prompt_clean for word in ['fraud', 'scam', 'security', 'phishing']):
-        logger.info("Matched: fraud")
+        fallback_logger.info("Keyword fallback answered: %s", 'fraud', extra={'prompt_chars': len(prompt)})
         return """How to identify and prevent financial fraud:
 
 **Common Fraud Types:**
@@ -207,7 +344,7 @@ def provide_fallback_response(prompt):
 **Remember**: Banks never ask for OTP or passwords over phone/email."""
     
     elif any(word in prompt_clean for word in ['tax', '80c', 'deduction', 'itr']):
-        logger.info("Matched: tax")
+        fallback_logger.info("Keyword fallback answered: %s", 'tax', extra={'prompt_chars': len(prompt)})
         return """Tax-saving options under Section 80C (₹1.5 lakh limit):
 
 **Popular Options:**
@@ -233,7 +370,7 @@ def provide_fallback_response(prompt):
 **Example**: ₹1.5 lakh in ELSS + ₹25,000 health insurance = ₹1.75 lakh deduction = ₹54,600 tax saved (30% bracket)"""
     
     else:
-        logger.info("Matched: general fallback")
+        fallback_logger.info("Keyword fallback answered: %s", 'general', extra={'prompt_chars': len(prompt)})
         return """I'm your AI financial advisor! I can help you with:
 
 **Investment Guidance:**
@@ -263,6 +400,12 @@ def provide_fallback_response(prompt):
 
 Ask me any specific question about these topics, and I'll provide detailed, actionable advice!"""
 
+@app.route('/metrics', methods=['GET'])
+def prometheus_metrics():
+    """Prometheus scrape endpoint (aggregated across gunicorn workers)"""
+    body, content_type = metrics.render()
+    return Response(body, content_type=content_type)
+
 @app.route('/', methods=['GET'])
 def root():
     """Root endpoint for health checks"""
@@ -277,7 +420,7 @@ def health_check():
     """Health check endpoint for monitoring"""
     try:
         # Check if AI model is available
-        ai_status = "available" if model else "unavailable"
+        ai_status = "available" if GEMINI_API_KEY else "unavailable"
         
         return jsonify({
             "status": "healthy",
@@ -286,7 +429,7 @@ def health_check():
             "version": "1.0.0"
         }), 200
     except Exception as e:
-        logger.error(f"Health check failed: {e}")
+        logger.error("Health check failed: %s", e)
         return jsonify({
             "status": "unhealthy",
             "error": str(e),
@@ -294,22 +437,25 @@ def health_check():
         }), 500
 
 @app.route('/api/chat', methods=['POST'])
-def chat():
+@schemas.validate(schemas.CHAT)
+@admission.limit('llm')
+def chat(data):
     """Enhanced chat endpoint with context awareness"""
     try:
-        data = request.get_json()
-        if not data or 'message' not in data:
-            return jsonify({'error': 'Message is required'}), 400
-        
-        message = data.get('message', '')
-        history = data.get('history', [])
-        user_profile = data.get('user_profile', {})
+        message = data['message']
+        history = data['history']
+        profile = features.for_profile(data['user_profile'])
+        # Fields the features do not summarize (name, occupation, notes, ...) go in as sent
+        other_details = features.other_fields(data['user_profile'])
+        profile_summary = profile.describe()
+        if other_details:
+            profile_summary += f"; other details: {json.dumps(other_details, ensure_ascii=False)}"
         
         # Create context-aware prompt
         context_prompt = f"""
 You are an expert BFSI (Banking, Financial Services, and Insurance) advisor with 15+ years of experience.
 
-User Profile: {json.dumps(user_profile, indent=2)}
+User Profile: {profile_summary}
 Conversation History: {json.dumps(history, indent=2)}
 
 User Query: {message}
@@ -345,10 +491,12 @@ Response:"""
         })
         
     except Exception as e:
-        logger.error(f"Chat error: {e}")
+        logger.error("Chat error: %s", e)
         return jsonify({'error': 'Internal server error'}), 500
 
 @app.route('/api/faq', methods=['GET'])
+@conditional.cacheable(FAQ_MAX_AGE)
+@admission.limit('llm')
 def get_faq():
     """Generate FAQ with LLM"""
     try:
@@ -365,12 +513,13 @@ Include questions and detailed answers about:
 Format as JSON with categories and detailed answers. Make answers educational and actionable.
 """
 
-        response_text = call_llm_with_fallback(faq_prompt)
-        
-        # Try to parse JSON response, fallback to structured format if needed
-        try:
-            faqs = json.loads(response_text)
-        except:
+        # One LLM call per FAQ_MAX_AGE across all workers; only parseable answers are cached
+        faqs = cache.llm_responses.get_or_compute(
+            cache.canonical_key('faq', faq_prompt),
+            lambda: parse_json_response(call_llm_with_fallback(faq_prompt)),
+            ttl=FAQ_MAX_AGE
+        )
+        if faqs is None:
             # Fallback structured FAQ
             faqs = [
                 {
@@ -393,20 +542,82 @@ Format as JSON with categories and detailed answers. Make answers educational an
         return jsonify({'faqs': faqs})
         
     except Exception as e:
-        logger.error(f"FAQ generation error: {e}")
+        logger.error("FAQ generation error: %s", e)
         return jsonify({'error': 'Internal server error'}), 500
 
+# Producer/software names that indicate a document or photo was edited
+EDITING_SOFTWARE = ('photoshop', 'gimp', 'illustrator', 'canva', 'pixelmator', 'paint.net', 'affinity', 'snapseed')
+
+def check_claim_documents(claim_data, user_profile):
+    """Cross-check a stored claim's indexed documents against the claimed details"""
+    claim = storage.get_claim(claim_data['claim_id']) if claim_data.get('claim_id') else None
+    hashes = claim.get('document_hashes', []) if claim else []
+    if not hashes:
+        return None
+    
+    index = extraction.get_index()
+    documents = {sha256: index.get(sha256) or {} for sha256 in hashes}
+    names = [name for name in (claim_data.get('claimant_name'), user_profile.get('name')) if name]
+    dates = [claim_data[field] for field in ('incident_date', 'date') if claim_data.get(field)]
+    # Photos carry no text, so only text documents are expected to mention the claim details
+    text_hashes = [sha256 for sha256, document in documents.items() if document.get('kind') != 'image']
+    checks = extraction.cross_check(text_hashes, amount=claim_data.get('amount'), names=names, dates=dates) if text_hashes else {}
+    
+    indicators = []
+    if 'amount' in checks and not checks['amount']:
+        indicators.append('Claimed amount does not appear in any submitted document')
+    if any(not found for found in checks.get('names', {}).values()):
+        indicators.append('Claimant name does not appear in any submitted document')
+    if any(not found for found in checks.get('dates', {}).values()):
+        indicators.append('Incident date does not appear in any submitted document')
+    
+    incident_dates = extraction.find_dates(' '.join(str(value) for value in dates))
+    reused = 0
+    similar_photos = 0
+    for sha256 in hashes:
+        if any(other != claim['id'] for other in index.claims_with(sha256)):
+            reused += 1
+        document = documents[sha256]
+        metadata = document.get('metadata', {})
+        if document.get('kind') == 'image':
+            photo = image_checks.get_store().get(sha256) or {}
+            indicators.extend(photo.get('indicators', []))
+            taken_at = (photo.get('exif') or {}).get('taken_at')
+            if taken_at and incident_dates and taken_at[:10] < min(incident_dates):
+                indicators.append('Photo was taken before the incident date')
+            if any(other != claim['id'] for match, _ in image_checks.similar(sha256)
+                   for other in index.claims_with(match)):
+                similar_photos += 1
+        software = f"{metadata.get('producer', '')} {metadata.get('creator', '')} {metadata.get('software', '')}".lower()
+        if any(editor in software for editor in EDITING_SOFTWARE):
+            indicators.append('Document metadata shows editing software')
+        if metadata.get('incremental_updates'):
+            indicators.append('PDF was modified after it was first saved')
+    if reused:
+        indicators.append(f'{reused} document(s) were already submitted with another claim')
+    if similar_photos:
+        indicators.append(f'{similar_photos} photo(s) closely match photos from another claim')
+    
+    return {
+        'documents_checked': len(hashes),
+        'amount_found': bool(checks.get('amount')) if 'amount' in checks else None,
+        'names_found': all(checks['names'].values()) if checks.get('names') else None,
+        'dates_found': all(checks['dates'].values()) if checks.get('dates') else None,
+        'reused_documents': reused,
+        'similar_photos': similar_photos,
+        'indicators': list(dict.fromkeys(indicators))
+    }
+
 @app.route('/api/fraud/detect', methods=['POST'])
-def detect_fraud():
+@schemas.validate(schemas.FRAUD_DETECTION)
+@admission.limit('llm')
+def detect_fraud(data):
     """Enhanced fraud detection with AI analysis"""
     try:
-        data = request.get_json()
-        if not data:
-            return jsonify({'error': 'Data is required'}), 400
-        
-        claim_data = data.get('claim_data', {})
-        documents = data.get('documents', [])
-        user_profile = data.get('user_profile', {})
+        claim_data = data['claim_data']
+        documents = data['documents']
+        user_profile = data['user_profile']
+        document_checks = check_claim_documents(claim_data, user_profile)
         
         # Create fraud analysis prompt
         fraud_prompt = f"""
@@ -415,6 +626,7 @@ Analyze this insurance claim for potential fraud indicators:
 Claim Data: {json.dumps(claim_data, indent=2)}
 Documents: {json.dumps(documents, indent=2)}
 User Profile: {json.dumps(user_profile, indent=2)}
+Document Checks: {json.dumps(document_checks, indent=2)}
 
 Provide a detailed fraud risk assessment including:
 1. Risk level (low/medium/high)
@@ -426,6 +638,7 @@ Provide a detailed fraud risk assessment including:
 Format as JSON.
 """
 
+        started = time.perf_counter()
         response_text = call_llm_with_fallback(fraud_prompt)
         
         # Try to parse JSON response, fallback to structured format
@@ -443,30 +656,38 @@ Format as JSON.
                 'indicators': ['Amount analysis', 'Document review needed'],
                 'recommendations': ['Verify documents', 'Check claim history']
             }
+            if document_checks:
+                fraud_analysis['indicators'].extend(document_checks['indicators'])
+                fraud_analysis['fraud_score'] = min(100, fraud_analysis['fraud_score'] + 10 * len(document_checks['indicators']))
         
+        if document_checks and isinstance(fraud_analysis, dict):
+            fraud_analysis['document_checks'] = document_checks
+        observe_analysis('fraud_detection', started)
         return jsonify(fraud_analysis)
         
     except Exception as e:
-        logger.error(f"Fraud detection error: {e}")
+        logger.error("Fraud detection error: %s", e)
         return jsonify({'error': 'Internal server error'}), 500
 
 @app.route('/api/financial/analyze', methods=['POST'])
-def analyze_financial_health():
+@schemas.validate(schemas.FINANCIAL_ANALYSIS)
+@admission.limit('cpu')
+def analyze_financial_health(data):
     """Analyze user's financial health and provide recommendations"""
     try:
-        data = request.get_json()
-        user_profile = data.get('user_profile', {})
+        profile = features.for_profile(data['user_profile'])
+        
+        memo_key = cache.canonical_key('financial_health', profile.version)
+        analysis = cache.results.get(memo_key)
+        if analysis is not None:
+            return jsonify(analysis)
         
-        # Calculate basic financial ratios
-        income = user_profile.get('income', 0)
-        savings = user_profile.get('savings', 0)
-        debt = user_profile.get('debt', 0)
-        emergency_fund = user_profile.get('emergencyFund', 0)
+        started = time.perf_counter()
         
-        # Financial health calculations
-        savings_rate = (savings / income * 100) if income > 0 else 0
-        debt_to_income = (debt / income * 100) if income > 0 else 0
-        emergency_ratio = (emergency_fund / (income / 12)) if income > 0 else 0
+        # Financial ratios are derived once per profile
+        savings_rate = profile.savings_ratio
+        debt_to_income = profile.debt_ratio
+        emergency_ratio = profile.emergency_months
         
         # Determine risk level
         if debt_to_income > 40 or emergency_ratio < 3:
@@ -497,13 +718,62 @@ def analyze_financial_health():
             ]
         }
         
+        observe_analysis('financial_health', started)
+        cache.results.set(memo_key, analysis)
         return jsonify(analysis)
         
     except Exception as e:
-        logger.error(f"Financial analysis error: {e}")
+        logger.error("Financial analysis error: %s", e)
         return jsonify({'error': 'Internal server error'}), 500
 
+def create_claim(claim_data, user_profile, saved_files):
+    """Store a claim for documents already saved under uploads/claim and build the response"""
+    # Generate claim ID
+    claim_id = new_id('CLM')
+    
+    # Extract and index the documents so fraud checks can query them later
+    document_hashes = []
+    claim_folder = retention.purpose_dir('claim')
+    for stored_name in saved_files:
+        try:
+            path = os.path.join(claim_folder, stored_name)
+            summary = extraction.index_file(path, stored_name, claim_id)
+            document_hashes.append(summary['sha256'])
+            if summary['kind'] == 'image':
+                image_checks.check_file(path, summary['sha256'])
+        except Exception as e:
+            logger.error("Document indexing error: %s", e)
+    
+    # Create monitoring status
+    monitoring_status = {
+        'status': 'submitted',
+        'claim_id': claim_id,
+        'submitted_at': datetime.now().isoformat(),
+        'estimated_processing_time': '5-7 business days',
+        'current_stage': 'document_review',
+        'documents_received': len(saved_files)
+    }
+    
+    storage.save_claim({
+        'id': claim_id,
+        'type': claim_data.get('claim_type'),
+        'status': 'submitted',
+        'created_at': monitoring_status['submitted_at'],
+        'claim_data': claim_data,
+        'documents': saved_files,
+        'document_hashes': document_hashes,
+        'monitoring_status': monitoring_status
+    }, user_id=claim_data.get('user_id') or user_profile.get('user_id'))
+    
+    return {
+        'success': True,
+        'claim_id': claim_id,
+        'monitoring_status': monitoring_status,
+        'message': 'Claim submitted successfully'
+    }
+
 @app.route('/api/claims/submit', methods=['POST'])
+@admission.limit('cpu')
 def submit_claim():
     """Submit insurance claim with document upload"""
     try:
@@ -516,36 +786,125 @@ def submit_claim():
         saved_files = []
         for file in files:
             if file and allowed_file(file.filename):
-                filename = secure_filename(file.filename)
-                filepath = os.path.join(UPLOAD_FOLDER, filename)
-                file.save(filepath)
-                saved_files.append(filename)
-        
-        # Generate claim ID
-        claim_id = f"CLM{datetime.now().strftime('%Y%m%d%H%M%S')}"
-        
-        # Create monitoring status
-        monitoring_status = {
-            'status': 'submitted',
-            'claim_id': claim_id,
-            'submitted_at': datetime.now().isoformat(),
-            'estimated_processing_time': '5-7 business days',
-            'current_stage': 'document_review',
-            'documents_received': len(saved_files)
-        }
+                stored_name, _, _ = retention.save_upload(file, secure_filename(file.filename), 'claim')
+                saved_files.append(stored_name)
         
-        return jsonify({
-            'success': True,
-            'claim_id': claim_id,
-            'monitoring_status': monitoring_status,
-            'message': 'Claim submitted successfully'
-        })
+        return jsonify(create_claim(claim_data, user_profile, saved_files))
         
     except Exception as e:
-        logger.error(f"Claim submission error: {e}")
+        logger.error("Claim submission error: %s", e)
         return jsonify({'error': 'Internal server error'}), 500
 
+# File types and name fragments that raise an upload's security risk score
+EXECUTABLE_EXTENSIONS = frozenset(('exe', 'bat', 'cmd', 'scr', 'pif'))
+SCRIPT_EXTENSIONS = frozenset(('js', 'vbs', 'ps1'))
+DOCUMENT_EXTENSIONS = frozenset(('pdf', 'doc', 'docx'))
+SUSPICIOUS_FILENAME_RE = re.compile('virus|malware|hack|crack|keygen|warez')
+
+def analyze_file_security(filename, file_size, content_type):
+    """Score one saved upload for security risks"""
+    file_extension = filename.rsplit('.', 1)[1].lower() if '.' in filename else ''
+    
+    # File security analysis (findings are factor codes, see results.py)
+    result = FileSecurityResult(filename, file_size, content_type, file_extension, datetime.now().isoformat())
+    
+    # Check file size (suspicious if too large or too small)
+    if file_size > 10 * 1024 * 1024:  # > 10MB
+        result.flag(3, 'size_large')
+    elif file_size < 100:  # < 100 bytes
+        result.flag(2, 'size_small')
+    
+    # Check file type security
+    if file_extension in EXECUTABLE_EXTENSIONS:
+        result.flag(10, 'executable', 'executable')
+    elif file_extension in SCRIPT_EXTENSIONS:
+        result.flag(5, 'script')
+    elif file_extension in DOCUMENT_EXTENSIONS:
+        # These are generally safe but could contain malicious content
+        result.flag(1, 'document')
+    
+    # Check filename for suspicious patterns
+    if SUSPICIOUS_FILENAME_RE.search(filename.lower()):
+        result.flag(8, 'suspicious_name', 'suspicious_name')
+    
+    return result
+
+def build_security_report(analysis_results):
+    """Combine per-file FileSecurityResults into the security analysis response"""
+    total_risk_score = sum(result.risk_score for result in analysis_results)
+    risk_factors = unique(factor for result in analysis_results for factor in result.factors)
+    security_issues = [issue for result in analysis_results for issue in result.issues]
+    
+    # Calculate overall risk assessment
+    avg_risk_score = total_risk_score / len(analysis_results) if analysis_results else 0
+    
+    if avg_risk_score < 3:
+        risk_level = 'low'
+        confidence = 'high'
+        recommendations = [
+            'Files appear to be safe for processing',
+            'Continue with normal document processing',
+            'Maintain regular security monitoring'
+        ]
+    elif avg_risk_score < 7:
+        risk_level = 'medium'
+        confidence = 'medium'
+        recommendations = [
+            'Exercise caution with uploaded files',
+            'Scan files with antivirus software',
+            'Review file contents before processing',
+            'Consider additional security measures'
+        ]
+    else:
+        risk_level = 'high'
+        confidence = 'high'
+        recommendations = [
+            'High security risk detected',
+            'Do not process these files',
+            'Scan with multiple antivirus tools',
+            'Review file sources and authenticity',
+            'Consider reporting suspicious files'
+        ]
+    
+    # Enhanced security analysis
+    security_analysis = {
+        'fraud_analysis': {
+            'risk_level': risk_level,
+            'confidence': confidence,
+            'overall_risk_score': round(avg_risk_score, 2),
+            'total_files_analyzed': len(analysis_results),
+            'risk_factors': [FILE_FACTORS[code] for code in risk_factors],
+            'security_issues': [FILE_ISSUES[code] for code in unique(security_issues)],
+            'recommendations': recommendations
+        },
+        'financial_health': {
+            'score': max(0, 100 - (avg_risk_score * 10)),  # Higher risk = lower score
+            'assessment': f'Financial security assessment based on {len(analysis_results)} analyzed files',
+            'risk_indicators': len(security_issues),
+            'safety_score': max(0, 100 - (avg_risk_score * 15))
+        },
+        'compliance_check': {
+            'file_types_allowed': True,
+            'size_limits_respected': all(r.size <= 16 * 1024 * 1024 for r in analysis_results),
+            'security_standards_met': avg_risk_score < 5,
+            'recommendations': [
+                'Ensure all files are from trusted sources',
+                'Regular security audits recommended',
+                'Implement file scanning procedures'
+            ]
+        }
+    }
+    
+    return {
+        'success': True,
+        'files_analyzed': len(analysis_results),
+        'analysis_results': [result.to_dict() for result in analysis_results],
+        'security_analysis': security_analysis,
+        'timestamp': datetime.now().isoformat()
+    }
+
 @app.route('/api/security/analyze', methods=['POST'])
+@admission.limit('cpu')
 def analyze_security():
     """Analyze uploaded documents for security and fraud"""
     try:
@@ -557,522 +916,469 @@ def analyze_security():
         
         # Save and analyze files
         analysis_results = []
-        total_risk_score = 0
-        risk_factors = []
-        security_issues = []
-        
         for file in files:
             if file and allowed_file(file.filename):
                 filename = secure_filename(file.filename)
-                filepath = os.path.join(UPLOAD_FOLDER, filename)
-                file.save(filepath)
+                _, _, file_size = retention.save_upload(file, filename, 'security_scan')
                 
                 # Enhanced file analysis
-                file_size = os.path.getsize(filepath)
-                file_extension = filename.rsplit('.', 1)[1].lower() if '.' in filename else ''
-                
-                # File security analysis
-                file_risk_score = 0
-                file_risk_factors = []
-                file_security_issues = []
-                
-                # Check file size (suspicious if too large or too small)
-                if file_size > 10 * 1024 * 1024:  # > 10MB
-                    file_risk_score += 3
-                    file_risk_factors.append("File size is unusually large")
-                elif file_size < 100:  # < 100 bytes
-                    file_risk_score += 2
-                    file_risk_factors.append("File size is suspiciously small")
-                
-                # Check file type security
-                if file_extension in ['exe', 'bat', 'cmd', 'scr', 'pif']:
-                    file_risk_score += 10
-                    file_risk_factors.append("Executable file detected - high security risk")
-                    file_security_issues.append("Executable files should not be uploaded")
-                elif file_extension in ['js', 'vbs', 'ps1']:
-                    file_risk_score += 5
-                    file_risk_factors.append("Script file detected - potential security risk")
-                elif file_extension in ['pdf', 'doc', 'docx']:
-                    # These are generally safe but could contain malicious content
-                    file_risk_score += 1
-                    file_risk_factors.append("Document file - scan for malicious content")
-                
-                # Check filename for suspicious patterns
-                suspicious_patterns = ['virus', 'malware', 'hack', 'crack', 'keygen', 'warez']
-                if any(pattern in filename.lower() for pattern in suspicious_patterns):
-                    file_risk_score += 8
-                    file_risk_factors.append("Suspicious filename detected")
-                    file_security_issues.append("Filename contains suspicious keywords")
-                
-                file_analysis = {
-                    'filename': filename,
-                    'size': file_size,
-                    'type': file.content_type,
-                    'extension': file_extension,
-                    'uploaded_at': datetime.now().isoformat(),
-                    'risk_score': file_risk_score,
-                    'risk_factors': file_risk_factors,
-                    'security_issues': file_security_issues,
-                    'status': 'safe' if file_risk_score < 3 else 'warning' if file_risk_score < 7 else 'danger'
-                }
-                
-                analysis_results.append(file_analysis)
-                total_risk_score += file_risk_score
-                risk_factors.extend(file_risk_factors)
-                security_issues.extend(file_security_issues)
+                started = time.perf_counter()
+                analysis_results.append(analyze_file_security(filename, file_size, file.content_type))
+                observe_analysis('file_security', started)
         
-        # Calculate overall risk assessment
-        avg_risk_score = total_risk_score / len(analysis_results) if analysis_results else 0
+        return jsonify(build_security_report(analysis_results))
         
-        if avg_risk_score < 3:
-            risk_level = 'low'
-            confidence = 'high'
-            recommendations = [
-                'Files appear to be safe for processing',
-                'Continue with normal document processing',
-                'Maintain regular security monitoring'
-            ]
-        elif avg_risk_score < 7:
-            risk_level = 'medium'
-            confidence = 'medium'
-            recommendations = [
-                'Exercise caution with uploaded files',
-                'Scan files with antivirus software',
-                'Review file contents before processing',
-                'Consider additional security measures'
-            ]
-        else:
-            risk_level = 'high'
-            confidence = 'high'
-            recommendations = [
-                'High security risk detected',
-                'Do not process these files',
-                'Scan with multiple antivirus tools',
-                'Review file sources and authenticity',
-                'Consider reporting suspicious files'
-            ]
+    except json.JSONDecodeError as e:
+        logger.error("JSON parsing error in security analysis: %s", e)
+        return jsonify({'error': 'Invalid user profile data format'}), 400
+    except Exception as e:
+        logger.error("Security analysis error: %s", e)
+        return jsonify({'error': 'Internal server error during security analysis'}), 500
+
+@app.route('/api/uploads', methods=['POST'])
+@schemas.validate(schemas.UPLOAD_INIT)
+def create_upload(data):
+    """Start a resumable upload (see resumable.py for the protocol)"""
+    try:
+        filename = secure_filename(data['filename'])
+        if not allowed_file(filename):
+            return jsonify({'error': 'File type not allowed'}), 400
         
-        # Enhanced security analysis
-        security_analysis = {
-            'fraud_analysis': {
-                'risk_level': risk_level,
-                'confidence': confidence,
-                'overall_risk_score': round(avg_risk_score, 2),
-                'total_files_analyzed': len(analysis_results),
-                'risk_factors': list(set(risk_factors)),  # Remove duplicates
-                'security_issues': list(set(security_issues)),  # Remove duplicates
-                'recommendations': recommendations
-            },
-            'financial_health': {
-                'score': max(0, 100 - (avg_risk_score * 10)),  # Higher risk = lower score
-                'assessment': f'Financial security assessment based on {len(analysis_results)} analyzed files',
-                'risk_indicators': len(security_issues),
-                'safety_score': max(0, 100 - (avg_risk_score * 15))
-            },
-            'compliance_check': {
-                'file_types_allowed': True,
-                'size_limits_respected': all(r['size'] <= 16 * 1024 * 1024 for r in analysis_results),
-                'security_standards_met': avg_risk_score < 5,
-                'recommendations': [
-                    'Ensure all files are from trusted sources',
-                    'Regular security audits recommended',
-                    'Implement file scanning procedures'
-                ]
-            }
-        }
+        upload = resumable.create(filename, data['size'], data['purpose'],
+                                  sha256=data.get('sha256'), content_type=data.get('content_type'))
+        return jsonify(resumable.describe(upload)), 201
+        
+    except Exception as e:
+        logger.error("Create upload error: %s", e)
+        return jsonify({'error': 'Internal server error'}), 500
+
+@app.route('/api/uploads/<upload_id>', methods=['GET'])
+def get_upload(upload_id):
+    """Report how much of an upload has been received"""
+    try:
+        return jsonify(resumable.describe(resumable.load(upload_id)))
+    except resumable.UploadError as e:
+        return jsonify(e.to_dict()), e.status
+    except Exception as e:
+        logger.error("Get upload error: %s", e)
+        return jsonify({'error': 'Internal server error'}), 500
+
+@app.route('/api/uploads/<upload_id>', methods=['PUT'])
+def put_upload_chunk(upload_id):
+    """Append one chunk, streamed straight to disk"""
+    try:
+        offset = resumable.write_chunk(
+            upload_id,
+            request.headers.get('X-Upload-Offset'),
+            request.headers.get('X-Chunk-SHA256'),
+            request.stream
+        )
+        return jsonify({'upload_id': upload_id, 'offset': offset})
+    except resumable.UploadError as e:
+        return jsonify(e.to_dict()), e.status
+    except Exception as e:
+        logger.error("Upload chunk error: %s", e)
+        return jsonify({'error': 'Upload interrupted; resume from the reported offset'}), 500
+
+@app.route('/api/uploads/<upload_id>/complete', methods=['POST'])
+@schemas.validate(schemas.UPLOAD_COMPLETE)
+@admission.limit('cpu')
+def complete_upload(upload_id, data):
+    """Finish an upload and submit the claim or run the security analysis for it"""
+    try:
+        upload, stored_name, _, size = resumable.complete(upload_id)
+        
+        if upload['purpose'] == 'claim':
+            return jsonify(create_claim(data['claim_data'], data['user_profile'], [stored_name]))
+        
+        started = time.perf_counter()
+        file_analysis = analyze_file_security(upload['filename'], size, upload['content_type'])
+        observe_analysis('file_security', started)
+        return jsonify(build_security_report([file_analysis]))
+        
+    except resumable.UploadError as e:
+        return jsonify(e.to_dict()), e.status
+    except Exception as e:
+        logger.error("Complete upload error: %s", e)
+        return jsonify({'error': 'Internal server error'}), 500
+
+@app.route('/api/policies/underwriting', methods=['POST'])
+@schemas.validate(schemas.UNDERWRITING)
+@admission.limit('cpu')
+def perform_underwriting(data):
+    """Perform rate-table underwriting, optionally enriched with AI insights"""
+    try:
+        policy_data = data['policy_data']
+        user_profile = data['user_profile']
+        
+        started = time.perf_counter()
+        underwriting_result = underwriting.get_engine().quote(policy_data, user_profile)
+        observe_analysis('underwriting', started)
+        
+        if data.get('enrich_with_ai', UNDERWRITING_AI_ENRICHMENT):
+            underwriting_result['ai_insights'] = enrich_underwriting(policy_data, user_profile, underwriting_result)
         
         return jsonify({
-            'success': True,
-            'files_analyzed': len(analysis_results),
-            'analysis_results': analysis_results,
-            'security_analysis': security_analysis,
+            'underwriting_result': underwriting_result,
             'timestamp': datetime.now().isoformat()
         })
         
-    except json.JSONDecodeError as e:
-        logger.error(f"JSON parsing error in security analysis: {e}")
-        return jsonify({'error': 'Invalid user profile data format'}), 400
+    except ValueError as e:
+        logger.error("Value error in underwriting: %s", e)
+        return jsonify({'error': 'Invalid numeric values in policy data'}), 400
     except Exception as e:
-        logger.error(f"Security analysis error: {e}")
-        return jsonify({'error': 'Internal server error during security analysis'}), 500
+        logger.error("Underwriting error: %s", e)
+        return jsonify({'error': 'Internal server error'}), 500
 
-@app.route('/api/policies/underwriting', methods=['POST'])
-def perform_underwriting():
-    """Perform dynamic underwriting and risk assessment"""
+@app.route('/api/policies/underwriting/batch', methods=['POST'])
+@schemas.validate(schemas.BATCH_UNDERWRITING)
+@admission.limit('cpu')
+def perform_batch_underwriting(data):
+    """Quote many applications in one call"""
     try:
-        data = request.get_json()
-        policy_data = data.get('policy_data', {})
-        user_profile = data.get('user_profile', {})
+        engine = underwriting.get_engine()
+        results = engine.quote_many(data['applicants'])
+        summary = {
+            'count': len(results),
+            'rate_table_version': engine.version,
+            'timestamp': datetime.now().isoformat()
+        }
+        
+        if len(results) >= serialization.STREAM_MIN_ITEMS:
+            return serialization.stream_json('results', results, summary)
+        return jsonify({'results': results, **summary})
+        
+    except ValueError as e:
+        logger.error("Value error in batch underwriting: %s", e)
+        return jsonify({'error': 'Invalid numeric values in policy data'}), 400
+    except Exception as e:
+        logger.error("Batch underwriting error: %s", e)
+        return jsonify({'error': 'Internal server error'}), 500
+
+@app.route('/api/policies/underwriting/quote-grid', methods=['POST'])
+@schemas.validate(schemas.QUOTE_GRID)
+@admission.limit('cpu')
+def quote_grid(data):
+    """Quote one applicant across a grid of coverage amounts and terms"""
+    try:
+        coverages = underwriting.grid_axis(data['coverage'])
+        terms = [int(term) for term in underwriting.grid_axis(data['term'])]
+        if not coverages or not terms:
+            return jsonify({'error': 'coverage and term ranges must not be empty'}), 400
+        if len(coverages) * len(terms) > underwriting.MAX_GRID_CELLS:
+            return jsonify({'error': f'Grid is limited to {underwriting.MAX_GRID_CELLS} cells'}), 400
+        
+        grid = underwriting.get_engine().quote_grid(
+            data['policy_data'],
+            data['user_profile'],
+            coverages,
+            terms
+        )
+        
+        return jsonify({
+            'quote_grid': grid,
+            'timestamp': datetime.now().isoformat()
+        })
         
-        # Create underwriting prompt
-        underwriting_prompt = f"""
-Perform underwriting analysis for this insurance policy:
+    except (KeyError, ValueError) as e:
+        logger.error("Invalid quote grid request: %s", e)
+        return jsonify({'error': f'Invalid grid specification: {e}'}), 400
+    except Exception as e:
+        logger.error("Quote grid error: %s", e)
+        return jsonify({'error': 'Internal server error'}), 500
+
+def enrich_underwriting(policy_data, user_profile, underwriting_result):
+    """Ask the LLM for commentary on a decision made by the rate tables"""
+    enrichment_prompt = f"""
+Review this insurance underwriting decision made from standard rate tables:
 
 Policy Data: {json.dumps(policy_data, indent=2)}
 User Profile: {json.dumps(user_profile, indent=2)}
+Decision: {json.dumps(underwriting_result, indent=2)}
 
-Provide detailed underwriting assessment including:
-1. Risk assessment (low/medium/high)
-2. Premium rate recommendation
-3. Coverage approval status
-4. AI analysis insights
-5. Risk factors identified
+Do not change the decision or premium. Provide:
+1. Additional risk insights
+2. Questions the underwriter should ask
+3. Suggestions for the applicant
 
 Format as JSON.
 """
 
-        response_text = call_llm_with_fallback(underwriting_prompt)
+    response_text = call_llm_with_fallback(enrichment_prompt)
+    try:
+        return json.loads(response_text)
+    except (TypeError, ValueError):
+        return response_text
+
+@app.route('/api/policies', methods=['POST'])
+@schemas.validate(schemas.NEW_POLICY)
+def add_policy(data):
+    """Add new insurance policy"""
+    try:
+        # Generate policy ID
+        policy_id = new_id('POL')
         
-        # Try to parse JSON response, fallback to structured format
-        try:
-            underwriting_result = json.loads(response_text)
-        except:
-            # Fallback underwriting result
-            age = policy_data.get('applicant_age', 30)
-            coverage = policy_data.get('coverage_amount', 1000000)
-            
-            risk_assessment = 'low' if age < 40 else 'medium' if age < 50 else 'high'
-            premium_rate = 0.5 if risk_assessment == 'low' else 1.0 if risk_assessment == 'medium' else 2.0
-            
-            underwriting_result = {
-                'risk_assessment': risk_assessment,
-                'premium_rate': premium_rate,
-                'coverage_approved': True,
-                'ai_analysis': ['Age factor considered', 'Coverage amount appropriate'],
-                'recommendations': ['Standard underwriting approved']
-            }
+        policy = build_policy(policy_id, data)
+        storage.save_policy(policy, user_id=data.get('user_id'))
         
         return jsonify({
-            'underwriting_result': underwriting_result,
-            'timestamp': datetime.now().isoformat()
+            'success': True,
+            'policy': policy,
+            'message': 'Policy added successfully'
         })
         
     except Exception as e:
-        logger.error(f"Underwriting error: {e}")
+        logger.error("Add policy error: %s", e)
         return jsonify({'error': 'Internal server error'}), 500
 
-@app.route('/api/policies', methods=['POST'])
-def add_policy():
-    """Add new insurance policy"""
+@app.route('/api/policies', methods=['GET'])
+def list_policies():
+    """List stored policies, newest first, with cursor-based pagination"""
     try:
-        data = request.get_json()
+        filters = {
+            'user_id': request.args.get('user_id'),
+            'type': request.args.get('type'),
+            'status': request.args.get('status')
+        }
+        limit = request.args.get('limit', storage.DEFAULT_PAGE_SIZE, type=int)
+        policies, next_cursor = storage.list_policies(filters, cursor=request.args.get('cursor'), limit=limit)
         
-        # Validate required fields
-        required_fields = ['policy_type', 'coverage_amount', 'term']
-        for field in required_fields:
-            if field not in data:
-                return jsonify({'error': f'{field} is required'}), 400
+        return jsonify({
+            'policies': policies,
+            'next_cursor': next_cursor
+        })
         
-        # Generate policy ID
-        policy_id = f"POL{datetime.now().strftime('%Y%m%d%H%M%S')}"
-        
-        policy = {
-            'id': policy_id,
-            'type': data['policy_type'],
-            'coverage_amount': data['coverage_amount'],
-            'term': data['term'],
-            'created_at': datetime.now().isoformat(),
-            'status': 'active'
-        }
+    except Exception as e:
+        logger.error("List policies error: %s", e)
+        return jsonify({'error': 'Internal server error'}), 500
+
+@app.route('/api/policies/<policy_id>', methods=['GET'])
+@conditional.cacheable(POLICY_MAX_AGE, public=False)
+def get_policy(policy_id):
+    """Look up a single stored policy"""
+    try:
+        policy = storage.get_policy(policy_id)
+        if policy is None:
+            return jsonify({'error': 'Policy not found'}), 404
+        return jsonify({'policy': policy})
+        
+    except Exception as e:
+        logger.error("Get policy error: %s", e)
+        return jsonify({'error': 'Internal server error'}), 500
+
+@app.route('/api/policies/import', methods=['POST'])
+@schemas.validate(schemas.POLICY_IMPORT)
+@admission.limit('cpu')
+def import_policies(data):
+    """Bulk insert policies in a single transaction"""
+    try:
+        policies = [
+            build_policy(policy_id, item, user_id=item.get('user_id', data.get('user_id')))
+            for policy_id, item in zip(new_ids(len(data['policies']), 'POL'), data['policies'])
+        ]
+        
+        imported = storage.bulk_insert_policies(policies)
         
         return jsonify({
             'success': True,
-            'policy': policy,
-            'message': 'Policy added successfully'
+            'imported': imported,
+            'policy_ids': [policy['id'] for policy in policies]
         })
         
     except Exception as e:
-        logger.error(f"Add policy error: {e}")
+        logger.error("Import policies error: %s", e)
         return jsonify({'error': 'Internal server error'}), 500
 
 @app.route('/api/recommendations', methods=['POST'])
-def get_recommendations():
+@schemas.validate(schemas.RECOMMENDATIONS)
+@admission.limit('cpu')
+def get_recommendations(data):
     """Get personalized financial recommendations"""
     try:
-        data = request.get_json()
-        user_profile = data.get('user_profile', {})
-        
-        # Generate recommendations based on profile
-        recommendations = []
-        
-        age = user_profile.get('age', 30)
-        income = user_profile.get('income', 0)
-        risk_tolerance = user_profile.get('riskTolerance', 'moderate')
-        
-        if age < 30:
-            recommendations.append({
-                'type': 'investment',
-                'title': 'Start SIP Early',
-                'description': 'Begin SIP investment to benefit from compounding',
-                'priority': 'high'
-            })
-        
-        if income > 500000:
-            recommendations.append({
-                'type': 'tax',
-                'title': 'Tax Planning',
-                'description': 'Consider ELSS funds for tax savings under Section 80C',
-                'priority': 'medium'
-            })
-        
-        if risk_tolerance == 'conservative':
-            recommendations.append({
-                'type': 'insurance',
-                'title': 'Term Insurance',
-                'description': 'Secure term insurance for family protection',
-                'priority': 'high'
-            })
+        profile = features.for_profile(data['user_profile'])
+        
+        # Generate recommendations from the compiled rule set (memoized per rule set version)
+        engine = rules.get_engine()
+        compiled = engine.current()
+        memo_key = cache.canonical_key('recommendation_matches', {
+            'rules': compiled.fingerprint,
+            'user_profile': profile.version
+        })
+        matches = cache.results.get(memo_key)
+        if matches is None:
+            matched = compiled.match(profile.as_profile())
+            matches = {
+                'rule_ids': [compiled.rules[index] for index in matched],
+                'recommendations': [dict(compiled.recommendations[index]) for index in matched]
+            }
+            cache.results.set(memo_key, matches)
+        # Memoized responses still count as rule hits in /api/recommendations/rules
+        engine.record_hits(matches['rule_ids'])
         
         return jsonify({
-            'recommendations': recommendations,
+            'recommendations': matches['recommendations'],
             'generated_at': datetime.now().isoformat()
         })
         
     except Exception as e:
-        logger.error(f"Recommendations error: {e}")
+        logger.error("Recommendations error: %s", e)
+        return jsonify({'error': 'Internal server error'}), 500
+
+@app.route('/api/recommendations/rules', methods=['GET'])
+def get_recommendation_rules():
+    """Rule set version and per-rule hit counters for this worker"""
+    try:
+        return jsonify({
+            'rules': rules.get_engine().stats(),
+            'worker_pid': os.getpid()
+        })
+        
+    except Exception as e:
+        logger.error("Recommendation rules stats error: %s", e)
         return jsonify({'error': 'Internal server error'}), 500
 
+# Investment risk points by type, duration, experience and risk tolerance
+INVESTMENT_TYPE_RISKS = {
+    'mutual fund': {'base_risk': 4, 'description': 'Diversified investment with moderate risk'},
+    'equity': {'base_risk': 8, 'description': 'High volatility, potential for high returns'},
+    'debt': {'base_risk': 2, 'description': 'Lower risk, stable returns'},
+    'fixed deposit': {'base_risk': 1, 'description': 'Very low risk, guaranteed returns'},
+    'insurance': {'base_risk': 3, 'description': 'Protection product with some investment component'},
+    'gold': {'base_risk': 5, 'description': 'Hedge against inflation, moderate volatility'},
+    'real estate': {'base_risk': 6, 'description': 'Illiquid, market dependent'},
+    'crypto': {'base_risk': 9, 'description': 'Highly volatile, unregulated'},
+    'bonds': {'base_risk': 2, 'description': 'Government/corporate debt, low risk'},
+    'etf': {'base_risk': 5, 'description': 'Exchange traded fund, moderate risk'}
+}
+DURATION_RISKS = {
+    'short term': {'risk': 3, 'description': 'Less than 1 year'},
+    'medium term': {'risk': 2, 'description': '1-5 years'},
+    'long term': {'risk': 1, 'description': 'More than 5 years'}
+}
+EXPERIENCE_RISKS = {
+    'beginner': 2,
+    'intermediate': 1,
+    'advanced': 0
+}
+TOLERANCE_RISKS = {
+    'conservative': 2,
+    'moderate': 0,
+    'aggressive': -1
+}
+
 @app.route('/api/investment/security-analysis', methods=['POST'])
-def analyze_investment_security():
+@schemas.validate(schemas.INVESTMENT_ANALYSIS)
+@admission.limit('cpu')
+def analyze_investment_security(data):
     """Analyze investment security based on investment details and user profile"""
     try:
-        data = request.get_json()
-        if not data:
-            return jsonify({'error': 'No data provided for analysis'}), 400
-            
-        investment_details = data.get('investment_details', {})
-        user_profile = data.get('user_profile', {})
-        
-        # Validate required fields
-        required_investment_fields = ['type', 'amount', 'duration']
-        missing_fields = [field for field in required_investment_fields if not investment_details.get(field)]
-        if missing_fields:
-            return jsonify({'error': f'Missing required investment fields: {", ".join(missing_fields)}'}), 400
-        
-        # Extract and validate key information
-        investment_type = investment_details.get('type', '').lower()
-        investment_amount = float(investment_details.get('amount', 0))
-        investment_duration = investment_details.get('duration', '').lower()
+        investment_details = data['investment_details']
+        profile = features.for_profile(data['user_profile'])
+        
+        # Type, amount and duration are checked and normalized by the route schema
+        investment_type = investment_details['type']
+        # float() as before schema validation: responses render it as e.g. ₹20000.0
+        investment_amount = float(investment_details['amount'])
+        investment_duration = investment_details['duration']
         expected_return = investment_details.get('expected_return', '')
-        risk_level = investment_details.get('risk_level', '').lower()
+        risk_level = investment_details.get('risk_level', '')
+        
+        user_age = profile.age
+        user_income = profile.income
+        user_risk_tolerance = profile.risk_tolerance
+        user_experience = profile.experience
         
-        # Validate investment amount
-        if investment_amount <= 0:
-            return jsonify({'error': 'Investment amount must be greater than 0'}), 400
+        memo_key = cache.canonical_key('investment_security', {
+            'investment_details': cache.pick(investment_details, INVESTMENT_FIELDS),
+            'user_profile': profile.version
+        })
+        analysis_result = cache.results.get(memo_key)
+        if analysis_result is not None:
+            analysis_result['metadata']['analysis_timestamp'] = datetime.now().isoformat()
+            return jsonify(analysis_result)
         
-        user_age = int(user_profile.get('age', 30))
-        user_income = float(user_profile.get('income', 0))
-        user_risk_tolerance = user_profile.get('riskTolerance', 'moderate').lower()
-        user_experience = user_profile.get('investmentExperience', 'beginner').lower()
-        user_goals = user_profile.get('financialGoals', [])
-        user_savings = float(user_profile.get('savings', 0))
-        user_debt = float(user_profile.get('debt', 0))
+        started = time.perf_counter()
         
-        # Enhanced risk assessment algorithm
-        risk_factors = []
-        risk_score = 0
+        # Enhanced risk assessment algorithm (findings are factor codes, see results.py)
+        assessment = InvestmentAssessment(investment_type, investment_amount, investment_duration,
+                                          expected_return, profile)
         
         # 1. Investment Type Risk Assessment
-        investment_type_risks = {
-            'mutual fund': {'base_risk': 4, 'description': 'Diversified investment with moderate risk'},
-            'equity': {'base_risk': 8, 'description': 'High volatility, potential for high returns'},
-            'debt': {'base_risk': 2, 'description': 'Lower risk, stable returns'},
-            'fixed deposit': {'base_risk': 1, 'description': 'Very low risk, guaranteed returns'},
-            'insurance': {'base_risk': 3, 'description': 'Protection product with some investment component'},
-            'gold': {'base_risk': 5, 'description': 'Hedge against inflation, moderate volatility'},
-            'real estate': {'base_risk': 6, 'description': 'Illiquid, market dependent'},
-            'crypto': {'base_risk': 9, 'description': 'Highly volatile, unregulated'},
-            'bonds': {'base_risk': 2, 'description': 'Government/corporate debt, low risk'},
-            'etf': {'base_risk': 5, 'description': 'Exchange traded fund, moderate risk'}
-        }
-        
-        type_risk = investment_type_risks.get(investment_type, {'base_risk': 5, 'description': 'Unknown investment type'})
-        risk_score += type_risk['base_risk']
-        risk_factors.append(f"Investment type ({investment_type}): {type_risk['description']}")
+        type_risk = INVESTMENT_TYPE_RISKS.get(investment_type, {'base_risk': 5, 'description': 'Unknown investment type'})
+        assessment.flag(type_risk['base_risk'], 'type', investment_type, type_risk['description'])
         
         # 2. Amount Risk Assessment
         if user_income > 0:
             investment_ratio = (investment_amount / user_income) * 100
             if investment_ratio > 50:
-                risk_score += 4
-                risk_factors.append(f"Investment amount ({investment_ratio:.1f}% of income) is very high")
+                assessment.flag(4, 'amount_very_high', investment_ratio)
             elif investment_ratio > 30:
-                risk_score += 2
-                risk_factors.append(f"Investment amount ({investment_ratio:.1f}% of income) is high")
+                assessment.flag(2, 'amount_high', investment_ratio)
             elif investment_ratio > 10:
-                risk_score += 1
-                risk_factors.append(f"Investment amount ({investment_ratio:.1f}% of income) is moderate")
+                assessment.flag(1, 'amount_moderate', investment_ratio)
         else:
-            risk_factors.append("Income information not available for amount assessment")
+            assessment.flag(0, 'income_unknown')
         
         # 3. Duration Risk Assessment
-        duration_risks = {
-            'short term': {'risk': 3, 'description': 'Less than 1 year'},
-            'medium term': {'risk': 2, 'description': '1-5 years'},
-            'long term': {'risk': 1, 'description': 'More than 5 years'}
-        }
-        duration_risk = duration_risks.get(investment_duration, {'risk': 2, 'description': 'Duration not specified'})
-        risk_score += duration_risk['risk']
-        risk_factors.append(f"Investment duration: {duration_risk['description']}")
+        duration_risk = DURATION_RISKS.get(investment_duration, {'risk': 2, 'description': 'Duration not specified'})
+        assessment.flag(duration_risk['risk'], 'duration', duration_risk['description'])
         
         # 4. User Profile Risk Assessment
         # Age factor
         if user_age < 25:
-            risk_score += 1  # Young investors can take more risk
-            risk_factors.append("Young age allows for higher risk tolerance")
+            assessment.flag(1, 'young')  # Young investors can take more risk
         elif user_age > 60:
-            risk_score += 2  # Older investors should be more conservative
-            risk_factors.append("Older age suggests conservative approach")
+            assessment.flag(2, 'older')  # Older investors should be more conservative
         
         # Income factor
-        if user_income < 300000:  # Less than 3 lakhs
-            risk_score += 2
-            risk_factors.append("Low income level increases risk")
-        elif user_income > 1000000:  # More than 10 lakhs
-            risk_score -= 1
-            risk_factors.append("High income provides financial cushion")
+        if profile.income_band == 'low':
+            assessment.flag(2, 'low_income')
+        elif profile.income_band == 'high':
+            assessment.flag(-1, 'high_income')
         
         # Experience factor
-        experience_risks = {
-            'beginner': 2,
-            'intermediate': 1,
-            'advanced': 0
-        }
-        experience_risk = experience_risks.get(user_experience, 1)
-        risk_score += experience_risk
-        risk_factors.append(f"Investment experience level: {user_experience}")
+        assessment.flag(EXPERIENCE_RISKS.get(user_experience, 1), 'experience', user_experience)
         
         # 5. Financial Health Assessment
         if user_income > 0:
             # Debt-to-income ratio
-            debt_ratio = (user_debt / user_income) * 100 if user_income > 0 else 0
+            debt_ratio = profile.debt_ratio
             if debt_ratio > 50:
-                risk_score += 3
-                risk_factors.append(f"High debt ratio ({debt_ratio:.1f}%) increases financial risk")
+                assessment.flag(3, 'debt_high', debt_ratio)
             elif debt_ratio > 30:
-                risk_score += 2
-                risk_factors.append(f"Moderate debt ratio ({debt_ratio:.1f}%)")
+                assessment.flag(2, 'debt_moderate', debt_ratio)
             
             # Savings adequacy
-            savings_ratio = (user_savings / user_income) * 100 if user_income > 0 else 0
-            if savings_ratio < 10:
-                risk_score += 2
-                risk_factors.append("Low savings ratio indicates financial vulnerability")
+            if profile.savings_ratio < 10:
+                assessment.flag(2, 'low_savings')
         
         # 6. Risk Tolerance Alignment
-        tolerance_risks = {
-            'conservative': 2,
-            'moderate': 0,
-            'aggressive': -1
-        }
-        tolerance_risk = tolerance_risks.get(user_risk_tolerance, 0)
-        risk_score += tolerance_risk
+        assessment.risk_score += TOLERANCE_RISKS.get(user_risk_tolerance, 0)
         
         # Normalize risk score to 1-10 scale
-        risk_score = max(1, min(10, risk_score))
-        
-        # Determine risk level and recommendation
-        if risk_score <= 3:
-            risk_level = 'low'
-            recommendation = 'Suitable'
-            suitability_score = 9
-        elif risk_score <= 5:
-            risk_level = 'medium'
-            recommendation = 'Moderate Risk'
-            suitability_score = 7
-        elif risk_score <= 7:
-            risk_level = 'high'
-            recommendation = 'High Risk'
-            suitability_score = 5
-        else:
-            risk_level = 'very high'
-            recommendation = 'Not Suitable'
-            suitability_score = 3
-        
-        # Generate personalized analysis
-        user_profile_analysis = {
-            'age_factor': f"Age {user_age} suggests {'long-term' if user_age < 40 else 'medium-term' if user_age < 55 else 'short-term'} investment horizon",
-            'income_factor': f"Income level {'supports' if user_income > 500000 else 'may limit'} this investment amount",
-            'experience_factor': f"Investment experience ({user_experience}) {'supports' if user_experience in ['intermediate', 'advanced'] else 'may limit'} this investment",
-            'goal_alignment': f"Investment {'aligns with' if user_goals else 'needs goal clarification'} financial objectives"
-        }
-        
-        # Risk mitigation strategies
-        risk_mitigation = [
-            "Diversify across multiple investment types",
-            "Start with smaller amounts and increase gradually",
-            "Set up emergency fund before investing",
-            "Consider professional financial advice",
-            "Regular review and rebalancing of portfolio"
-        ]
-        
-        if risk_score > 7:
-            risk_mitigation.extend([
-                "Consider lower-risk alternatives",
-                "Ensure adequate insurance coverage",
-                "Focus on debt reduction first",
-                "Build emergency fund of 6+ months expenses"
-            ])
-        
-        # Comparison analysis
-        comparison_analysis = {
-            'vs_risk_tolerance': f"Investment risk ({risk_level}) {'aligns with' if risk_level == user_risk_tolerance else 'differs from'} user tolerance ({user_risk_tolerance})",
-            'vs_alternatives': "Consider lower-risk alternatives if risk tolerance is conservative",
-            'vs_goals': "Ensure investment timeline matches financial goals",
-            'vs_market_conditions': "Current market conditions may affect investment performance"
-        }
-        
-        # Detailed recommendations
-        detailed_recommendations = [
-            f"Start with ₹{min(investment_amount, 50000)} if new to {investment_type}",
-            "Build emergency fund of 6 months expenses first",
-            "Consider SIP approach for equity investments",
-            "Review investment every 6 months",
-            "Consult financial advisor for large amounts"
-        ]
+        assessment.risk_score = max(1, min(10, assessment.risk_score))
         
-        if investment_amount > 100000:
-            detailed_recommendations.append("Consider professional financial planning for large investments")
-        
-        # Create comprehensive analysis result
-        analysis_result = {
-            "risk_assessment": {
-                "overall_risk_score": round(risk_score, 1),
-                "risk_level": risk_level,
-                "suitability_score": suitability_score,
-                "recommendation": recommendation,
-                "confidence_level": "high"
-            },
-            "risk_factors": risk_factors,
-            "user_profile_analysis": user_profile_analysis,
-            "risk_mitigation": risk_mitigation,
-            "comparison_analysis": comparison_analysis,
-            "detailed_recommendations": detailed_recommendations,
-            "investment_summary": {
-                "type": investment_type,
-                "amount": f"₹{investment_amount:,.2f}",
-                "duration": investment_duration,
-                "expected_return": expected_return,
-                "user_risk_tolerance": user_risk_tolerance
-            }
-        }
+        # Render the response shape (personalized analysis, mitigation, recommendations)
+        analysis_result = assessment.to_dict()
         
         # Add metadata
         analysis_result['metadata'] = {
             'analysis_timestamp': datetime.now().isoformat(),
             'investment_analyzed': investment_type,
             'user_profile_considered': True,
-            'ai_model_used': 'gemini-1.5-flash-latest' if model else 'enhanced_algorithm',
+            'ai_model_used': 'gemini-1.5-flash-latest' if GEMINI_API_KEY else 'enhanced_algorithm',
             'risk_calculation_method': 'comprehensive_multi_factor'
         }
         
+        observe_analysis('investment_security', started)
+        cache.results.set(memo_key, analysis_result)
         return jsonify(analysis_result)
         
     except ValueError as e:
-        logger.error(f"Value error in investment analysis: {e}")
+        logger.error("Value error in investment analysis: %s", e)
         return jsonify({'error': 'Invalid numeric values in investment details'}), 400
     except Exception as e:
-        logger.error(f"Investment security analysis error: {e}")
+        logger.error("Investment security analysis error: %s", e)
         return jsonify({'error': 'Internal server error during investment analysis'}), 500
 
 @app.errorhandler(404)
@@ -0,0 +1,82 @@
+#!/usr/bin/env python3
+"""
+Perceptual hash index benchmark
+
+Fills a PhashIndex with random 64-bit hashes plus near-duplicates of the
+query hashes (a few bits flipped), then times queries and checks every
+result against a brute-force scan of the same hashes.
+
+    python benchmarks/bench_phash_index.py
+    python benchmarks/bench_phash_index.py --size 100000 --queries 500 --distance 6
+"""
+
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--size', type=int, default=1_000_000, help='hashes in the index')
+    parser.add_argument('--queries', type=int, default=1000, help='queries to time')
+    parser.add_argument('--distance', type=int, default=8, help='maximum pHash distance')
+    parser.add_argument('--inserts', type=int, default=5000, help='single inserts to time after the bulk load')
+    args = parser.parse_args(argv)
+
+    sys.path.insert(0, BACKEND_DIR)
+    import numpy as np
+
+    import phash_index
+
+    workdir = tempfile.mkdtemp(prefix='bfsi-bench-')
+    path = os.path.join(workdir, 'phash.bin')
+    rng = np.random.default_rng(7)
+    hashes = rng.integers(0, 2 ** 63, size=args.size, dtype=np.uint64) * np.uint64(2) + \
+        rng.integers(0, 2, size=args.size, dtype=np.uint64)
+    queries = hashes[rng.choice(args.size, args.queries, replace=False)]
+    # Near-duplicates of each query: 1 to `distance` random bits flipped
+    for query in queries:
+        bits = rng.choice(64, rng.integers(1, args.distance + 1), replace=False)
+        hashes[rng.integers(args.size)] = query ^ np.uint64(sum(1 << int(bit) for bit in bits))
+    digests = rng.integers(0, 256, size=(args.size, 32), dtype=np.uint8)
+    records = np.empty((args.size, phash_index.RECORD_SIZE), dtype=np.uint8)
+    records[:, :8] = hashes.astype('>u8').view(np.uint8).reshape(-1, 8)
+    records[:, 8:16] = records[:, :8]
+    records[:, 16:] = digests
+    with open(path, 'wb') as handle:
+        handle.write(records.tobytes())
+
+    started = time.perf_counter()
+    index = phash_index.PhashIndex(path)
+    print(f"load {args.size} hashes: {time.perf_counter() - started:.2f}s")
+
+    elapsed = 0.0
+    mismatches = 0
+    found = 0
+    for query in queries:
+        query_hex = f'{int(query):016x}'
+        started = time.perf_counter()
+        result = index.search(query_hex, args.distance)
+        elapsed += time.perf_counter() - started
+        expected = np.flatnonzero(np.bitwise_count(hashes ^ query) <= args.distance)
+        if sorted(sha for sha, _ in result) != sorted(digests[i].tobytes().hex() for i in expected):
+            mismatches += 1
+        found += len(result)
+    print(f"search (distance <= {args.distance}): {elapsed / args.queries * 1e6:.0f} us/query, "
+          f"{found / args.queries:.1f} matches/query, {mismatches} mismatches vs brute force")
+
+    started = time.perf_counter()
+    for number in range(args.inserts):
+        value = f'{int(rng.integers(0, 2 ** 63)) * 2:016x}'
+        index.add(f'{number:064x}', value, value)
+    print(f"insert: {(time.perf_counter() - started) / args.inserts * 1e6:.0f} us/insert")
+    shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
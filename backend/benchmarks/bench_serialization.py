@@ -0,0 +1,114 @@
+#!/usr/bin/env python3
+"""
+JSON serialization benchmark for the API's response shapes
+
+Captures real responses from the app (security analysis of a multi-file
+upload, investment analysis, financial health, recommendations, batch
+underwriting, quote grid) through the test client and times encoding them
+with Flask's stdlib provider against the orjson provider the app uses.
+
+    python benchmarks/bench_serialization.py
+    python benchmarks/bench_serialization.py --files 50 --batch 1000 --seconds 1
+"""
+
+import argparse
+import io
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def capture_payloads(client, files, batch):
+    """Call each endpoint once and keep the decoded response bodies"""
+    profile = {'age': 34, 'income': 1200000, 'riskTolerance': 'moderate', 'savings': 300000, 'debt': 50000}
+    uploads = [(io.BytesIO(os.urandom(512)), f"statement_{index}.pdf") for index in range(files)]
+    applicant = {
+        'policy_data': {'policy_type': 'term', 'coverage_amount': 5000000, 'term_years': 20},
+        'user_profile': {'age': 35, 'medicalHistory': ['diabetes'], 'occupation': 'engineer'}
+    }
+    requests = {
+        f"security_analyze ({files} files)": ('post', '/api/security/analyze', {
+            'data': {'files': uploads, 'userProfile': json.dumps(profile)},
+            'content_type': 'multipart/form-data'
+        }),
+        'investment_security': ('post', '/api/investment/security-analysis', {'json': {
+            'investment_details': {'type': 'equity', 'amount': 500000, 'duration': '5 years',
+                                   'expected_return': '12%', 'risk_level': 'high'},
+            'user_profile': profile
+        }}),
+        'financial_health': ('post', '/api/financial/analyze', {'json': {'user_profile': profile}}),
+        'recommendations': ('post', '/api/recommendations', {'json': {'user_profile': profile}}),
+        f"underwriting_batch ({batch})": ('post', '/api/policies/underwriting/batch', {
+            'json': {'applicants': [applicant] * batch}
+        }),
+        'quote_grid (50x10)': ('post', '/api/policies/underwriting/quote-grid', {'json': {
+            'policy_data': {'policy_type': 'term'},
+            'coverage': {'start': 1000000, 'stop': 51000000, 'step': 1000000},
+            'term': [5, 10, 15, 20, 25, 30, 35, 40, 45, 50],
+            'user_profile': {'age': 30}
+        }})
+    }
+    payloads = {}
+    for name, (method, path, kwargs) in requests.items():
+        response = getattr(client, method)(path, **kwargs)
+        if response.status_code != 200:
+            raise RuntimeError(f"{path} returned {response.status_code}: {response.get_data(as_text=True)[:200]}")
+        payloads[name] = json.loads(response.get_data())
+    return payloads
+
+
+def measure(func, seconds):
+    """Return mean seconds per call, running for about `seconds`"""
+    func()
+    calls = 0
+    started = time.perf_counter()
+    deadline = started + seconds
+    while True:
+        func()
+        calls += 1
+        now = time.perf_counter()
+        if now >= deadline:
+            return (now - started) / calls
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--files', type=int, default=20, help='files in the security analysis upload')
+    parser.add_argument('--batch', type=int, default=500, help='applicants in the batch underwriting request')
+    parser.add_argument('--seconds', type=float, default=0.5, help='time per measurement')
+    args = parser.parse_args(argv)
+
+    workdir = tempfile.mkdtemp(prefix='bfsi-bench-')
+    os.environ.setdefault('DATABASE_PATH', os.path.join(workdir, 'bench.db'))
+    os.environ['GEMINI_API_KEY'] = ''
+    sys.path.insert(0, BACKEND_DIR)
+    os.chdir(workdir)
+
+    import logging
+    logging.disable(logging.WARNING)
+    from flask.json.provider import DefaultJSONProvider
+
+    import app as api
+    import serialization
+
+    payloads = capture_payloads(api.app.test_client(), args.files, args.batch)
+    stdlib = DefaultJSONProvider(api.app)
+    orjson_provider = serialization.OrjsonProvider(api.app)
+
+    print(f"{'response':<32} {'bytes':>9} {'stdlib us':>10} {'orjson us':>10} {'speedup':>8}")
+    with api.app.app_context():
+        for name, payload in payloads.items():
+            size = len(orjson_provider.response(payload).get_data())
+            baseline = measure(lambda: stdlib.response(payload), args.seconds)
+            fast = measure(lambda: orjson_provider.response(payload), args.seconds)
+            print(f"{name:<32} {size:>9} {baseline * 1e6:>10.1f} {fast * 1e6:>10.1f} {baseline / fast:>7.1f}x")
+    shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
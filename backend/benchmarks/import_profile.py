@@ -0,0 +1,74 @@
+#!/usr/bin/env python3
+"""
+Import-time profile of the API (cold start cost)
+
+Runs `python -X importtime -c "import app"` in a fresh interpreter and prints
+the slowest modules by cumulative and self time, plus the wall time of the
+import and, optionally, of the warmup hook.
+
+    python benchmarks/import_profile.py
+    python benchmarks/import_profile.py --top 30 --warmup
+"""
+
+import argparse
+import os
+import re
+import subprocess
+import sys
+import tempfile
+import time
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+LINE = re.compile(r'^import time:\s+(\d+)\s+\|\s+(\d+)\s+\|(\s*)(\S+)')
+
+
+def profile(statement, workdir):
+    env = dict(os.environ, PYTHONPATH=BACKEND_DIR, DATABASE_PATH=os.path.join(workdir, 'profile.db'))
+    started = time.perf_counter()
+    result = subprocess.run([sys.executable, '-X', 'importtime', '-c', statement],
+                            cwd=workdir, env=env, capture_output=True, text=True)
+    wall = time.perf_counter() - started
+    if result.returncode != 0:
+        raise RuntimeError(result.stderr[-2000:])
+    modules = []
+    for line in result.stderr.splitlines():
+        match = LINE.match(line)
+        if match:
+            self_us, cumulative_us, indent, name = match.groups()
+            modules.append((name, int(self_us), int(cumulative_us), len(indent) // 2))
+    return wall, modules
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--top', type=int, default=20)
+    parser.add_argument('--warmup', action='store_true', help='also time app.warmup() after the import')
+    args = parser.parse_args(argv)
+
+    with tempfile.TemporaryDirectory(prefix='bfsi-importtime-') as workdir:
+        wall, modules = profile('import app', workdir)
+        app_entry = next((m for m in modules if m[0] == 'app'), None)
+        print(f"Interpreter + import app: {wall * 1000:.0f}ms wall"
+              + (f", import app: {app_entry[2] / 1000:.0f}ms cumulative" if app_entry else ''))
+
+        print(f"\nTop {args.top} modules by cumulative import time (ms):")
+        for name, self_us, cumulative_us, depth in sorted(modules, key=lambda m: -m[2])[:args.top]:
+            print(f"  {cumulative_us / 1000:>8.1f}  {'  ' * depth}{name}")
+
+        print(f"\nTop {args.top} modules by self import time (ms):")
+        for name, self_us, cumulative_us, depth in sorted(modules, key=lambda m: -m[1])[:args.top]:
+            print(f"  {self_us / 1000:>8.1f}  {name}")
+
+        if args.warmup:
+            statement = ('import time, app; started = time.perf_counter(); app.warmup(); '
+                         'print(time.perf_counter() - started)')
+            env = dict(os.environ, PYTHONPATH=BACKEND_DIR, DATABASE_PATH=os.path.join(workdir, 'profile.db'))
+            result = subprocess.run([sys.executable, '-c', statement], cwd=workdir, env=env,
+                                    capture_output=True, text=True)
+            if result.returncode != 0:
+                raise RuntimeError(result.stderr[-2000:])
+            print(f"\napp.warmup(): {float(result.stdout.strip().splitlines()[-1]) * 1000:.0f}ms")
+
+
+if __name__ == '__main__':
+    main()
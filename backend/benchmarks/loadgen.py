@@ -0,0 +1,395 @@
+#!/usr/bin/env python3
+"""
+Load test and benchmark harness for the BFSI Finance Agent API
+
+Replays a weighted traffic mix (traffic_mix.json) against every route,
+either at a fixed concurrency (closed loop) or at a fixed arrival rate
+(open loop), and reports throughput, error rate and p50/p95/p99 latency per
+route. Results can be saved as a baseline and later runs compared to it.
+
+A mix entry is either one request or a scenario of `steps` run in order on
+one connection, e.g. create a resumable upload, send a chunk, complete it.
+A step's `capture` maps variable names to dotted paths in its JSON response
+(`{"upload_id": "upload_id"}`, `{"policy_id": "policy.id"}`); later steps
+use them as `{upload_id}` in their path. Every step is reported as its own
+route, and a scenario stops at its first failed step.
+
+Fully offline run (starts gunicorn plus the mock LLM server from mock_llm.py):
+    python benchmarks/loadgen.py --serve --concurrency 8 --duration 30 --save-baseline baseline.json
+    python benchmarks/loadgen.py --serve --rate 50 --duration 30 --baseline baseline.json
+
+Against an already running server:
+    python benchmarks/loadgen.py --base-url http://localhost:5000 --concurrency 4
+"""
+
+import argparse
+import base64
+import json
+import math
+import os
+import random
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+from mock_llm import MockLLMServer
+from mock_redis import MockRedisServer
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+BACKEND_DIR = os.path.dirname(BENCH_DIR)
+DEFAULT_MIX = os.path.join(BENCH_DIR, 'traffic_mix.json')
+
+
+def load_mix(path):
+    with open(path, encoding='utf-8') as f:
+        mix = json.load(f)['requests']
+    if not mix:
+        raise ValueError(f"Traffic mix {path} has no requests")
+    return mix
+
+
+class Recorder:
+    """Thread-safe collection of per-route latencies and errors"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.latencies = {}
+        self.errors = {}
+        self.statuses = {}
+
+    def record(self, name, latency, status):
+        ok = isinstance(status, int) and status < 400
+        with self._lock:
+            self.latencies.setdefault(name, []).append(latency)
+            self.errors[name] = self.errors.get(name, 0) + (0 if ok else 1)
+            counts = self.statuses.setdefault(name, {})
+            counts[str(status)] = counts.get(str(status), 0) + 1
+
+
+def _file_content(item):
+    if 'content_base64' in item:
+        return base64.b64decode(item['content_base64'])
+    return item['content']
+
+
+def _lookup(document, path):
+    """Value at a dotted path ('policy.id', 'results.0.id') of a JSON document"""
+    for part in path.split('.'):
+        document = document[int(part)] if isinstance(document, list) else document[part]
+    return document
+
+
+def send(session, base_url, entry, timeout, variables=None):
+    """Send one request from the mix; returns (status code or error name, captured variables)"""
+    url = f"{base_url}{entry['path'].format(**variables) if variables else entry['path']}"
+    kwargs = {'headers': entry.get('headers'), 'timeout': timeout}
+    try:
+        if entry.get('files'):
+            files = [(item['field'], (item['filename'], _file_content(item), item.get('content_type', 'text/plain')))
+                     for item in entry['files']]
+            response = session.request(entry['method'], url, data=entry.get('form'), files=files, **kwargs)
+        elif 'json' in entry:
+            response = session.request(entry['method'], url, json=entry['json'], **kwargs)
+        elif 'body' in entry:
+            response = session.request(entry['method'], url, data=entry['body'].encode(), **kwargs)
+        else:
+            response = session.request(entry['method'], url, **kwargs)
+        response.content  # read the full body
+        captured = {}
+        if entry.get('capture') and response.status_code < 400:
+            document = response.json()
+            captured = {name: _lookup(document, path) for name, path in entry['capture'].items()}
+        return response.status_code, captured
+    except requests.RequestException as e:
+        return type(e).__name__, {}
+    except (ValueError, KeyError, IndexError, TypeError):
+        return 'CaptureFailed', {}
+
+
+def perform(session, base_url, entry, timeout, recorder, started):
+    """Run one mix entry (a request or a scenario of steps), recording every request"""
+    variables = {}
+    for step in entry.get('steps', (entry,)):
+        status, captured = send(session, base_url, step, timeout, variables)
+        recorder.record(step['name'], time.perf_counter() - started, status)
+        if not isinstance(status, int) or status >= 400:
+            return
+        variables.update(captured)
+        started = time.perf_counter()
+
+
+def run_closed_loop(base_url, mix, concurrency, duration, timeout, seed):
+    """N workers each send the next request as soon as the previous one finishes"""
+    recorder = Recorder()
+    weights = [entry.get('weight', 1) for entry in mix]
+    deadline = time.perf_counter() + duration
+
+    def worker(index):
+        rng = random.Random(seed + index)
+        session = requests.Session()
+        while time.perf_counter() < deadline:
+            entry = rng.choices(mix, weights)[0]
+            perform(session, base_url, entry, timeout, recorder, time.perf_counter())
+
+    threads = [threading.Thread(target=worker, args=(i,), daemon=True) for i in range(concurrency)]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return recorder, time.perf_counter() - started
+
+
+def run_open_loop(base_url, mix, rate, duration, timeout, seed, max_workers):
+    """Send requests at a fixed arrival rate regardless of how fast they complete
+
+    Latency is measured from the scheduled send time, so time spent waiting
+    for a free client thread counts (no coordinated omission).
+    """
+    recorder = Recorder()
+    rng = random.Random(seed)
+    weights = [entry.get('weight', 1) for entry in mix]
+    sessions = threading.local()
+    interval = 1.0 / rate
+    total = int(rate * duration)
+
+    def fire(entry, scheduled):
+        if not hasattr(sessions, 'session'):
+            sessions.session = requests.Session()
+        perform(sessions.session, base_url, entry, timeout, recorder, scheduled)
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        for index in range(total):
+            scheduled = started + index * interval
+            delay = scheduled - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            pool.submit(fire, rng.choices(mix, weights)[0], scheduled)
+    return recorder, time.perf_counter() - started
+
+
+def percentile(sorted_values, pct):
+    """Nearest-rank percentile of an already sorted list"""
+    if not sorted_values:
+        return None
+    rank = max(1, math.ceil(pct / 100 * len(sorted_values)))
+    return sorted_values[rank - 1]
+
+
+def _stats(latencies, errors, elapsed):
+    ordered = sorted(latencies)
+    count = len(ordered)
+    return {
+        'requests': count,
+        'errors': errors,
+        'error_rate': round(errors / count, 4) if count else 0.0,
+        'throughput_rps': round(count / elapsed, 2) if elapsed else 0.0,
+        'mean_ms': round(sum(ordered) / count * 1000, 2) if count else None,
+        'p50_ms': round(percentile(ordered, 50) * 1000, 2) if count else None,
+        'p95_ms': round(percentile(ordered, 95) * 1000, 2) if count else None,
+        'p99_ms': round(percentile(ordered, 99) * 1000, 2) if count else None,
+        'max_ms': round(ordered[-1] * 1000, 2) if count else None
+    }
+
+
+def summarize(recorder, elapsed, settings):
+    routes = {name: dict(_stats(values, recorder.errors.get(name, 0), elapsed), statuses=recorder.statuses[name])
+              for name, values in sorted(recorder.latencies.items())}
+    every_latency = [value for values in recorder.latencies.values() for value in values]
+    return {
+        'settings': settings,
+        'elapsed_s': round(elapsed, 2),
+        'overall': _stats(every_latency, sum(recorder.errors.values()), elapsed),
+        'routes': routes
+    }
+
+
+def compare(summary, baseline, tolerance):
+    """Return a list of human-readable regressions against a baseline summary"""
+    regressions = []
+    scopes = [('overall', summary['overall'], baseline.get('overall', {}))]
+    scopes += [(name, stats, baseline.get('routes', {}).get(name, {})) for name, stats in summary['routes'].items()]
+    for name, current, previous in scopes:
+        if not previous:
+            continue
+        for key in ('p95_ms', 'p99_ms'):
+            if previous.get(key) and current.get(key) and current[key] > previous[key] * (1 + tolerance):
+                regressions.append(f"{name}: {key} {previous[key]} -> {current[key]}")
+        if current['error_rate'] > previous.get('error_rate', 0) + 0.01:
+            regressions.append(f"{name}: error rate {previous.get('error_rate', 0)} -> {current['error_rate']}")
+    # Throughput is only comparable when the load shape was the same
+    same_shape = all(baseline.get('settings', {}).get(key) == summary['settings'].get(key)
+                     for key in ('mode', 'rate', 'concurrency'))
+    previous_rps = baseline.get('overall', {}).get('throughput_rps')
+    if same_shape and previous_rps and summary['overall']['throughput_rps'] < previous_rps * (1 - tolerance):
+        regressions.append(f"overall: throughput {previous_rps} -> {summary['overall']['throughput_rps']} req/s")
+    return regressions
+
+
+def print_report(summary, regressions=None):
+    overall = summary['overall']
+    print(f"\n📊 {overall['requests']} requests in {summary['elapsed_s']}s - "
+          f"{overall['throughput_rps']} req/s, error rate {overall['error_rate']:.2%}")
+    print(f"   p50 {overall['p50_ms']}ms | p95 {overall['p95_ms']}ms | p99 {overall['p99_ms']}ms")
+    print(f"\n{'route':<22}{'reqs':>7}{'err%':>8}{'rps':>9}{'p50':>10}{'p95':>10}{'p99':>10}")
+    for name, stats in summary['routes'].items():
+        print(f"{name:<22}{stats['requests']:>7}{stats['error_rate'] * 100:>7.1f}%{stats['throughput_rps']:>9}"
+              f"{stats['p50_ms']:>10}{stats['p95_ms']:>10}{stats['p99_ms']:>10}")
+    if regressions is not None:
+        if regressions:
+            print("\n❌ Regressions against baseline:")
+            for line in regressions:
+                print(f"   {line}")
+        else:
+            print("\n✅ No regressions against baseline")
+
+
+def _free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def serve_app(workers, llm_url, workdir, extra_env=None):
+    """Start the API under gunicorn with all state in a scratch directory"""
+    port = _free_port()
+    env = dict(os.environ,
+               GEMINI_API_KEY='',
+               OLLAMA_BASE_URL=llm_url,
+               DATABASE_PATH=os.path.join(workdir, 'loadtest.db'),
+               PROMETHEUS_MULTIPROC_DIR=os.path.join(workdir, 'prometheus'),
+               # All load comes from one client address; measure the app, not the rate limiter
+               RATE_LIMIT_RPS=os.getenv('RATE_LIMIT_RPS', '0'),
+               LLM_RATE_LIMIT_RPS=os.getenv('LLM_RATE_LIMIT_RPS', '0'),
+               **(extra_env or {}))
+    process = subprocess.Popen(
+        [sys.executable, '-m', 'gunicorn', 'app:app',
+         '--config', os.path.join(BACKEND_DIR, 'gunicorn.conf.py'),
+         '--pythonpath', BACKEND_DIR,
+         '--bind', f"127.0.0.1:{port}", '--workers', str(workers), '--timeout', '120'],
+        cwd=workdir, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+    base_url = f"http://127.0.0.1:{port}"
+    deadline = time.time() + 60
+    while time.time() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError('gunicorn exited during startup')
+        try:
+            if requests.get(f"{base_url}/api/health", timeout=1).status_code == 200:
+                return process, base_url
+        except requests.RequestException:
+            pass
+        time.sleep(0.2)
+    process.terminate()
+    raise RuntimeError('API did not become ready within 60s')
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    target = parser.add_argument_group('target')
+    target.add_argument('--base-url', default='http://localhost:5000', help='API to test (ignored with --serve)')
+    target.add_argument('--serve', action='store_true', help='start gunicorn and the mock LLM locally (offline)')
+    target.add_argument('--workers', type=int, default=2, help='gunicorn workers with --serve')
+    target.add_argument('--llm-latency', default='fixed:50', help='mock LLM latency distribution (see mock_llm.py)')
+    target.add_argument('--llm-error-rate', type=float, default=0.0, help='mock LLM failure rate')
+    target.add_argument('--llm-tokens-per-sec', type=float, default=0.0, help='mock LLM generation speed')
+    target.add_argument('--cache-backend', choices=['memory', 'sqlite', 'redis'], default='sqlite',
+                        help='CACHE_BACKEND for --serve (redis starts mock_redis.py)')
+    load = parser.add_argument_group('load')
+    load.add_argument('--mix', default=DEFAULT_MIX, help='traffic mix JSON file')
+    load.add_argument('--only', nargs='*', help='restrict the mix to these request or scenario names')
+    load.add_argument('--concurrency', type=int, default=4, help='closed-loop client threads')
+    load.add_argument('--rate', type=float, help='open-loop arrival rate (req/s); overrides --concurrency')
+    load.add_argument('--max-workers', type=int, default=64, help='client threads for open-loop mode')
+    load.add_argument('--duration', type=float, default=20, help='seconds to run')
+    load.add_argument('--warmup', type=float, default=2, help='seconds of unrecorded warmup traffic')
+    load.add_argument('--timeout', type=float, default=130, help='per-request timeout')
+    load.add_argument('--seed', type=int, default=42)
+    report = parser.add_argument_group('report')
+    report.add_argument('--output', help='write the full summary JSON here')
+    report.add_argument('--save-baseline', help='write the summary as a baseline file')
+    report.add_argument('--baseline', help='compare against this baseline summary')
+    report.add_argument('--max-regression', type=float, default=0.10,
+                        help='allowed relative p95/p99/throughput regression (default 10%%)')
+    args = parser.parse_args(argv)
+
+    mix = load_mix(args.mix)
+    if args.only:
+        mix = [entry for entry in mix if entry['name'] in args.only]
+
+    llm = redis = process = workdir = None
+    base_url = args.base_url.rstrip('/')
+    try:
+        if args.serve:
+            workdir = tempfile.mkdtemp(prefix='bfsi-loadtest-')
+            llm = MockLLMServer(latency=args.llm_latency, error_rate=args.llm_error_rate,
+                                tokens_per_sec=args.llm_tokens_per_sec, seed=args.seed).start()
+            extra_env = {'CACHE_BACKEND': args.cache_backend}
+            if args.cache_backend == 'redis':
+                redis = MockRedisServer().start()
+                extra_env['REDIS_URL'] = redis.url
+            process, base_url = serve_app(args.workers, llm.url, workdir, extra_env)
+        print(f"🚀 Load testing {base_url} with {len(mix)} request types")
+
+        def run(duration):
+            if args.rate:
+                return run_open_loop(base_url, mix, args.rate, duration, args.timeout, args.seed, args.max_workers)
+            return run_closed_loop(base_url, mix, args.concurrency, duration, args.timeout, args.seed)
+
+        if args.warmup > 0:
+            run(args.warmup)
+            if llm:
+                llm.reset_stats()
+        recorder, elapsed = run(args.duration)
+        llm_calls = llm.stats['requests'] if llm else None
+    finally:
+        if process:
+            process.terminate()
+            process.wait(timeout=30)
+        if llm:
+            llm.stop()
+        if redis:
+            redis.stop()
+        if workdir:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    settings = {
+        'mode': 'open_loop' if args.rate else 'closed_loop',
+        'rate': args.rate,
+        'concurrency': None if args.rate else args.concurrency,
+        'duration_s': args.duration,
+        'served_locally': args.serve,
+        'workers': args.workers if args.serve else None,
+        'llm_latency': args.llm_latency if args.serve else None,
+        'llm_error_rate': args.llm_error_rate if args.serve else None,
+        'cache_backend': args.cache_backend if args.serve else None,
+        'mix': os.path.basename(args.mix)
+    }
+    summary = summarize(recorder, elapsed, settings)
+    summary['llm_calls'] = llm_calls
+
+    regressions = None
+    if args.baseline:
+        with open(args.baseline, encoding='utf-8') as f:
+            regressions = compare(summary, json.load(f), args.max_regression)
+    print_report(summary, regressions)
+
+    for path in (args.output, args.save_baseline):
+        if path:
+            with open(path, 'w', encoding='utf-8') as f:
+                json.dump(summary, f, indent=2)
+            print(f"💾 Summary saved to {path}")
+
+    return 1 if regressions else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
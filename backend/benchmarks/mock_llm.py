@@ -0,0 +1,271 @@
+#!/usr/bin/env python3
+"""
+Mock Ollama server for deterministic, offline performance testing
+
+Implements the Ollama `/api/generate` contract, streaming (NDJSON chunks) and
+non-streaming, with configurable latency distribution, error rate and token
+rate. Fraud, underwriting and FAQ prompts get canned JSON answers shaped like
+the ones the API parses; anything else gets a short text answer.
+
+    python benchmarks/mock_llm.py --port 11434 --latency lognormal:80:0.5 --error-rate 0.02
+    OLLAMA_BASE_URL=http://127.0.0.1:11434 python app.py
+
+Latency specs (milliseconds): fixed:MS, uniform:LOW:HIGH, normal:MEAN:STDDEV,
+lognormal:MEDIAN:SIGMA, exponential:MEAN. The latency is the time to the first
+token; the remaining tokens then arrive at --tokens-per-sec.
+
+GET /_mock/stats returns request counters (handy to check caching and
+request coalescing), POST /_mock/reset clears them.
+"""
+
+import argparse
+import json
+import math
+import random
+import threading
+import time
+from datetime import datetime, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+CANNED_RESPONSES = [
+    # (keywords that must all appear in the prompt, response)
+    (('faq',), [
+        {
+            'question': 'What is SIP investment and how should I start?',
+            'answer': 'A SIP invests a fixed amount in a mutual fund every month. Start small and stay invested.',
+            'category': 'Investment'
+        },
+        {
+            'question': 'How much life insurance coverage do I need?',
+            'answer': 'Aim for 10-15 times your annual income through a term plan.',
+            'category': 'Insurance'
+        }
+    ]),
+    (('fraud indicators',), {
+        'risk_level': 'low',
+        'confidence': 'medium',
+        'fraud_score': 18,
+        'indicators': ['Claim amount consistent with claim type', 'No prior claims on record'],
+        'recommendations': ['Verify hospital bill with provider', 'Proceed with standard review']
+    }),
+    (('underwriting',), {
+        'insights': ['Applicant profile is consistent with the declared occupation'],
+        'questions': ['Any family history of cardiac conditions?'],
+        'suggestions': ['Consider a critical illness rider']
+    })
+]
+DEFAULT_RESPONSE = ('This is a mock financial advisor response. Diversify your investments, '
+                    'keep an emergency fund of six months of expenses and review your insurance cover every year.')
+
+
+def parse_latency(spec):
+    """Turn a latency spec into a function rng -> seconds"""
+    kind, *params = spec.split(':')
+    values = [float(value) for value in params]
+    samplers = {
+        'fixed': lambda rng: values[0],
+        'uniform': lambda rng: rng.uniform(values[0], values[1]),
+        'normal': lambda rng: max(0.0, rng.gauss(values[0], values[1])),
+        'lognormal': lambda rng: rng.lognormvariate(math.log(values[0]), values[1]),
+        'exponential': lambda rng: rng.expovariate(1 / values[0]) if values[0] else 0.0
+    }
+    if kind not in samplers:
+        raise ValueError(f"Unknown latency distribution '{kind}'")
+    sampler = samplers[kind]
+    return lambda rng: sampler(rng) / 1000
+
+
+def canned_response(prompt, responses=CANNED_RESPONSES):
+    lowered = prompt.lower()
+    for keywords, response in responses:
+        if all(keyword in lowered for keyword in keywords):
+            return json.dumps(response, indent=2)
+    return DEFAULT_RESPONSE
+
+
+def tokenize(text):
+    """Split text into word-ish tokens that join back to the original"""
+    tokens = []
+    for word in text.split(' '):
+        tokens.append(word if not tokens else f" {word}")
+    return tokens
+
+
+class MockLLMServer:
+    """Threaded mock Ollama server; usable in-process or from the command line"""
+
+    def __init__(self, host='127.0.0.1', port=0, latency='fixed:50', error_rate=0.0,
+                 error_status=500, tokens_per_sec=0.0, seed=42, responses=CANNED_RESPONSES):
+        self.latency = parse_latency(latency)
+        self.error_rate = error_rate
+        self.error_status = error_status
+        self.tokens_per_sec = tokens_per_sec
+        self.responses = responses
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+        self.reset_stats()
+        self.httpd = ThreadingHTTPServer((host, port), self._handler())
+        self.httpd.daemon_threads = True
+        self._thread = None
+
+    @property
+    def url(self):
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def reset_stats(self):
+        with self._lock:
+            self.stats = {'requests': 0, 'streamed': 0, 'errors': 0, 'prompts': {}}
+
+    def _plan(self, prompt, stream):
+        """Draw latency/error outcome for one request under the lock (deterministic order)"""
+        with self._lock:
+            self.stats['requests'] += 1
+            self.stats['streamed'] += 1 if stream else 0
+            key = prompt[:80]
+            self.stats['prompts'][key] = self.stats['prompts'].get(key, 0) + 1
+            fail = self._rng.random() < self.error_rate
+            if fail:
+                self.stats['errors'] += 1
+            return self.latency(self._rng), fail
+
+    def _handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def _send_json(self, status, payload):
+                body = json.dumps(payload).encode()
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def do_GET(self):
+                if self.path == '/_mock/stats':
+                    with server._lock:
+                        self._send_json(200, json.loads(json.dumps(server.stats)))
+                elif self.path == '/api/tags':
+                    self._send_json(200, {'models': [{'name': 'mock:latest', 'size': 0}]})
+                elif self.path == '/':
+                    body = b'Ollama is running'
+                    self.send_response(200)
+                    self.send_header('Content-Length', str(len(body)))
+                    self.end_headers()
+                    self.wfile.write(body)
+                else:
+                    self._send_json(404, {'error': 'not found'})
+
+            def do_POST(self):
+                length = int(self.headers.get('Content-Length', 0))
+                raw = self.rfile.read(length) if length else b''
+                if self.path == '/_mock/reset':
+                    server.reset_stats()
+                    self._send_json(200, {'reset': True})
+                    return
+                if self.path != '/api/generate':
+                    self._send_json(404, {'error': 'not found'})
+                    return
+                try:
+                    request = json.loads(raw or b'{}')
+                except ValueError:
+                    self._send_json(400, {'error': 'invalid JSON'})
+                    return
+
+                prompt = request.get('prompt', '')
+                stream = request.get('stream', True)  # Ollama streams unless told not to
+                latency, fail = server._plan(prompt, stream)
+                time.sleep(latency)
+                if fail:
+                    self._send_json(server.error_status, {'error': 'mock LLM injected failure'})
+                    return
+
+                tokens = tokenize(canned_response(prompt, server.responses))
+                per_token = 1 / server.tokens_per_sec if server.tokens_per_sec else 0.0
+                started = time.perf_counter()
+                if stream:
+                    self._stream(request, tokens, per_token, latency)
+                else:
+                    time.sleep(per_token * max(len(tokens) - 1, 0))
+                    self._send_json(200, self._final(request, ''.join(tokens), len(tokens),
+                                                     latency + time.perf_counter() - started))
+
+            def _final(self, request, text, token_count, elapsed):
+                return {
+                    'model': request.get('model', 'mock'),
+                    'created_at': datetime.now(timezone.utc).isoformat(),
+                    'response': text,
+                    'done': True,
+                    'total_duration': int(elapsed * 1e9),
+                    'prompt_eval_count': len(request.get('prompt', '').split()),
+                    'eval_count': token_count
+                }
+
+            def _stream(self, request, tokens, per_token, latency):
+                started = time.perf_counter()
+                self.send_response(200)
+                self.send_header('Content-Type', 'application/x-ndjson')
+                self.send_header('Transfer-Encoding', 'chunked')
+                self.end_headers()
+                for index, token in enumerate(tokens):
+                    if index:
+                        time.sleep(per_token)
+                    self._chunk({
+                        'model': request.get('model', 'mock'),
+                        'created_at': datetime.now(timezone.utc).isoformat(),
+                        'response': token,
+                        'done': False
+                    })
+                final = self._final(request, '', len(tokens), latency + time.perf_counter() - started)
+                self._chunk(final)
+                self.wfile.write(b'0\r\n\r\n')
+
+            def _chunk(self, payload):
+                data = json.dumps(payload).encode() + b'\n'
+                self.wfile.write(f"{len(data):X}\r\n".encode() + data + b'\r\n')
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
+
+    def start(self):
+        self._thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=11434)
+    parser.add_argument('--latency', default='fixed:50', help='time to first token distribution (ms)')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='fraction of requests that fail')
+    parser.add_argument('--error-status', type=int, default=500)
+    parser.add_argument('--tokens-per-sec', type=float, default=0.0, help='generation speed (0 = instant)')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--responses', help='JSON file of [[keywords], response] pairs to use instead of the built-ins')
+    args = parser.parse_args(argv)
+
+    responses = CANNED_RESPONSES
+    if args.responses:
+        with open(args.responses, encoding='utf-8') as f:
+            responses = [(tuple(keywords), response) for keywords, response in json.load(f)]
+
+    server = MockLLMServer(args.host, args.port, args.latency, args.error_rate,
+                           args.error_status, args.tokens_per_sec, args.seed, responses)
+    print(f"Mock Ollama listening on {server.url}")
+    try:
+        server.httpd.serve_forever()
+    except KeyboardInterrupt:
+        server.stop()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,221 @@
+#!/usr/bin/env python3
+"""
+Redis-protocol stand-in for offline testing of CACHE_BACKEND=redis
+
+Speaks RESP2 and implements the commands the cache uses (GET, SET with
+EX/PX/NX/XX, DEL, EXISTS, SCAN, SELECT, AUTH, PING, FLUSHDB, DBSIZE, and
+EVAL of the cache's compare-and-delete lock release script) with key
+expiry, so the shared cache tier and its single-flight locks can be
+exercised without a Redis install.
+
+    python benchmarks/mock_redis.py --port 6379
+    CACHE_BACKEND=redis REDIS_URL=redis://127.0.0.1:6379/0 python app.py
+"""
+
+import argparse
+import fnmatch
+import socketserver
+import threading
+import time
+
+# cache.DELETE_IF_SCRIPT; no Lua here, so EVAL only runs this one script
+DELETE_IF_SCRIPT = (
+    b"if redis.call('GET', KEYS[1]) == ARGV[1] then return redis.call('DEL', KEYS[1]) end return 0"
+)
+
+
+class Store:
+    """Key space with lazy expiry, shared by all client connections"""
+
+    def __init__(self):
+        self.data = {}
+        self.lock = threading.Lock()
+        self.commands = 0
+
+    def _alive(self, key):
+        entry = self.data.get(key)
+        if entry is None:
+            return None
+        value, expires_at = entry
+        if expires_at is not None and expires_at <= time.monotonic():
+            del self.data[key]
+            return None
+        return value
+
+    def execute(self, args):
+        name = args[0].decode().upper()
+        with self.lock:
+            self.commands += 1
+            handler = getattr(self, f"cmd_{name.lower()}", None)
+            if handler is None:
+                return Error(f"ERR unknown command '{name}'")
+            try:
+                return handler(*args[1:])
+            except (TypeError, ValueError, IndexError):
+                return Error(f"ERR wrong arguments for '{name}' command")
+
+    def cmd_ping(self, message=None):
+        return message if message is not None else Simple('PONG')
+
+    def cmd_auth(self, *args):
+        return Simple('OK')
+
+    def cmd_select(self, db):
+        return Simple('OK')
+
+    def cmd_get(self, key):
+        return self._alive(key)
+
+    def cmd_set(self, key, value, *options):
+        options = [option.decode().upper() for option in options]
+        expires_at = None
+        nx = xx = False
+        position = 0
+        while position < len(options):
+            option = options[position]
+            if option in ('EX', 'PX'):
+                amount = float(options[position + 1])
+                expires_at = time.monotonic() + (amount if option == 'EX' else amount / 1000)
+                position += 2
+                continue
+            nx = nx or option == 'NX'
+            xx = xx or option == 'XX'
+            position += 1
+        exists = self._alive(key) is not None
+        if (nx and exists) or (xx and not exists):
+            return None
+        self.data[key] = (value, expires_at)
+        return Simple('OK')
+
+    def cmd_del(self, *keys):
+        removed = 0
+        for key in keys:
+            if self._alive(key) is not None:
+                del self.data[key]
+                removed += 1
+        return removed
+
+    def cmd_eval(self, script, numkeys, key, value):
+        if script != DELETE_IF_SCRIPT or int(numkeys) != 1:
+            return Error('ERR only the cache lock release script is supported')
+        return self.cmd_del(key) if self._alive(key) == value else 0
+
+    def cmd_exists(self, *keys):
+        return sum(1 for key in keys if self._alive(key) is not None)
+
+    def cmd_dbsize(self):
+        return sum(1 for key in list(self.data) if self._alive(key) is not None)
+
+    def cmd_flushdb(self, *args):
+        self.data.clear()
+        return Simple('OK')
+
+    def cmd_scan(self, cursor, *options):
+        # Everything in one page: cursor 0 in, cursor 0 out
+        pattern = b'*'
+        for index in range(0, len(options) - 1, 2):
+            if options[index].decode().upper() == 'MATCH':
+                pattern = options[index + 1]
+        keys = [key for key in list(self.data)
+                if self._alive(key) is not None and fnmatch.fnmatchcase(key.decode('latin-1'), pattern.decode('latin-1'))]
+        return [b'0', keys]
+
+
+class Simple(str):
+    """Simple string reply (+OK)"""
+
+
+class Error(str):
+    """Error reply (-ERR ...)"""
+
+
+def encode(reply):
+    if reply is None:
+        return b'$-1\r\n'
+    if isinstance(reply, Error):
+        return f"-{reply}\r\n".encode()
+    if isinstance(reply, Simple):
+        return f"+{reply}\r\n".encode()
+    if isinstance(reply, int):
+        return f":{reply}\r\n".encode()
+    if isinstance(reply, list):
+        return f"*{len(reply)}\r\n".encode() + b''.join(encode(item) for item in reply)
+    if isinstance(reply, str):
+        reply = reply.encode()
+    return b'$%d\r\n%s\r\n' % (len(reply), reply)
+
+
+def read_command(reader):
+    """Read one RESP array of bulk strings (or an inline command); None at EOF"""
+    line = reader.readline()
+    if not line:
+        return None
+    if not line.startswith(b'*'):
+        return line.split()
+    args = []
+    for _ in range(int(line[1:-2])):
+        header = reader.readline()
+        length = int(header[1:-2])
+        args.append(reader.read(length + 2)[:-2])
+    return args
+
+
+class _TCPServer(socketserver.ThreadingTCPServer):
+    allow_reuse_address = True
+    daemon_threads = True
+
+
+class MockRedisServer:
+    """Threaded RESP server; usable in-process or from the command line"""
+
+    def __init__(self, host='127.0.0.1', port=0):
+        self.store = Store()
+        store = self.store
+
+        class Handler(socketserver.StreamRequestHandler):
+            def handle(self):
+                while True:
+                    args = read_command(self.rfile)
+                    if args is None:
+                        return
+                    if not args:
+                        continue
+                    if args[0].upper() == b'QUIT':
+                        self.wfile.write(b'+OK\r\n')
+                        return
+                    self.wfile.write(encode(store.execute(args)))
+
+        self.server = _TCPServer((host, port), Handler)
+        self._thread = None
+
+    @property
+    def url(self):
+        host, port = self.server.server_address[:2]
+        return f"redis://{host}:{port}/0"
+
+    def start(self):
+        self._thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=6379)
+    args = parser.parse_args(argv)
+
+    server = MockRedisServer(args.host, args.port)
+    print(f"Mock Redis listening on {server.url}")
+    try:
+        server.server.serve_forever()
+    except KeyboardInterrupt:
+        server.stop()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,456 @@
+"""
+Caching of endpoint results and LLM answers.
+
+Values are stored as orjson bytes, so every hit decodes into a fresh object
+that the caller may stamp with a current timestamp. Keys are built with
+`canonical_key` from only the input fields that affect a result, so
+re-posting the same profile with extra UI fields still hits.
+
+Where cached data lives is chosen with `CACHE_BACKEND`:
+
+- ``memory``: in-process LRU only (per worker, cold after a restart)
+- ``sqlite`` (default): a SQLite file shared by all workers on the node
+  (`CACHE_DB_PATH`), fronted by a short-lived per-worker LRU
+- ``redis``: any Redis-protocol server (`REDIS_URL`), fronted by the same
+  per-worker LRU; benchmarks/mock_redis.py is a local stand-in
+
+`TieredCache.get_or_compute` adds stampede protection: the first worker to
+miss a key takes a lock in the shared backend and computes the value, while
+the others wait for it, so N workers missing the same FAQ make one LLM call.
+"""
+
+import hashlib
+import logging
+import os
+import queue
+import random
+import socket
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from contextlib import contextmanager
+from urllib.parse import unquote, urlsplit
+
+import orjson
+
+import metrics
+from storage import DATABASE_PATH, ConnectionPool, transaction
+
+logger = logging.getLogger(__name__)
+
+CACHE_ENABLED = os.getenv('CACHE_ENABLED', 'true').lower() == 'true'
+CACHE_BACKEND = os.getenv('CACHE_BACKEND', 'sqlite')
+CACHE_TTL = float(os.getenv('CACHE_TTL', '3600'))
+CACHE_MAX_ENTRIES = int(os.getenv('CACHE_MAX_ENTRIES', '2048'))
+# How long a worker may serve its local copy of a shared entry (seconds)
+CACHE_LOCAL_TTL = float(os.getenv('CACHE_LOCAL_TTL', '60'))
+CACHE_SHARED_MAX_ENTRIES = int(os.getenv('CACHE_SHARED_MAX_ENTRIES', '50000'))
+CACHE_DB_PATH = os.getenv('CACHE_DB_PATH', os.path.splitext(DATABASE_PATH)[0] + '-cache.db')
+REDIS_URL = os.getenv('REDIS_URL', 'redis://localhost:6379/0')
+REDIS_PREFIX = os.getenv('REDIS_PREFIX', 'bfsi:')
+# Longest a worker holds (or waits for) a single-flight lock; above the LLM call timeouts
+CACHE_LOCK_TIMEOUT = float(os.getenv('CACHE_LOCK_TIMEOUT', '60'))
+LOCK_POLL_INTERVAL = 0.05
+
+# Bump to invalidate every stored result after a change to the scoring code
+KEY_VERSION = 1
+
+# Fraction of writes that also prune expired / excess rows from the SQLite store
+PRUNE_PROBABILITY = 0.01
+# Reads refresh the SQLite store's access time at most this often (seconds)
+TOUCH_INTERVAL = 60
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS cache (
+    key TEXT PRIMARY KEY,
+    value BLOB NOT NULL,
+    expires_at REAL NOT NULL,
+    accessed_at REAL NOT NULL
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS idx_cache_accessed ON cache (accessed_at);
+"""
+
+
+def pick(mapping, fields):
+    """The subset of `mapping` that matters for a result"""
+    if not isinstance(mapping, dict):
+        return mapping
+    return {field: mapping[field] for field in fields if field in mapping}
+
+
+def canonical_key(namespace, payload):
+    """Stable key for `payload`: key order and whitespace do not matter"""
+    blob = orjson.dumps(payload, option=orjson.OPT_SORT_KEYS | orjson.OPT_NON_STR_KEYS)
+    return f"{namespace}:v{KEY_VERSION}:{hashlib.sha256(blob).hexdigest()}"
+
+
+class MemoryBackend:
+    """Thread-safe in-process LRU of bytes with per-entry expiry"""
+
+    def __init__(self, max_entries=CACHE_MAX_ENTRIES):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            value, expires_at = entry
+            if expires_at <= time.time():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def _store(self, key, value, ttl):
+        self._entries[key] = (value, time.time() + ttl)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def set(self, key, value, ttl):
+        with self._lock:
+            self._store(key, value, ttl)
+
+    def add(self, key, value, ttl):
+        """Set `key` only if it is absent; True if it was set"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[1] > time.time():
+                return False
+            self._store(key, value, ttl)
+            return True
+
+    def delete(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def delete_if(self, key, value):
+        """Delete `key` only while it still holds `value`"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] == value:
+                del self._entries[key]
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+
+class SQLiteBackend:
+    """Key/value store in a local SQLite file shared by all workers on the node"""
+
+    def __init__(self, path=CACHE_DB_PATH, max_entries=CACHE_SHARED_MAX_ENTRIES):
+        self.max_entries = max_entries
+        self.pool = ConnectionPool(path, 4)
+        if hasattr(os, 'register_at_fork'):
+            os.register_at_fork(after_in_child=self.pool.reset)
+        with self.pool.connection() as conn:
+            conn.executescript(SCHEMA)
+
+    def get(self, key):
+        now = time.time()
+        with self.pool.connection() as conn:
+            row = conn.execute(
+                'SELECT value, expires_at, accessed_at FROM cache WHERE key = ?', (key,)
+            ).fetchone()
+            if row is None or row[1] <= now:
+                return None
+            if now - row[2] > TOUCH_INTERVAL:
+                conn.execute('UPDATE cache SET accessed_at = ? WHERE key = ?', (now, key))
+        return row[0]
+
+    def set(self, key, value, ttl):
+        now = time.time()
+        with self.pool.connection() as conn:
+            conn.execute(
+                'INSERT OR REPLACE INTO cache (key, value, expires_at, accessed_at) VALUES (?, ?, ?, ?)',
+                (key, value, now + ttl, now)
+            )
+            if random.random() < PRUNE_PROBABILITY:
+                self._prune(conn)
+
+    def add(self, key, value, ttl):
+        now = time.time()
+        with self.pool.connection() as conn, transaction(conn):
+            conn.execute('DELETE FROM cache WHERE key = ? AND expires_at <= ?', (key, now))
+            cursor = conn.execute(
+                'INSERT OR IGNORE INTO cache (key, value, expires_at, accessed_at) VALUES (?, ?, ?, ?)',
+                (key, value, now + ttl, now)
+            )
+        return cursor.rowcount == 1
+
+    def delete(self, key):
+        with self.pool.connection() as conn:
+            conn.execute('DELETE FROM cache WHERE key = ?', (key,))
+
+    def delete_if(self, key, value):
+        """Delete `key` only while it still holds `value`"""
+        with self.pool.connection() as conn:
+            conn.execute('DELETE FROM cache WHERE key = ? AND value = ?', (key, value))
+
+    def clear(self):
+        with self.pool.connection() as conn:
+            conn.execute('DELETE FROM cache')
+
+    def _prune(self, conn):
+        """Drop expired rows, then the least recently used ones above the bound"""
+        conn.execute('DELETE FROM cache WHERE expires_at <= ?', (time.time(),))
+        excess = conn.execute('SELECT COUNT(*) FROM cache').fetchone()[0] - self.max_entries
+        if excess > 0:
+            conn.execute(
+                'DELETE FROM cache WHERE key IN (SELECT key FROM cache ORDER BY accessed_at LIMIT ?)',
+                (excess,)
+            )
+
+
+# Compare-and-delete in one server-side step (see RedisBackend.delete_if)
+DELETE_IF_SCRIPT = (
+    "if redis.call('GET', KEYS[1]) == ARGV[1] then return redis.call('DEL', KEYS[1]) end return 0"
+)
+
+
+class RedisError(Exception):
+    """Error reply from a Redis server"""
+
+
+class RedisConnection:
+    """One RESP connection; just enough protocol for caching"""
+
+    def __init__(self, host, port, db=0, password=None, timeout=5):
+        self.sock = socket.create_connection((host, port), timeout=timeout)
+        self.reader = self.sock.makefile('rb')
+        if password:
+            self.command('AUTH', password)
+        if db:
+            self.command('SELECT', db)
+
+    def command(self, *args):
+        parts = [b'*%d\r\n' % len(args)]
+        for arg in args:
+            data = arg if isinstance(arg, bytes) else str(arg).encode()
+            parts.append(b'$%d\r\n%s\r\n' % (len(data), data))
+        self.sock.sendall(b''.join(parts))
+        return self._reply()
+
+    def _reply(self):
+        line = self.reader.readline()
+        if not line.endswith(b'\r\n'):
+            raise ConnectionError('Redis connection closed')
+        kind, rest = line[:1], line[1:-2]
+        if kind == b'+':
+            return rest.decode()
+        if kind == b'-':
+            raise RedisError(rest.decode())
+        if kind == b':':
+            return int(rest)
+        if kind == b'$':
+            length = int(rest)
+            return None if length < 0 else self.reader.read(length + 2)[:-2]
+        if kind == b'*':
+            length = int(rest)
+            return None if length < 0 else [self._reply() for _ in range(length)]
+        raise RedisError(f"Unexpected reply {line!r}")
+
+    def close(self):
+        try:
+            self.reader.close()
+            self.sock.close()
+        except OSError:
+            pass
+
+
+class RedisBackend:
+    """Cache backend on any Redis-protocol server, keys namespaced by `prefix`"""
+
+    def __init__(self, url=REDIS_URL, prefix=REDIS_PREFIX, pool_size=8):
+        parts = urlsplit(url)
+        self.host = parts.hostname or 'localhost'
+        self.port = parts.port or 6379
+        self.password = unquote(parts.password) if parts.password else None
+        self.db = int(parts.path.strip('/') or 0)
+        self.prefix = prefix
+        self.pool_size = pool_size
+        self.reset()
+        if hasattr(os, 'register_at_fork'):
+            os.register_at_fork(after_in_child=self.reset)
+
+    def reset(self):
+        """Drop pooled connections (they must not be shared across fork)"""
+        self._idle = queue.LifoQueue(maxsize=self.pool_size)
+
+    @contextmanager
+    def connection(self):
+        try:
+            conn = self._idle.get_nowait()
+        except queue.Empty:
+            conn = RedisConnection(self.host, self.port, self.db, self.password)
+        healthy = False
+        try:
+            yield conn
+            healthy = True
+        finally:
+            if not healthy:
+                conn.close()  # the reply stream may be out of sync now
+            else:
+                try:
+                    self._idle.put_nowait(conn)
+                except queue.Full:
+                    conn.close()
+
+    def _command(self, *args):
+        with self.connection() as conn:
+            return conn.command(*args)
+
+    def get(self, key):
+        return self._command('GET', self.prefix + key)
+
+    def set(self, key, value, ttl):
+        self._command('SET', self.prefix + key, value, 'PX', max(int(ttl * 1000), 1))
+
+    def add(self, key, value, ttl):
+        return self._command('SET', self.prefix + key, value, 'PX', max(int(ttl * 1000), 1), 'NX') == 'OK'
+
+    def delete(self, key):
+        self._command('DEL', self.prefix + key)
+
+    def delete_if(self, key, value):
+        """Delete `key` only while it still holds `value`"""
+        self._command('EVAL', DELETE_IF_SCRIPT, 1, self.prefix + key, value)
+
+    def clear(self):
+        cursor = b'0'
+        while True:
+            cursor, keys = self._command('SCAN', cursor, 'MATCH', self.prefix + '*', 'COUNT', 500)
+            if keys:
+                self._command('DEL', *keys)
+            if cursor in (b'0', '0'):
+                return
+
+
+def create_backend(name=CACHE_BACKEND):
+    if name == 'memory':
+        return MemoryBackend()
+    if name == 'sqlite':
+        return SQLiteBackend()
+    if name == 'redis':
+        return RedisBackend()
+    raise ValueError(f"Unknown CACHE_BACKEND '{name}'")
+
+
+class TieredCache:
+    """A named cache of JSON-able objects: per-worker LRU in front of the configured backend"""
+
+    def __init__(self, name, backend, ttl=CACHE_TTL):
+        self.name = name
+        self.backend = backend
+        self.ttl = ttl
+        # A memory backend already is the local tier
+        self.local = None if isinstance(backend, MemoryBackend) else MemoryBackend()
+
+    def _get_local(self, key):
+        return self.local.get(key) if self.local is not None else None
+
+    def _get_shared(self, key):
+        try:
+            value = self.backend.get(key)
+        except Exception as e:
+            logger.warning("Cache backend read failed: %s", e)
+            return None
+        if value is not None and self.local is not None:
+            self.local.set(key, value, min(self.ttl, CACHE_LOCAL_TTL))
+        return value
+
+    def get(self, key):
+        if not CACHE_ENABLED:
+            return None
+        value = self._get_local(key)
+        if value is not None:
+            metrics.CACHE_REQUESTS.labels(self.name, 'hit_local').inc()
+            return orjson.loads(value)
+        value = self._get_shared(key)
+        if value is not None:
+            metrics.CACHE_REQUESTS.labels(self.name, 'hit_shared').inc()
+            return orjson.loads(value)
+        metrics.CACHE_REQUESTS.labels(self.name, 'miss').inc()
+        return None
+
+    def set(self, key, obj, ttl=None):
+        if not CACHE_ENABLED:
+            return
+        ttl = ttl or self.ttl
+        value = orjson.dumps(obj, option=orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS)
+        if self.local is not None:
+            self.local.set(key, value, min(ttl, CACHE_LOCAL_TTL))
+        try:
+            self.backend.set(key, value, ttl)
+        except Exception as e:
+            # A busy or broken shared store only costs a recomputation elsewhere
+            logger.warning("Cache backend write failed: %s", e)
+
+    def get_or_compute(self, key, compute, ttl=None):
+        """Cached value for `key`, or compute it - once across all workers sharing the backend
+
+        `compute` returning None means "do not cache". Waiters that time out,
+        or whose lock holder gave up without a value, compute it themselves.
+        """
+        value = self.get(key)
+        if value is not None or not CACHE_ENABLED:
+            return value if value is not None else compute()
+
+        lock_key = f"lock:{key}"
+        token = uuid.uuid4().hex.encode()
+        try:
+            acquired = self.backend.add(lock_key, token, CACHE_LOCK_TIMEOUT)
+        except Exception as e:
+            logger.warning("Cache lock failed, computing without it: %s", e)
+            acquired = True
+            token = None
+
+        if acquired:
+            try:
+                value = compute()
+                if value is not None:
+                    self.set(key, value, ttl)
+                return value
+            finally:
+                if token is not None:
+                    self._release(lock_key, token)
+
+        # Another worker (or thread) is computing it: wait for the result
+        deadline = time.monotonic() + CACHE_LOCK_TIMEOUT
+        while time.monotonic() < deadline:
+            time.sleep(LOCK_POLL_INTERVAL)
+            value = self._get_shared(key)
+            if value is not None:
+                metrics.CACHE_REQUESTS.labels(self.name, 'waited').inc()
+                return orjson.loads(value)
+            try:
+                if self.backend.get(lock_key) is None:
+                    break
+            except Exception:
+                break
+        return compute()
+
+    def _release(self, lock_key, token):
+        try:
+            # Only drop our own lock, atomically: it may have expired and been taken over
+            self.backend.delete_if(lock_key, token)
+        except Exception as e:
+            logger.warning("Cache lock release failed: %s", e)
+
+    def clear(self):
+        if self.local is not None:
+            self.local.clear()
+        self.backend.clear()
+
+
+backend = create_backend()
+results = TieredCache('results', backend)
+llm_responses = TieredCache('llm', backend)
@@ -0,0 +1,112 @@
+"""
+Negotiated response compression.
+
+Text/JSON responses of at least `COMPRESSION_MIN_SIZE` bytes are compressed
+with brotli when the client accepts it and the `brotli` package is
+installed, otherwise with gzip. Streamed responses are compressed chunk by
+chunk. Compressible responses always carry `Vary: Accept-Encoding` so caches
+keep the encodings apart.
+"""
+
+import os
+import zlib
+
+from flask import request
+
+try:
+    import brotli
+except ImportError:  # optional, gzip only without it
+    brotli = None
+
+COMPRESSION_MIN_SIZE = int(os.getenv('COMPRESSION_MIN_SIZE', '1024'))
+GZIP_LEVEL = int(os.getenv('GZIP_LEVEL', '6'))
+BROTLI_QUALITY = int(os.getenv('BROTLI_QUALITY', '5'))
+
+COMPRESSIBLE_TYPES = {
+    'application/json',
+    'application/x-ndjson',
+    'application/javascript',
+    'image/svg+xml',
+    'text/css',
+    'text/html',
+    'text/plain'
+}
+
+
+class Compressor:
+    """Incremental compressor with one interface for gzip and brotli"""
+
+    def __init__(self, encoding):
+        self.encoding = encoding
+        if encoding == 'br':
+            self._compressor = brotli.Compressor(quality=BROTLI_QUALITY)
+        else:
+            self._compressor = zlib.compressobj(GZIP_LEVEL, zlib.DEFLATED, 31)  # 31 = gzip container
+
+    def compress(self, data):
+        if self.encoding == 'br':
+            return self._compressor.process(data)
+        return self._compressor.compress(data)
+
+    def flush(self):
+        """Emit everything buffered so far (the stream stays open)"""
+        if self.encoding == 'br':
+            return self._compressor.flush()
+        return self._compressor.flush(zlib.Z_SYNC_FLUSH)
+
+    def finish(self):
+        if self.encoding == 'br':
+            return self._compressor.finish()
+        return self._compressor.flush()
+
+
+def negotiate():
+    """Best encoding both sides support, or None"""
+    offered = ['br', 'gzip'] if brotli else ['gzip']
+    return request.accept_encodings.best_match(offered)
+
+
+def compress(data, encoding):
+    compressor = Compressor(encoding)
+    return compressor.compress(data) + compressor.finish()
+
+
+def compress_stream(chunks, encoding):
+    """Compress an iterable of chunks, flushing after each so the client sees progress"""
+    compressor = Compressor(encoding)
+    for chunk in chunks:
+        if isinstance(chunk, str):
+            chunk = chunk.encode()
+        data = compressor.compress(chunk) + compressor.flush()
+        if data:
+            yield data
+    yield compressor.finish()
+
+
+def init_app(app):
+    """Compress eligible responses after all other processing"""
+
+    @app.after_request
+    def _compress_response(response):
+        if (response.status_code < 200 or response.status_code in (204, 206, 304)
+                or response.mimetype not in COMPRESSIBLE_TYPES
+                or 'Content-Encoding' in response.headers
+                or request.method == 'HEAD'):
+            return response
+        response.vary.add('Accept-Encoding')
+        encoding = negotiate()
+        if not encoding:
+            return response
+
+        if response.is_streamed:
+            if response.direct_passthrough:
+                return response
+            response.response = compress_stream(response.response, encoding)
+            response.headers.pop('Content-Length', None)
+        else:
+            data = response.get_data()
+            if len(data) < COMPRESSION_MIN_SIZE:
+                return response
+            response.set_data(compress(data, encoding))
+        response.headers['Content-Encoding'] = encoding
+        return response
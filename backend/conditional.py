@@ -0,0 +1,109 @@
+"""
+ETags, Cache-Control and conditional GET.
+
+Every successful GET/HEAD response gets a weak ETag (weak because the body
+may be sent gzip/brotli encoded) and is answered with `304 Not Modified`
+when the client's `If-None-Match` matches. Views without their own caching
+policy get `Cache-Control: private, no-cache`, i.e. revalidate every time.
+
+Views decorated with `@cacheable(max_age)` also remember the ETag they
+produced per request (path + query string) for `max_age` seconds, so a
+matching `If-None-Match` within that window is answered with a 304 before
+the view runs at all - e.g. `/api/faq` skips the LLM call.
+"""
+
+import functools
+import os
+import threading
+import time
+from collections import OrderedDict
+
+from flask import current_app, request
+
+CONDITIONAL_CACHE_SIZE = int(os.getenv('CONDITIONAL_CACHE_SIZE', '4096'))
+
+
+class EtagCache:
+    """Thread-safe LRU of request key -> (etag, expires at)"""
+
+    def __init__(self, max_entries=CONDITIONAL_CACHE_SIZE):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            etag, expires_at = entry
+            if expires_at <= time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return etag
+
+    def put(self, key, etag, ttl):
+        with self._lock:
+            self._entries[key] = (etag, time.monotonic() + ttl)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+etags = EtagCache()
+
+
+def request_key():
+    return f"{request.path}?{request.query_string.decode('latin-1')}"
+
+
+def _set_cache_control(response, max_age, public):
+    response.cache_control.max_age = max_age
+    if public:
+        response.cache_control.public = True
+    else:
+        response.cache_control.private = True
+
+
+def cacheable(max_age, public=True):
+    """Let clients and caches reuse the view's GET response for `max_age` seconds"""
+    def decorator(view):
+        @functools.wraps(view)
+        def wrapper(*args, **kwargs):
+            if request.method not in ('GET', 'HEAD'):
+                return view(*args, **kwargs)
+            key = request_key()
+            etag = etags.get(key)
+            if etag and request.if_none_match.contains_weak(etag):
+                response = current_app.response_class(status=304)
+                response.set_etag(etag, weak=True)
+                _set_cache_control(response, max_age, public)
+                return response
+
+            response = current_app.make_response(view(*args, **kwargs))
+            if response.status_code == 200 and not response.is_streamed:
+                response.add_etag(weak=True)
+                _set_cache_control(response, max_age, public)
+                etags.put(key, response.get_etag()[0], max_age)
+            return response
+        return wrapper
+    return decorator
+
+
+def init_app(app):
+    """Add validators to GET responses and answer matching ones with 304"""
+
+    @app.after_request
+    def _conditional_response(response):
+        if request.method not in ('GET', 'HEAD') or response.status_code != 200 or response.is_streamed:
+            return response
+        if not response.cache_control:
+            response.cache_control.private = True
+            response.cache_control.no_cache = True
+        response.add_etag(weak=True)
+        return response.make_conditional(request)
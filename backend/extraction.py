@@ -0,0 +1,550 @@
+"""
+Text and metadata extraction for uploaded documents, with a local index.
+
+`index_file()` hashes an uploaded file and, unless a document with the
+same SHA-256 was seen before, extracts:
+
+- PDF: the text layer (FlateDecode content streams, literal-string text
+  operators) and the document info dictionary. This is a deliberately small
+  parser with no extra dependency. Text drawn through CID fonts or
+  scanned-only pages yields little or no text, but the metadata is still
+  extracted.
+- DOCX: paragraph text from word/document.xml and the core/app properties.
+- Images: format, dimensions and EXIF (camera, software, timestamps, GPS
+  presence) via Pillow.
+- TXT: the text itself. Legacy DOC: printable character runs.
+
+Amounts, dates and words are pulled out of the text. Everything is stored
+in a SQLite database (`DOCUMENTS_DB_PATH`) shared by the workers:
+- documents: one row per content hash, so identical files are parsed once
+- postings: an inverted index from term to document
+- files: the uploads (and claims) each document arrived with
+Fraud checks can then ask which of a claim's documents mention a name,
+amount or date, or which other claims carry the same file, without
+re-parsing anything.
+"""
+
+import hashlib
+import html
+import json
+import logging
+import os
+import re
+import struct
+import time
+import zipfile
+import zlib
+from datetime import date
+
+import metrics
+from storage import DATABASE_PATH, ConnectionPool, transaction
+
+DOCUMENTS_DB_PATH = os.getenv('DOCUMENTS_DB_PATH', os.path.splitext(DATABASE_PATH)[0] + '-documents.db')
+# Larger files are hashed and linked but not parsed
+EXTRACT_MAX_BYTES = int(float(os.getenv('EXTRACT_MAX_MB', '25')) * 1024 * 1024)
+# Content stream bytes scanned per PDF, decompressed or not; bounds the work a claim submission waits on
+EXTRACT_MAX_INFLATE_BYTES = int(float(os.getenv('EXTRACT_MAX_INFLATE_MB', '4')) * 1024 * 1024)
+MAX_TEXT_CHARS = 100_000
+MAX_TERMS = 5000
+# Bump when extraction changes so cached documents are parsed again
+EXTRACTOR_VERSION = 1
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS documents (
+    sha256 TEXT PRIMARY KEY,
+    version INTEGER NOT NULL,
+    kind TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    extracted_at REAL NOT NULL,
+    data TEXT NOT NULL
+) WITHOUT ROWID;
+
+CREATE TABLE IF NOT EXISTS postings (
+    term TEXT NOT NULL,
+    sha256 TEXT NOT NULL,
+    PRIMARY KEY (term, sha256)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS idx_postings_document ON postings (sha256);
+
+CREATE TABLE IF NOT EXISTS files (
+    stored_name TEXT PRIMARY KEY,
+    sha256 TEXT NOT NULL,
+    claim_id TEXT,
+    added_at REAL NOT NULL
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS idx_files_document ON files (sha256, claim_id);
+"""
+
+logger = logging.getLogger(__name__)
+
+# Text patterns
+
+WORD_RE = re.compile(r"[^\W\d_]{2,}")
+AMOUNT_RE = re.compile(
+    r'(?:₹|\brs\.?|\binr|\$)\s*([0-9][0-9,]*(?:\.[0-9]{1,2})?)'  # with a currency marker
+    r'|\b([0-9]{1,3}(?:,[0-9]{2,3})+(?:\.[0-9]{1,2})?)\b',        # or digit grouping
+    re.IGNORECASE
+)
+MONTHS = {name: index for index, name in enumerate(
+    ('jan', 'feb', 'mar', 'apr', 'may', 'jun', 'jul', 'aug', 'sep', 'oct', 'nov', 'dec'), start=1)}
+ISO_DATE_RE = re.compile(r'\b(\d{4})-(\d{1,2})-(\d{1,2})\b')
+NUMERIC_DATE_RE = re.compile(r'\b(\d{1,2})[/.-](\d{1,2})[/.-](\d{4})\b')  # day first (Indian usage)
+NAMED_DATE_RE = re.compile(r'\b(\d{1,2})(?:st|nd|rd|th)?\s+([A-Za-z]{3})[a-z]*\.?,?\s+(\d{4})\b')
+
+# PDF syntax
+
+PDF_STREAM_RE = re.compile(rb'stream\r?\n')
+PDF_TEXT_BLOCK_RE = re.compile(rb'BT(.*?)ET', re.S)
+PDF_TEXT_OP_RE = re.compile(rb'(\((?:\\.|[^\\)])*\))\s*(?:Tj|\'|")|\[((?:\\.|[^\]\\])*)\]\s*TJ|(T\*|Td|TD|Tm)(?![A-Za-z])', re.S)
+PDF_STRING_RE = re.compile(rb'\((?:\\.|[^\\)])*\)|(-?\d+(?:\.\d+)?)', re.S)
+PDF_INFO_RE = re.compile(rb'/(Author|Creator|Producer|Title|Subject|CreationDate|ModDate)\s*\(((?:\\.|[^\\)])*)\)')
+PDF_ESCAPES = {b'n': b'\n', b'r': b'\r', b't': b'\t', b'b': b'\b', b'f': b'\f',
+               b'(': b'(', b')': b')', b'\\': b'\\'}
+PDF_ESCAPE_RE = re.compile(rb'\\([0-7]{1,3}|.)', re.S)
+PDF_DATE_RE = re.compile(r'D:(\d{4})(\d{2})?(\d{2})?(\d{2})?(\d{2})?(\d{2})?')
+# A TJ kerning adjustment this far left is rendered as a word gap
+PDF_WORD_GAP = -200
+
+EXIF_TAGS = {271: 'make', 272: 'model', 305: 'software', 306: 'datetime'}
+EXIF_IFD = 0x8769
+EXIF_IFD_TAGS = {36867: 'datetime_original', 36868: 'datetime_digitized'}
+GPS_IFD = 0x8825
+
+
+def sha256_file(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as handle:
+        for block in iter(lambda: handle.read(1024 * 1024), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def kind_of(filename):
+    extension = filename.rsplit('.', 1)[-1].lower() if '.' in filename else ''
+    if extension in ('png', 'jpg', 'jpeg', 'gif'):
+        return 'image'
+    if extension in ('pdf', 'docx', 'doc', 'txt'):
+        return extension
+    return 'other'
+
+
+# PDF
+
+def _pdf_unescape(literal):
+    def replace(match):
+        escape = match.group(1)
+        if escape[:1].isdigit():
+            return bytes([int(escape, 8) & 0xFF])
+        return PDF_ESCAPES.get(escape, b'' if escape in (b'\n', b'\r') else escape)
+    return PDF_ESCAPE_RE.sub(replace, literal[1:-1])
+
+
+def _pdf_decode(raw):
+    if raw.startswith(b'\xfe\xff'):
+        return raw[2:].decode('utf-16-be', 'replace')
+    return raw.decode('latin-1')
+
+
+def _pdf_streams(data, metadata):
+    """Yield decompressed content streams, EXTRACT_MAX_INFLATE_BYTES in total"""
+    remaining = EXTRACT_MAX_INFLATE_BYTES
+    for match in PDF_STREAM_RE.finditer(data):
+        if remaining <= 0:
+            metadata['truncated'] = True
+            return
+        start = match.end()
+        end = data.find(b'endstream', start)
+        if end < 0:
+            break
+        header = data[max(0, match.start() - 400):match.start()]
+        object_start = header.rfind(b'obj')
+        if object_start >= 0:
+            header = header[object_start + 3:]
+        if b'/Image' in header or b'/FontFile' in header or b'/Length1' in header:
+            continue
+        raw = data[start:end]
+        if b'/FlateDecode' in header:
+            try:
+                raw = zlib.decompressobj().decompress(raw, remaining)
+            except zlib.error:
+                continue
+        elif b'/Filter' in header:
+            continue  # other filters (DCT, LZW, ...) do not carry text we can read
+        else:
+            raw = raw[:remaining]
+        remaining -= len(raw)
+        yield raw
+
+
+def _pdf_text(content):
+    parts = []
+    for block in PDF_TEXT_BLOCK_RE.finditer(content):
+        for match in PDF_TEXT_OP_RE.finditer(block.group(1)):
+            literal, array, move = match.groups()
+            if literal is not None:
+                parts.append(_pdf_decode(_pdf_unescape(literal)))
+            elif array is not None:
+                for item in PDF_STRING_RE.finditer(array):
+                    if item.group(1) is not None:
+                        if float(item.group(1)) <= PDF_WORD_GAP:
+                            parts.append(' ')
+                    else:
+                        parts.append(_pdf_decode(_pdf_unescape(item.group(0))))
+            else:
+                parts.append('\n' if move == b'T*' else ' ')
+        parts.append('\n')
+    return ''.join(parts)
+
+
+def _pdf_date(value):
+    match = PDF_DATE_RE.match(value)
+    if not match:
+        return value
+    year, month, day, hour, minute, second = (part or default for part, default in
+                                              zip(match.groups(), ('', '01', '01', '00', '00', '00')))
+    return f'{year}-{month}-{day}T{hour}:{minute}:{second}'
+
+
+def extract_pdf(data):
+    metadata = {'encrypted': b'/Encrypt' in data}
+    for key, value in PDF_INFO_RE.findall(data):
+        text = _pdf_decode(_pdf_unescape(b'(' + value + b')')).strip()
+        key = key.decode().lower()
+        metadata[key] = _pdf_date(text) if key.endswith('date') else text
+    metadata['pages'] = len(re.findall(rb'/Type\s*/Page\b', data))
+    # Each incremental update appends another %%EOF (a linearized file has one extra of its own)
+    linearized = b'/Linearized' in data[:1024]
+    metadata['incremental_updates'] = max(0, data.count(b'%%EOF') - 1 - linearized)
+    parts, length = [], 0
+    for stream in _pdf_streams(data, metadata):
+        parts.append(_pdf_text(stream))
+        length += len(parts[-1])
+        if length >= MAX_TEXT_CHARS:
+            break  # the rest would be cut off below
+    return ''.join(parts), metadata
+
+
+# DOCX / DOC
+
+def _zip_member(archive, name):
+    try:
+        info = archive.getinfo(name)
+    except KeyError:
+        return None
+    if info.file_size > EXTRACT_MAX_BYTES:
+        return None
+    return archive.read(info).decode('utf-8', 'replace')
+
+
+def _xml_value(xml, tag):
+    match = re.search(rf'<{tag}[^>]*>([^<]*)</{tag}>', xml)
+    return html.unescape(match.group(1)) if match else None
+
+
+def extract_docx(path):
+    with zipfile.ZipFile(path) as archive:
+        document = _zip_member(archive, 'word/document.xml') or ''
+        core = _zip_member(archive, 'docProps/core.xml') or ''
+        app = _zip_member(archive, 'docProps/app.xml') or ''
+    paragraphs = []
+    for paragraph in re.findall(r'<w:p[ >].*?</w:p>', document, re.S):
+        runs = re.findall(r'<w:t(?: [^>]*)?>([^<]*)</w:t>', paragraph)
+        if runs:
+            paragraphs.append(html.unescape(''.join(runs)))
+    metadata = {
+        'author': _xml_value(core, 'dc:creator'),
+        'last_modified_by': _xml_value(core, 'cp:lastModifiedBy'),
+        'creationdate': _xml_value(core, 'dcterms:created'),
+        'moddate': _xml_value(core, 'dcterms:modified'),
+        'revisions': _xml_value(core, 'cp:revision'),
+        'producer': _xml_value(app, 'Application')
+    }
+    return '\n'.join(paragraphs), {key: value for key, value in metadata.items() if value}
+
+
+def extract_doc(data):
+    """Printable runs from a legacy binary .doc (8-bit and UTF-16LE)"""
+    runs = re.findall(rb'[\x20-\x7e]{4,}', data)
+    runs += [run.decode('utf-16-le') for run in re.findall(rb'(?:[\x20-\x7e]\x00){4,}', data)]
+    text = '\n'.join(run if isinstance(run, str) else run.decode('latin-1') for run in runs)
+    return text, {}
+
+
+# Images
+
+def read_exif(image):
+    """EXIF of an opened image without decoding its pixels
+
+    Pillow's PNG getexif() decodes the whole image to look for an eXIf chunk
+    after the image data, so PNG chunk headers are walked here instead.
+    """
+    from PIL import Image
+
+    if image.format != 'PNG' or 'exif' in image.info:
+        return image.getexif()
+    exif = Image.Exif()
+    position = image.fp.tell()
+    try:
+        image.fp.seek(8)  # past the signature
+        while True:
+            header = image.fp.read(8)
+            if len(header) < 8:
+                break
+            length, kind = struct.unpack('>I4s', header)
+            if kind == b'eXIf':
+                exif.load(b'Exif\x00\x00' + image.fp.read(length))
+                break
+            if kind == b'IEND':
+                break
+            image.fp.seek(length + 4, os.SEEK_CUR)  # data and CRC
+    finally:
+        image.fp.seek(position)
+    return exif
+
+
+def extract_image(path):
+    from PIL import Image  # Pillow is only needed once an image arrives
+
+    with Image.open(path) as image:
+        metadata = {'format': image.format, 'width': image.width, 'height': image.height}
+        exif = read_exif(image)
+        for tag, name in EXIF_TAGS.items():
+            if exif.get(tag):
+                metadata[name] = str(exif[tag]).strip('\x00 ')
+        details = exif.get_ifd(EXIF_IFD)
+        for tag, name in EXIF_IFD_TAGS.items():
+            if details.get(tag):
+                metadata[name] = str(details[tag]).strip('\x00 ')
+        metadata['has_gps'] = bool(exif.get_ifd(GPS_IFD))
+        metadata['has_exif'] = bool(exif)
+    return '', metadata
+
+
+# Entities
+
+def _valid_date(year, month, day):
+    try:
+        return date(int(year), int(month), int(day)).isoformat()
+    except ValueError:
+        return None
+
+
+def find_dates(text):
+    dates = set()
+    for year, month, day in ISO_DATE_RE.findall(text):
+        dates.add(_valid_date(year, month, day))
+    for day, month, year in NUMERIC_DATE_RE.findall(text):
+        dates.add(_valid_date(year, month, day))
+    for day, month, year in NAMED_DATE_RE.findall(text):
+        if month.lower() in MONTHS:
+            dates.add(_valid_date(year, MONTHS[month.lower()], day))
+    dates.discard(None)
+    return sorted(dates)
+
+
+def normalize_amount(value):
+    """Canonical text for an amount, e.g. '1,25,000' / 125000 -> '125000.00'"""
+    try:
+        return f'{float(str(value).replace(",", "")):.2f}'
+    except ValueError:
+        return None
+
+
+def find_amounts(text):
+    amounts = {normalize_amount(marked or grouped) for marked, grouped in AMOUNT_RE.findall(text)}
+    amounts.discard(None)
+    return sorted(amounts, key=float)
+
+
+def words(text):
+    return {word.lower() for word in WORD_RE.findall(text)}
+
+
+def extract(path, filename):
+    """Extract text, metadata and entities from one file"""
+    kind = kind_of(filename)
+    size = os.path.getsize(path)
+    text, metadata = '', {}
+    if size <= EXTRACT_MAX_BYTES:
+        if kind == 'image':
+            text, metadata = extract_image(path)
+        elif kind == 'docx':
+            text, metadata = extract_docx(path)
+        elif kind in ('pdf', 'doc', 'txt'):
+            with open(path, 'rb') as handle:
+                data = handle.read()
+            if kind == 'pdf':
+                text, metadata = extract_pdf(data)
+            elif kind == 'doc':
+                text, metadata = extract_doc(data)
+            else:
+                text = data.decode('utf-8', 'replace')
+    else:
+        metadata['truncated'] = True
+    text = text[:MAX_TEXT_CHARS]
+    return {
+        'kind': kind,
+        'size': size,
+        'metadata': metadata,
+        'text': text,
+        'amounts': find_amounts(text),
+        'dates': find_dates(text)
+    }
+
+
+def terms_for(record):
+    """Index terms of a document: w:<word>, a:<amount>, d:<date>"""
+    terms = [f'a:{amount}' for amount in record['amounts']]
+    terms += [f'd:{value}' for value in record['dates']]
+    terms += [f'w:{word}' for word in sorted(words(record['text']))]
+    return terms[:MAX_TERMS]
+
+
+class DocumentIndex:
+    """Extracted documents keyed by content hash, with an inverted index over their terms"""
+
+    def __init__(self, path=DOCUMENTS_DB_PATH):
+        self.pool = ConnectionPool(path, 4)
+        if hasattr(os, 'register_at_fork'):
+            os.register_at_fork(after_in_child=self.pool.reset)
+        with self.pool.connection() as conn:
+            conn.executescript(SCHEMA)
+
+    def get(self, sha256):
+        with self.pool.connection() as conn:
+            row = conn.execute(
+                'SELECT data FROM documents WHERE sha256 = ? AND version = ?', (sha256, EXTRACTOR_VERSION)
+            ).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def add(self, sha256, record):
+        with self.pool.connection() as conn, transaction(conn):
+            conn.execute('DELETE FROM postings WHERE sha256 = ?', (sha256,))
+            conn.execute(
+                'INSERT OR REPLACE INTO documents (sha256, version, kind, size, extracted_at, data) '
+                'VALUES (?, ?, ?, ?, ?, ?)',
+                (sha256, EXTRACTOR_VERSION, record['kind'], record['size'], time.time(), json.dumps(record))
+            )
+            conn.executemany(
+                'INSERT OR IGNORE INTO postings (term, sha256) VALUES (?, ?)',
+                [(term, sha256) for term in terms_for(record)]
+            )
+
+    def link(self, sha256, stored_name, claim_id=None):
+        with self.pool.connection() as conn:
+            conn.execute(
+                'INSERT OR REPLACE INTO files (stored_name, sha256, claim_id, added_at) VALUES (?, ?, ?, ?)',
+                (stored_name, sha256, claim_id, time.time())
+            )
+
+    def link_claim(self, stored_names, claim_id):
+        with self.pool.connection() as conn:
+            conn.executemany(
+                'UPDATE files SET claim_id = ? WHERE stored_name = ?',
+                [(claim_id, name) for name in stored_names]
+            )
+
+    def search(self, terms):
+        """Hashes of documents containing every term"""
+        terms = sorted(set(terms))
+        if not terms:
+            return []
+        placeholders = ','.join('?' * len(terms))
+        with self.pool.connection() as conn:
+            rows = conn.execute(
+                f'SELECT sha256 FROM postings WHERE term IN ({placeholders}) '
+                f'GROUP BY sha256 HAVING COUNT(*) = ?',
+                (*terms, len(terms))
+            ).fetchall()
+        return [row[0] for row in rows]
+
+    def matching_terms(self, hashes, terms):
+        """{term: [hashes]} for the terms found among the given documents"""
+        hashes, terms = sorted(set(hashes)), sorted(set(terms))
+        if not hashes or not terms:
+            return {}
+        query = (f'SELECT term, sha256 FROM postings WHERE term IN ({",".join("?" * len(terms))}) '
+                 f'AND sha256 IN ({",".join("?" * len(hashes))})')
+        found = {}
+        with self.pool.connection() as conn:
+            for term, sha256 in conn.execute(query, (*terms, *hashes)):
+                found.setdefault(term, []).append(sha256)
+        return found
+
+    def claims_with(self, sha256):
+        with self.pool.connection() as conn:
+            rows = conn.execute(
+                'SELECT DISTINCT claim_id FROM files WHERE sha256 = ? AND claim_id IS NOT NULL', (sha256,)
+            ).fetchall()
+        return [row[0] for row in rows]
+
+
+_index = None
+
+
+def get_index():
+    global _index
+    if _index is None:
+        _index = DocumentIndex()
+    return _index
+
+
+def index_file(path, stored_name, claim_id=None):
+    """Extract (or reuse the cached extraction of) a stored upload and index it
+
+    Returns a summary without the text: sha256, kind, metadata, amounts, dates.
+    """
+    index = get_index()
+    sha256 = sha256_file(path)
+    record = index.get(sha256)
+    if record is None:
+        started = time.perf_counter()
+        try:
+            record = extract(path, stored_name)
+            result = 'extracted'
+        except Exception as e:
+            # Corrupt or unsupported content: index what is known so the file is still linked
+            logger.warning("Extraction failed for %s: %s", stored_name, e)
+            record = {'kind': kind_of(stored_name), 'size': os.path.getsize(path), 'metadata': {'error': str(e)},
+                      'text': '', 'amounts': [], 'dates': []}
+            result = 'failed'
+        index.add(sha256, record)
+        metrics.ANALYSIS_DURATION.labels('document_extraction').observe(time.perf_counter() - started)
+    else:
+        result = 'cached'
+    metrics.DOCUMENT_EXTRACTIONS.labels(record['kind'], result).inc()
+    index.link(sha256, stored_name, claim_id)
+    summary = {key: value for key, value in record.items() if key != 'text'}
+    summary['sha256'] = sha256
+    return summary
+
+
+def cross_check(hashes, amount=None, names=(), dates=()):
+    """Which of the documents mention the claimed amount, each name and each date"""
+    index = get_index()
+    checks = {}
+    terms = []
+    amount_term = f'a:{normalize_amount(amount)}' if amount not in (None, '') and normalize_amount(amount) else None
+    if amount_term:
+        terms.append(amount_term)
+    name_terms = {name: [f'w:{word}' for word in sorted(words(name))] for name in names if name and words(name)}
+    for name_words in name_terms.values():
+        terms.extend(name_words)
+    date_terms = {}
+    for value in dates:
+        found = find_dates(str(value))
+        if found:
+            date_terms[value] = f'd:{found[0]}'
+    terms.extend(date_terms.values())
+
+    found = index.matching_terms(hashes, terms)
+    if amount_term:
+        checks['amount'] = found.get(amount_term, [])
+    for name, name_words in name_terms.items():
+        matching = set(hashes)
+        for term in name_words:
+            matching &= set(found.get(term, []))
+        checks.setdefault('names', {})[name] = sorted(matching)
+    for value, term in date_terms.items():
+        checks.setdefault('dates', {})[str(value)] = found.get(term, [])
+    return checks
@@ -0,0 +1,148 @@
+"""
+Derived user profile features shared by the advisory endpoints.
+
+Investment analysis, financial health, recommendations and the chat prompt
+all need the same figures: defaulted and normalized profile fields, the
+income band, and debt, savings and emergency-fund ratios. `for_profile()`
+computes them once into a `ProfileFeatures`. The result is keyed by
+`version`, a hash of the profile fields it was derived from, and cached in
+a bounded LRU under that version alone. A repeated request with the same
+profile reuses the cached features, whoever sends it. An edited profile
+produces a new version, and the old entry ages out. Keying on a
+client-supplied `user_id` would let one client evict or shadow another
+user's entry.
+
+Endpoints also use `version` as the profile part of their result cache
+keys, so the profile is hashed once per request.
+"""
+
+import hashlib
+import os
+from dataclasses import dataclass
+
+import orjson
+
+import cache
+import metrics
+
+# Bump when a derivation changes so cached features and results keyed on them are recomputed
+FEATURES_VERSION = 1
+PROFILE_FIELDS = ('age', 'income', 'savings', 'debt', 'emergencyFund', 'dependents',
+                  'riskTolerance', 'investmentExperience', 'financialGoals')
+FEATURE_CACHE_MAX_ENTRIES = int(os.getenv('FEATURE_CACHE_MAX_ENTRIES', '10000'))
+
+DEFAULT_AGE = 30
+DEFAULT_RISK_TOLERANCE = 'moderate'
+DEFAULT_EXPERIENCE = 'beginner'
+LOW_INCOME = 300000  # 3 lakh
+HIGH_INCOME = 1000000  # 10 lakh
+
+
+@dataclass(frozen=True, slots=True)
+class ProfileFeatures:
+    """Defaulted profile fields and the figures derived from them"""
+
+    version: str
+    age: int
+    income: float
+    savings: float
+    debt: float
+    emergency_fund: float
+    dependents: int
+    risk_tolerance: str
+    experience: str
+    goals: tuple
+    income_band: str  # low (< 3 lakh), middle, high (> 10 lakh)
+    debt_ratio: float  # debt as % of annual income, 0 without income
+    savings_ratio: float  # savings as % of annual income, 0 without income
+    emergency_months: float  # months of income held as emergency fund, 0 without income
+    horizon: str  # investment horizon suggested by age
+
+    def as_profile(self):
+        """Profile fields plus derived features, for the recommendation rules"""
+        return {
+            'age': self.age,
+            'income': self.income,
+            'savings': self.savings,
+            'debt': self.debt,
+            'emergencyFund': self.emergency_fund,
+            'dependents': self.dependents,
+            'riskTolerance': self.risk_tolerance,
+            'investmentExperience': self.experience,
+            'financialGoals': list(self.goals),
+            'income_band': self.income_band,
+            'debt_ratio': self.debt_ratio,
+            'savings_ratio': self.savings_ratio,
+            'emergency_months': self.emergency_months,
+            'horizon': self.horizon
+        }
+
+    def describe(self):
+        """Compact profile summary for LLM prompts"""
+        goals = ', '.join(str(goal) for goal in self.goals) or 'not stated'
+        return (f"Age {self.age}, {self.dependents} dependent(s); annual income ₹{self.income:,.0f} "
+                f"({self.income_band} band); savings {self.savings_ratio:.1f}% and debt {self.debt_ratio:.1f}% "
+                f"of income; emergency fund {self.emergency_months:.1f} months; "
+                f"risk tolerance {self.risk_tolerance}; {self.experience} investor; "
+                f"{self.horizon} horizon; goals: {goals}")
+
+
+def other_fields(user_profile):
+    """Profile fields features do not cover (name, occupation, notes, ...), e.g. for LLM prompts"""
+    return {field: value for field, value in user_profile.items() if field not in PROFILE_FIELDS}
+
+
+def profile_version(user_profile):
+    """Hash of the profile fields features are derived from"""
+    picked = {field: user_profile[field] for field in PROFILE_FIELDS if user_profile.get(field) is not None}
+    blob = orjson.dumps([FEATURES_VERSION, picked], option=orjson.OPT_SORT_KEYS | orjson.OPT_NON_STR_KEYS)
+    return hashlib.sha256(blob).hexdigest()[:32]
+
+
+def compute(user_profile, version=None):
+    """Derive the features of a (schema-validated) profile"""
+    # Validated profiles carry no None values, so absent fields take the defaults
+    age = user_profile.get('age', DEFAULT_AGE)
+    income = user_profile.get('income', 0)
+    savings = user_profile.get('savings', 0)
+    debt = user_profile.get('debt', 0)
+    emergency_fund = user_profile.get('emergencyFund', 0)
+    if income < LOW_INCOME:
+        income_band = 'low'
+    elif income > HIGH_INCOME:
+        income_band = 'high'
+    else:
+        income_band = 'middle'
+    return ProfileFeatures(
+        version=version or profile_version(user_profile),
+        age=age,
+        income=income,
+        savings=savings,
+        debt=debt,
+        emergency_fund=emergency_fund,
+        dependents=user_profile.get('dependents', 0),
+        risk_tolerance=user_profile.get('riskTolerance', DEFAULT_RISK_TOLERANCE).lower(),
+        experience=user_profile.get('investmentExperience', DEFAULT_EXPERIENCE).lower(),
+        goals=tuple(user_profile.get('financialGoals', ())),
+        income_band=income_band,
+        debt_ratio=debt / income * 100 if income > 0 else 0,
+        savings_ratio=savings / income * 100 if income > 0 else 0,
+        emergency_months=emergency_fund / (income / 12) if income > 0 else 0,
+        horizon='long-term' if age < 40 else 'medium-term' if age < 55 else 'short-term'
+    )
+
+
+_features = cache.MemoryBackend(FEATURE_CACHE_MAX_ENTRIES)
+
+
+def for_profile(user_profile):
+    """Features of `user_profile`, reused while the same profile keeps coming in"""
+    version = profile_version(user_profile)
+    features = _features.get(version)
+    if features is not None:
+        metrics.CACHE_REQUESTS.labels('profile_features', 'hit_local').inc()
+        return features
+    metrics.CACHE_REQUESTS.labels('profile_features', 'miss').inc()
+    features = compute(user_profile, version)
+    _features.set(version, features, cache.CACHE_TTL)
+    return features
@@ -0,0 +1,54 @@
+# Gunicorn configuration (picked up automatically from the backend directory)
+#
+# Bind address, worker count and timeout still come from the command line
+# in Procfile / render.yaml / start.sh.
+
+import glob
+import os
+import tempfile
+
+# Every worker writes its Prometheus samples here so /metrics can aggregate
+# them. It must be set before the workers import prometheus_client.
+os.environ.setdefault(
+    'PROMETHEUS_MULTIPROC_DIR',
+    os.path.join(tempfile.gettempdir(), 'bfsi-prometheus')
+)
+
+# Threaded workers: cheap routes keep being served while LLM calls wait on
+# the network (admission.py bounds how many threads each route class may use)
+worker_class = 'gthread'
+threads = int(os.getenv('GUNICORN_THREADS', '16'))
+
+# With GUNICORN_PRELOAD=true the app is imported once in the master and the
+# workers are forked from it (shared pages, faster restarts). LLM clients are
+# never built before the fork; each worker builds its own.
+preload_app = os.getenv('GUNICORN_PRELOAD', 'false').lower() == 'true'
+app_warmup = os.getenv('APP_WARMUP', 'true').lower() == 'true'
+
+
+def on_starting(server):
+    """Start every deployment with an empty metrics directory"""
+    metrics_dir = os.environ['PROMETHEUS_MULTIPROC_DIR']
+    os.makedirs(metrics_dir, exist_ok=True)
+    for path in glob.glob(os.path.join(metrics_dir, '*.db')):
+        os.remove(path)
+
+
+def when_ready(server):
+    """Load rate tables, rules and heavy modules once in the master before forking"""
+    if preload_app and app_warmup:
+        import app
+        app.warmup(build_clients=False)
+
+
+def post_worker_init(worker):
+    """Warm each worker before it accepts its first request"""
+    if app_warmup:
+        import app
+        app.warmup(build_clients=True)
+
+
+def child_exit(server, worker):
+    """Drop live-only samples of workers that exited"""
+    from prometheus_client import multiprocess
+    multiprocess.mark_process_dead(worker.pid)
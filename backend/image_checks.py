@@ -0,0 +1,321 @@
+"""
+Forensic pre-checks for claim photos.
+
+`check_file()` runs on every image attached to a claim and records, keyed
+by the file's SHA-256:
+
+- Perceptual hashes: a 64-bit pHash (DCT of a 32x32 grayscale) and a
+  64-bit dHash (horizontal gradient of a 9x8 grayscale). Re-encoded,
+  resized or lightly edited copies of a photo land within a few bits of
+  the original, so `similar()` finds the same photo reused across claims
+  even when the files differ. The hashes are indexed in `phash_index`.
+- EXIF consistency: modification time later than capture time, EXIF
+  dimensions that do not match the pixels (resized or cropped), and
+  capture dates in the future.
+- Error level analysis (JPEG only): the photo is re-saved at a known
+  quality, and the recompression error is compared across an 8x8 grid.
+  A pasted-in region usually has a different compression history from
+  the rest of the photo, so its error stands out.
+
+JPEGs are never decoded at full resolution: Pillow's draft mode scales
+the DCT by 1/2 to 1/8 inside libjpeg, so a 12 MP JPEG takes tens of
+milliseconds. Other formats have no reduced decode; they are decoded in
+full and then thumbnailed, which costs a few hundred milliseconds for a
+12 MP PNG (more for WebP). Non-JPEG images over `IMAGE_MAX_DECODE_PIXELS`
+are therefore not decoded at all and are reported as too large to check.
+All checks run on an image of at most `IMAGE_ANALYSIS_SIZE` pixels a
+side. ELA at that scale is coarse: it misses small retouching and only
+flags regions that differ strongly.
+
+Results are stored next to the extracted documents (`DOCUMENTS_DB_PATH`),
+so a photo submitted again is never decoded twice.
+"""
+
+import io
+import json
+import logging
+import os
+import threading
+import time
+from datetime import datetime, timedelta
+
+import metrics
+from extraction import DOCUMENTS_DB_PATH, read_exif, sha256_file
+from phash_index import PhashIndex
+from storage import ConnectionPool
+
+IMAGE_ANALYSIS_SIZE = int(os.getenv('IMAGE_ANALYSIS_SIZE', '512'))
+# Largest non-JPEG image decoded for the checks (these formats only decode at full size)
+IMAGE_MAX_DECODE_PIXELS = int(os.getenv('IMAGE_MAX_DECODE_PIXELS', '12000000'))
+# pHash bits two photos may differ in and still count as the same photo
+PHASH_MAX_DISTANCE = int(os.getenv('PHASH_MAX_DISTANCE', '8'))
+DHASH_MAX_DISTANCE = 12
+ELA_QUALITY = 90
+ELA_GRID = 8
+# A grid cell whose error is this many times the median cell (and at least ELA_MIN_LEVEL) is flagged
+ELA_RATIO_THRESHOLD = 3.0
+ELA_MIN_LEVEL = 2.0
+# Seconds between EXIF capture and modification times before a photo counts as edited
+EXIF_EDIT_TOLERANCE = 60
+# Bump when the checks change so cached results are recomputed
+CHECKS_VERSION = 1
+
+EXIF_DATETIME = 306
+EXIF_IFD = 0x8769
+EXIF_DATETIME_ORIGINAL = 36867
+EXIF_PIXEL_WIDTH = 40962
+EXIF_PIXEL_HEIGHT = 40963
+EXIF_ORIENTATION = 274
+EXIF_DATE_FORMAT = '%Y:%m:%d %H:%M:%S'
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS image_checks (
+    sha256 TEXT PRIMARY KEY,
+    version INTEGER NOT NULL,
+    phash TEXT,
+    dhash TEXT,
+    checked_at REAL NOT NULL,
+    data TEXT NOT NULL
+) WITHOUT ROWID;
+"""
+
+logger = logging.getLogger(__name__)
+
+_dct_matrix = None
+
+
+def _dct():
+    """32x32 DCT-II basis, built on first use"""
+    global _dct_matrix
+    if _dct_matrix is None:
+        import numpy as np
+
+        n = np.arange(32)
+        _dct_matrix = np.cos(np.pi * (2 * n[None, :] + 1) * n[:, None] / 64)
+    return _dct_matrix
+
+
+def _bits_to_hex(bits):
+    value = 0
+    for bit in bits:
+        value = (value << 1) | bool(bit)
+    return f'{value:016x}'
+
+
+def phash(gray):
+    import numpy as np
+    from PIL import Image
+
+    pixels = np.asarray(gray.resize((32, 32), Image.Resampling.BILINEAR), dtype=np.float64)
+    matrix = _dct()
+    low = (matrix @ pixels @ matrix.T)[:8, :8].flatten()
+    return _bits_to_hex(low > np.median(low))
+
+
+def dhash(gray):
+    from PIL import Image
+
+    pixels = gray.resize((9, 8), Image.Resampling.BILINEAR).tobytes()
+    return _bits_to_hex(pixels[row * 9 + column] > pixels[row * 9 + column + 1]
+                        for row in range(8) for column in range(8))
+
+
+def _load(image):
+    """Decode at reduced size: JPEG via draft mode, everything else via thumbnail"""
+    if image.format == 'JPEG':
+        image.draft('RGB', (IMAGE_ANALYSIS_SIZE // 2, IMAGE_ANALYSIS_SIZE // 2))
+    image.load()
+    image.thumbnail((IMAGE_ANALYSIS_SIZE, IMAGE_ANALYSIS_SIZE), reducing_gap=2.0)
+    if image.mode != 'RGB':
+        image = image.convert('RGBA').convert('RGB') if 'transparency' in image.info else image.convert('RGB')
+    return image
+
+
+def error_levels(rgb):
+    """Recompression error per grid cell; returns the mean, the worst cell and its ratio to the median cell"""
+    import numpy as np
+    from PIL import Image, ImageChops
+
+    buffer = io.BytesIO()
+    rgb.save(buffer, 'JPEG', quality=ELA_QUALITY)
+    buffer.seek(0)
+    with Image.open(buffer) as resaved:
+        difference = ImageChops.difference(rgb, resaved.convert('RGB'))
+    errors = np.asarray(difference, dtype=np.float32).max(axis=2)
+    height, width = errors.shape
+    rows, columns = height // ELA_GRID, width // ELA_GRID
+    if not rows or not columns:
+        return None
+    cells = errors[:rows * ELA_GRID, :columns * ELA_GRID].reshape(ELA_GRID, rows, ELA_GRID, columns).mean(axis=(1, 3))
+    worst = float(cells.max())
+    median = float(np.median(cells))
+    return {
+        'mean': round(float(errors.mean()), 2),
+        'max_cell': round(worst, 2),
+        'ratio': round(worst / max(median, 0.5), 2)
+    }
+
+
+def _exif_time(value):
+    try:
+        return datetime.strptime(str(value).strip('\x00 '), EXIF_DATE_FORMAT)
+    except ValueError:
+        return None
+
+
+def exif_checks(exif, width, height, now=None):
+    """Facts and inconsistencies in a photo's EXIF; `width`/`height` are the real pixel dimensions"""
+    details = exif.get_ifd(EXIF_IFD)
+    taken = _exif_time(details.get(EXIF_DATETIME_ORIGINAL, ''))
+    modified = _exif_time(exif.get(EXIF_DATETIME, ''))
+    indicators = []
+    if taken and modified and (modified - taken).total_seconds() > EXIF_EDIT_TOLERANCE:
+        indicators.append('Photo was modified after it was taken (EXIF timestamps differ)')
+    if taken and taken > (now or datetime.now()) + timedelta(days=1):
+        indicators.append('Photo capture date is in the future')
+
+    recorded = (details.get(EXIF_PIXEL_WIDTH), details.get(EXIF_PIXEL_HEIGHT))
+    if all(isinstance(value, int) and value > 0 for value in recorded):
+        if exif.get(EXIF_ORIENTATION) in (5, 6, 7, 8):
+            recorded = recorded[::-1]
+        # Swapped dimensions are also accepted: some cameras record pre-rotation sizes without the tag
+        if recorded != (width, height) and recorded[::-1] != (width, height):
+            indicators.append('Photo dimensions differ from its EXIF record (resized or cropped)')
+    return {
+        'has_exif': bool(exif),
+        'taken_at': taken.isoformat() if taken else None,
+        'modified_at': modified.isoformat() if modified else None
+    }, indicators
+
+
+def analyze(path):
+    """Run every check on one image file"""
+    from PIL import Image
+
+    with Image.open(path) as image:
+        source_format = image.format
+        width, height = image.size
+        if source_format != 'JPEG' and width * height > IMAGE_MAX_DECODE_PIXELS:
+            return {
+                'format': source_format,
+                'width': width,
+                'height': height,
+                'analyzed_size': None,
+                'phash': None,
+                'dhash': None,
+                'exif': None,
+                'ela': None,
+                'indicators': ['Photo is too large to check (not a JPEG)']
+            }
+        exif, indicators = exif_checks(read_exif(image), width, height)
+        rgb = _load(image)
+    gray = rgb.convert('L')
+    result = {
+        'format': source_format,
+        'width': width,
+        'height': height,
+        'analyzed_size': list(rgb.size),
+        'phash': phash(gray),
+        'dhash': dhash(gray),
+        'exif': exif,
+        'ela': None
+    }
+    if source_format == 'JPEG':
+        # Error levels only mean something for lossy sources
+        ela = error_levels(rgb)
+        result['ela'] = ela
+        if ela and ela['ratio'] >= ELA_RATIO_THRESHOLD and ela['max_cell'] >= ELA_MIN_LEVEL:
+            indicators.append('Photo has a region with inconsistent compression (error level analysis)')
+    result['indicators'] = indicators
+    return result
+
+
+class ImageCheckStore:
+    """Image check results and perceptual hashes keyed by content hash"""
+
+    def __init__(self, path=DOCUMENTS_DB_PATH):
+        self.pool = ConnectionPool(path, 4)
+        if hasattr(os, 'register_at_fork'):
+            os.register_at_fork(after_in_child=self.pool.reset)
+        with self.pool.connection() as conn:
+            conn.executescript(SCHEMA)
+
+    def get(self, sha256):
+        with self.pool.connection() as conn:
+            row = conn.execute(
+                'SELECT data FROM image_checks WHERE sha256 = ? AND version = ?', (sha256, CHECKS_VERSION)
+            ).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def add(self, sha256, result):
+        with self.pool.connection() as conn:
+            conn.execute(
+                'INSERT OR REPLACE INTO image_checks (sha256, version, phash, dhash, checked_at, data) '
+                'VALUES (?, ?, ?, ?, ?, ?)',
+                (sha256, CHECKS_VERSION, result.get('phash'), result.get('dhash'), time.time(), json.dumps(result))
+            )
+
+    def hashes(self):
+        """(sha256, pHash, dHash) of every checked image"""
+        with self.pool.connection() as conn:
+            return conn.execute('SELECT sha256, phash, dhash FROM image_checks WHERE phash IS NOT NULL').fetchall()
+
+
+_store = None
+_similarity_index = None
+_similarity_index_lock = threading.Lock()
+
+
+def get_store():
+    global _store
+    if _store is None:
+        _store = ImageCheckStore()
+    return _store
+
+
+def get_similarity_index():
+    """The perceptual hash index, seeded from the stored checks the first time it is created"""
+    global _similarity_index
+    if _similarity_index is None:
+        with _similarity_index_lock:
+            if _similarity_index is None:
+                index = PhashIndex()
+                if not index.count:
+                    index.add_many(get_store().hashes(), only_if_empty=True)
+                _similarity_index = index
+    return _similarity_index
+
+
+def check_file(path, sha256=None):
+    """Check (or reuse the cached checks of) one stored image; returns the result with its sha256"""
+    store = get_store()
+    sha256 = sha256 or sha256_file(path)
+    result = store.get(sha256)
+    if result is None:
+        started = time.perf_counter()
+        try:
+            result = analyze(path)
+            outcome = 'checked'
+        except Exception as e:
+            # Truncated or undecodable: remember the failure instead of retrying on every lookup
+            logger.warning("Image check failed for %s: %s", os.path.basename(path), e)
+            result = {'error': str(e), 'indicators': ['Photo could not be decoded']}
+            outcome = 'failed'
+        store.add(sha256, result)
+        if result.get('phash'):
+            get_similarity_index().add(sha256, result['phash'], result['dhash'])
+        metrics.ANALYSIS_DURATION.labels('image_check').observe(time.perf_counter() - started)
+    else:
+        outcome = 'cached'
+    metrics.IMAGE_CHECKS.labels(outcome).inc()
+    result['sha256'] = sha256
+    return result
+
+
+def similar(sha256):
+    """Other checked images that look like the image with this hash"""
+    result = get_store().get(sha256)
+    if not result or not result.get('phash'):
+        return []
+    return get_similarity_index().search(result['phash'], PHASH_MAX_DISTANCE, dhash=result['dhash'],
+                                         dhash_max_distance=DHASH_MAX_DISTANCE, exclude=sha256)
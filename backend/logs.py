@@ -0,0 +1,174 @@
+"""
+Structured, asynchronous logging.
+
+`configure()` routes every record through a bounded queue. A background
+listener thread formats the records (JSON by default, via
+python-json-logger) and writes them to stderr. Request threads only pay
+for the sampling check and a non-blocking `put`; message formatting
+happens on the listener thread. When the queue is full, records are
+dropped and counted rather than blocking.
+
+- `LOG_LEVEL` (default INFO) and `LOG_FORMAT` (`json` or `text`).
+- `LOG_SAMPLE_RATES`, e.g. `app.fallback=0.1,cache=0.5`, keeps that fraction
+  of the records below WARNING from a logger and its children. Warnings and
+  errors are never sampled.
+- Every record carries the `request_id` of the request that logged it. The
+  ID is taken from a well-formed `X-Request-ID` header or generated, and it
+  is echoed back in the response.
+
+Log lazily, with `%s` arguments (or `extra=` fields) instead of f-strings,
+so records that are filtered or sampled out are never formatted.
+"""
+
+import atexit
+import logging
+import os
+import queue
+import random
+import re
+import sys
+from logging.handlers import QueueHandler, QueueListener
+
+from flask import g, has_request_context, request
+
+import metrics
+from ids import new_id
+
+try:
+    from pythonjsonlogger.json import JsonFormatter
+except ImportError:  # python-json-logger < 3
+    from pythonjsonlogger.jsonlogger import JsonFormatter
+
+LOG_LEVEL = os.getenv('LOG_LEVEL', 'INFO').upper()
+LOG_FORMAT = os.getenv('LOG_FORMAT', 'json').lower()
+LOG_QUEUE_SIZE = int(os.getenv('LOG_QUEUE_SIZE', '10000'))
+DEFAULT_SAMPLE_RATES = 'app.fallback=0.1'
+
+REQUEST_ID_HEADER = 'X-Request-ID'
+REQUEST_ID_PATTERN = re.compile(r'^[A-Za-z0-9._:-]{1,64}$')
+
+JSON_FIELDS = '%(asctime)s %(levelname)s %(name)s %(message)s %(request_id)s'
+JSON_RENAMES = {'asctime': 'time', 'levelname': 'level', 'name': 'logger'}
+TEXT_FORMAT = '%(asctime)s %(levelname)s [%(request_id)s] %(name)s: %(message)s'
+
+_listener = None
+
+
+def parse_rates(spec):
+    """'app.fallback=0.1,cache=0.5' -> {'app.fallback': 0.1, 'cache': 0.5}"""
+    rates = {}
+    for item in spec.split(','):
+        name, _, rate = item.partition('=')
+        if name.strip() and rate.strip():
+            rates[name.strip()] = min(max(float(rate), 0.0), 1.0)
+    return rates
+
+
+def request_id():
+    if has_request_context():
+        return g.get('request_id', '-')
+    return '-'
+
+
+class SamplingFilter(logging.Filter):
+    """Tag records with the request ID and sample records below WARNING per logger"""
+
+    def __init__(self, rates):
+        super().__init__()
+        self.rates = rates
+        self._resolved = {}  # logger name -> rate of its nearest configured ancestor
+
+    def rate(self, name):
+        rate = self._resolved.get(name)
+        if rate is None:
+            rate = 1.0
+            prefix = name
+            while prefix:
+                if prefix in self.rates:
+                    rate = self.rates[prefix]
+                    break
+                prefix = prefix.rpartition('.')[0]
+            self._resolved[name] = rate
+        return rate
+
+    def filter(self, record):
+        if record.levelno < logging.WARNING:
+            rate = self.rate(record.name)
+            if rate < 1.0 and random.random() >= rate:
+                return False
+        record.request_id = request_id()
+        return True
+
+
+class NonBlockingQueueHandler(QueueHandler):
+    """Hand records to the listener unformatted; drop them when the queue is full"""
+
+    def prepare(self, record):
+        # Formatting (and merging args into the message) is left to the listener thread
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            metrics.LOG_RECORDS_DROPPED.inc()
+
+
+def build_formatter():
+    if LOG_FORMAT == 'text':
+        return logging.Formatter(TEXT_FORMAT)
+    return JsonFormatter(JSON_FIELDS, rename_fields=JSON_RENAMES)
+
+
+def _start_listener(handler, output):
+    global _listener
+    # A fresh queue each time: one inherited across fork may have its lock held
+    handler.queue = queue.Queue(LOG_QUEUE_SIZE)
+    _listener = QueueListener(handler.queue, output, respect_handler_level=True)
+    _listener.start()
+
+
+def stop():
+    """Flush queued records and stop the listener thread"""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+
+
+def configure():
+    """Install the queue handler on the root logger (idempotent)"""
+    root = logging.getLogger()
+    if any(isinstance(handler, NonBlockingQueueHandler) for handler in root.handlers):
+        return
+
+    output = logging.StreamHandler(sys.stderr)
+    output.setFormatter(build_formatter())
+    handler = NonBlockingQueueHandler(None)
+    handler.addFilter(SamplingFilter(parse_rates(os.getenv('LOG_SAMPLE_RATES', DEFAULT_SAMPLE_RATES))))
+
+    for existing in root.handlers[:]:
+        root.removeHandler(existing)
+    root.addHandler(handler)
+    root.setLevel(LOG_LEVEL)
+
+    _start_listener(handler, output)
+    atexit.register(stop)
+    # Threads do not survive fork: gunicorn workers forked from a preloaded
+    # master start their own listener
+    os.register_at_fork(after_in_child=lambda: _start_listener(handler, output))
+
+
+def init_app(app):
+    """Assign every request an ID and return it in X-Request-ID"""
+
+    @app.before_request
+    def _assign_request_id():
+        incoming = request.headers.get(REQUEST_ID_HEADER, '')
+        g.request_id = incoming if REQUEST_ID_PATTERN.match(incoming) else new_id('REQ')
+
+    @app.after_request
+    def _echo_request_id(response):
+        if 'request_id' in g:
+            response.headers[REQUEST_ID_HEADER] = g.request_id
+        return response
@@ -0,0 +1,143 @@
+"""
+Prometheus metrics for the API.
+
+Under gunicorn every worker writes its samples to `PROMETHEUS_MULTIPROC_DIR`
+(set up by gunicorn.conf.py) and `/metrics` aggregates all of them, so the
+numbers are correct whichever worker serves the scrape. Without that
+variable (e.g. `python app.py`) the default in-process registry is used.
+"""
+
+import os
+import time
+
+from flask import g, request
+from prometheus_client import (
+    CONTENT_TYPE_LATEST,
+    CollectorRegistry,
+    Counter,
+    Histogram,
+    generate_latest,
+    multiprocess
+)
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+SIZE_BUCKETS = (1024, 10 * 1024, 100 * 1024, 1024 * 1024, 5 * 1024 * 1024, 16 * 1024 * 1024)
+
+REQUEST_COUNT = Counter(
+    'bfsi_http_requests_total', 'HTTP requests served',
+    ['route', 'method', 'status']
+)
+REQUEST_LATENCY = Histogram(
+    'bfsi_http_request_duration_seconds', 'HTTP request latency',
+    ['route', 'method'], buckets=LATENCY_BUCKETS
+)
+
+LLM_LATENCY = Histogram(
+    'bfsi_llm_request_duration_seconds', 'Latency of LLM provider calls',
+    ['provider'], buckets=LATENCY_BUCKETS
+)
+LLM_ERRORS = Counter(
+    'bfsi_llm_errors_total', 'Failed LLM provider calls',
+    ['provider']
+)
+LLM_RESPONSES = Counter(
+    'bfsi_llm_responses_total', 'LLM prompts answered, by the fallback tier that answered them',
+    ['provider']
+)
+
+UPLOAD_BYTES = Counter(
+    'bfsi_upload_bytes_total', 'Bytes of uploaded files accepted',
+    ['purpose']
+)
+UPLOAD_SIZE = Histogram(
+    'bfsi_upload_file_size_bytes', 'Size of accepted uploaded files',
+    ['purpose'], buckets=SIZE_BUCKETS
+)
+UPLOAD_CHUNKS = Counter(
+    'bfsi_upload_chunks_total', 'Resumable upload chunks received, by result',
+    ['result']
+)
+UPLOAD_RECLAIMED_FILES = Counter(
+    'bfsi_upload_reclaimed_files_total', 'Uploaded files deleted by the retention sweeper',
+    ['purpose', 'reason']
+)
+UPLOAD_RECLAIMED_BYTES = Counter(
+    'bfsi_upload_reclaimed_bytes_total', 'Bytes freed by the retention sweeper',
+    ['purpose', 'reason']
+)
+DOCUMENT_EXTRACTIONS = Counter(
+    'bfsi_document_extractions_total', 'Uploaded documents indexed, by kind and result (extracted, cached, failed)',
+    ['kind', 'result']
+)
+IMAGE_CHECKS = Counter(
+    'bfsi_image_checks_total', 'Claim photos checked, by result (checked, cached, failed)',
+    ['result']
+)
+ANALYSIS_DURATION = Histogram(
+    'bfsi_analysis_duration_seconds', 'Time spent in analysis/scoring code',
+    ['analysis'], buckets=LATENCY_BUCKETS
+)
+
+COALESCED_CALLS = Counter(
+    'bfsi_coalesced_calls_total', 'Calls that waited for an identical in-flight call instead of making their own',
+    ['group']
+)
+COALESCE_TIMEOUTS = Counter(
+    'bfsi_coalesce_timeouts_total', 'Coalesced callers that gave up waiting for the in-flight call',
+    ['group']
+)
+
+ADMISSION_REJECTIONS = Counter(
+    'bfsi_admission_rejections_total', 'Requests turned away by rate limiting (429) or load shedding (503)',
+    ['pool', 'reason']
+)
+ADMISSION_QUEUE_WAIT = Histogram(
+    'bfsi_admission_queue_wait_seconds', 'Time spent waiting for a slot in a concurrency pool',
+    ['pool'], buckets=LATENCY_BUCKETS
+)
+
+VALIDATION_ERRORS = Counter(
+    'bfsi_validation_errors_total', 'Requests rejected by their route schema before reaching the view',
+    ['route']
+)
+
+CACHE_REQUESTS = Counter(
+    'bfsi_cache_requests_total', 'Cache lookups by outcome (hit_local, hit_shared, miss)',
+    ['cache', 'result']
+)
+
+LOG_RECORDS_DROPPED = Counter(
+    'bfsi_log_records_dropped_total', 'Log records dropped because the log queue was full'
+)
+
+
+def observe_upload(purpose, size):
+    UPLOAD_BYTES.labels(purpose).inc(size)
+    UPLOAD_SIZE.labels(purpose).observe(size)
+
+
+def render():
+    """Return (body, content type) for a scrape"""
+    if os.getenv('PROMETHEUS_MULTIPROC_DIR'):
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        return generate_latest(registry), CONTENT_TYPE_LATEST
+    return generate_latest(), CONTENT_TYPE_LATEST
+
+
+def init_app(app):
+    """Record request count and latency per route template"""
+
+    @app.before_request
+    def _start_timer():
+        g.metrics_started = time.perf_counter()
+
+    @app.after_request
+    def _record_request(response):
+        started = g.pop('metrics_started', None)
+        if started is not None:
+            # Label by route template (/api/policies/<policy_id>), not raw path
+            route = request.url_rule.rule if request.url_rule else 'unmatched'
+            REQUEST_LATENCY.labels(route, request.method).observe(time.perf_counter() - started)
+            REQUEST_COUNT.labels(route, request.method, str(response.status_code)).inc()
+        return response
@@ -0,0 +1,229 @@
+"""
+Nearest-neighbour index over photo perceptual hashes (multi-index hashing).
+
+Finding every stored 64-bit pHash within Hamming distance r of a query is
+a scan when done naively. Multi-index hashing avoids the scan: the hash is
+split into `CHUNK_BITS` chunks (22/21/21 bits), and for each chunk the
+records are grouped by chunk value (a bucket offset table plus record
+numbers in bucket order). If two hashes differ in at most r bits, at
+least one chunk differs in at most r // 3 bits (pigeonhole). A query
+therefore only reads, for each chunk, the buckets of the values within
+that small radius; for r = 8 that is about 250 buckets per chunk, each
+found with two array reads. It then verifies the few candidates found
+against the full hash, and the dHash when one is given. At a million
+photos a query costs well under a millisecond. The offset tables take
+`4 * 2**22` bytes for the widest chunk, about 32 MB per worker in total,
+and are only built once `MERGE_THRESHOLD` photos are indexed.
+
+Storage is an append-only file (`PHASH_INDEX_PATH`) of fixed 48-byte
+records: pHash, dHash, SHA-256 digest. Inserts append one record under an
+flock. Every worker picks up records appended by the others by reading
+the file's new tail before each query. New records are first searched by
+brute force; once `MERGE_THRESHOLD` of them have accumulated, the chunk
+tables are rebuilt to include them. A record torn by a crash mid-append
+is cut off by the next insert.
+"""
+
+import os
+import threading
+from functools import lru_cache
+from itertools import combinations
+
+from storage import DATABASE_PATH
+
+try:
+    import fcntl
+except ImportError:  # Windows: appends are not serialized across workers
+    fcntl = None
+
+PHASH_INDEX_PATH = os.getenv('PHASH_INDEX_PATH', os.path.splitext(DATABASE_PATH)[0] + '-phash.bin')
+HASH_BITS = 64
+CHUNK_BITS = (22, 21, 21)
+DIGEST_SIZE = 32
+RECORD_SIZE = 8 + 8 + DIGEST_SIZE
+# Records not yet in the chunk tables are brute-forced; past this many the tables are rebuilt
+MERGE_THRESHOLD = 32768
+INITIAL_CAPACITY = 1024
+
+
+def _chunks():
+    """(shift, width) of each chunk, most significant first"""
+    shift = HASH_BITS
+    layout = []
+    for width in CHUNK_BITS:
+        shift -= width
+        layout.append((shift, width))
+    return tuple(layout)
+
+
+CHUNKS = _chunks()
+
+
+@lru_cache(maxsize=None)
+def _flip_masks(width, radius):
+    """Every `width`-bit mask with at most `radius` bits set"""
+    import numpy as np
+
+    masks = [0]
+    for count in range(1, radius + 1):
+        for bits in combinations(range(width), count):
+            mask = 0
+            for bit in bits:
+                mask |= 1 << bit
+            masks.append(mask)
+    return np.array(masks, dtype=np.uint32)
+
+
+def _ranges(starts, stops):
+    """All positions in the half-open ranges [starts[i], stops[i]), concatenated"""
+    import numpy as np
+
+    lengths = stops - starts
+    keep = lengths > 0
+    starts, lengths = starts[keep], lengths[keep]
+    if not len(lengths):
+        return np.empty(0, dtype=np.int64)
+    offsets = np.cumsum(lengths) - lengths
+    return np.repeat(starts - offsets, lengths) + np.arange(lengths.sum())
+
+
+class PhashIndex:
+    """Hamming-distance index over (pHash, dHash, SHA-256) records, persisted in an append-only file"""
+
+    def __init__(self, path=PHASH_INDEX_PATH):
+        self.path = path
+        self.count = 0
+        self._lock = threading.Lock()
+        self._loaded_bytes = 0
+        self._merged = 0
+        self._phash = self._dhash = self._digests = None
+        self._offsets = self._order = ()
+        if hasattr(os, 'register_at_fork'):
+            os.register_at_fork(after_in_child=self._reset_lock)
+        self.refresh()
+
+    def _reset_lock(self):
+        self._lock = threading.Lock()
+
+    def _grow(self, needed):
+        import numpy as np
+
+        capacity = max(INITIAL_CAPACITY, len(self._phash) if self._phash is not None else 0)
+        while capacity < needed:
+            capacity *= 2
+        if self._phash is not None and capacity == len(self._phash):
+            return
+        phash = np.zeros(capacity, dtype=np.uint64)
+        dhash = np.zeros(capacity, dtype=np.uint64)
+        digests = np.zeros((capacity, DIGEST_SIZE), dtype=np.uint8)
+        if self._phash is not None:
+            phash[:self.count] = self._phash[:self.count]
+            dhash[:self.count] = self._dhash[:self.count]
+            digests[:self.count] = self._digests[:self.count]
+        self._phash, self._dhash, self._digests = phash, dhash, digests
+
+    def refresh(self):
+        """Load records appended since the last call (by any worker)"""
+        import numpy as np
+
+        try:
+            size = os.path.getsize(self.path)
+        except FileNotFoundError:
+            return
+        complete = size - size % RECORD_SIZE
+        if complete <= self._loaded_bytes:
+            return
+        with self._lock:
+            if complete <= self._loaded_bytes:
+                return
+            with open(self.path, 'rb') as handle:
+                handle.seek(self._loaded_bytes)
+                raw = handle.read(complete - self._loaded_bytes)
+            records = np.frombuffer(raw, dtype=np.uint8).reshape(-1, RECORD_SIZE)
+            added = len(records)
+            self._grow(self.count + added)
+            end = self.count + added
+            self._phash[self.count:end] = records[:, :8].copy().view('>u8').ravel()
+            self._dhash[self.count:end] = records[:, 8:16].copy().view('>u8').ravel()
+            self._digests[self.count:end] = records[:, 16:]
+            self.count = end
+            self._loaded_bytes += added * RECORD_SIZE
+            if self.count - self._merged >= MERGE_THRESHOLD:
+                self._merge()
+
+    def _merge(self):
+        """Rebuild the chunk tables over every loaded record"""
+        import numpy as np
+
+        phash = self._phash[:self.count]
+        offsets, order = [], []
+        for shift, width in CHUNKS:
+            chunk = ((phash >> np.uint64(shift)) & np.uint64((1 << width) - 1)).astype(np.uint32)
+            bounds = np.zeros((1 << width) + 1, dtype=np.uint32)
+            np.cumsum(np.bincount(chunk, minlength=1 << width), out=bounds[1:])
+            offsets.append(bounds)
+            order.append(np.argsort(chunk, kind='stable').astype(np.uint32))
+        self._offsets, self._order, self._merged = tuple(offsets), tuple(order), self.count
+
+    def add_many(self, entries, only_if_empty=False):
+        """Append (sha256 hex, pHash hex, dHash hex) entries; with `only_if_empty`, only into an empty index"""
+        payload = b''.join(
+            int(phash, 16).to_bytes(8, 'big') + int(dhash, 16).to_bytes(8, 'big') + bytes.fromhex(sha256)
+            for sha256, phash, dhash in entries
+        )
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with open(self.path, 'ab') as handle:
+            if fcntl is not None:
+                fcntl.flock(handle, fcntl.LOCK_EX)
+            try:
+                size = os.fstat(handle.fileno()).st_size
+                if only_if_empty and size >= RECORD_SIZE:
+                    return
+                if size % RECORD_SIZE:
+                    # A previous append was torn by a crash; drop it so records stay aligned
+                    handle.truncate(size - size % RECORD_SIZE)
+                if payload:
+                    handle.write(payload)
+                    handle.flush()
+            finally:
+                if fcntl is not None:
+                    fcntl.flock(handle, fcntl.LOCK_UN)
+        self.refresh()
+
+    def add(self, sha256, phash, dhash):
+        self.add_many([(sha256, phash, dhash)])
+
+    def search(self, phash, max_distance, dhash=None, dhash_max_distance=None, exclude=None):
+        """[(sha256 hex, pHash distance)] of indexed images within `max_distance`, closest first"""
+        import numpy as np
+
+        self.refresh()
+        with self._lock:
+            count, merged = self.count, self._merged
+            offsets, order = self._offsets, self._order
+            phashes, dhashes, digests = self._phash, self._dhash, self._digests
+        if not count:
+            return []
+
+        query = int(phash, 16)
+        radius = max_distance // len(CHUNKS)
+        candidates = [np.arange(merged, count)]
+        for (shift, width), bounds, chunk_order in zip(CHUNKS, offsets, order):
+            values = ((query >> shift) & ((1 << width) - 1)) ^ _flip_masks(width, radius)
+            starts = bounds[values].astype(np.int64)
+            stops = bounds[values + 1].astype(np.int64)
+            candidates.append(chunk_order[_ranges(starts, stops)])
+        ids = np.unique(np.concatenate(candidates))
+
+        distances = np.bitwise_count(phashes[ids] ^ np.uint64(query))
+        keep = distances <= max_distance
+        if dhash is not None and dhash_max_distance is not None:
+            keep &= np.bitwise_count(dhashes[ids] ^ np.uint64(int(dhash, 16))) <= dhash_max_distance
+        matches = {}
+        for position, gap in zip(ids[keep].tolist(), distances[keep].tolist()):
+            sha256 = digests[position].tobytes().hex()
+            if sha256 != exclude and gap < matches.get(sha256, max_distance + 1):
+                matches[sha256] = gap
+        return sorted(matches.items(), key=lambda match: match[1])
@@ -0,0 +1,226 @@
+"""
+Opt-in, request-scoped profiling.
+
+A request is profiled when it carries `X-Profile-Token: <PROFILE_ADMIN_TOKEN>`
+or is picked by `PROFILE_SAMPLE_RATE` (0.0 - 1.0, default off). For profiled
+requests:
+
+- the handler thread is profiled and the result is written to `PROFILE_DIR`:
+  `PROFILE_MODE=sampling` (default) writes folded stacks (`.folded`) for
+  flamegraph.pl / speedscope / inferno, `PROFILE_MODE=cprofile` writes a
+  pstats dump (`.prof`) for snakeviz / flameprof;
+- time spent in the parse, llm, scoring and serialization stages is returned
+  in a `Server-Timing` header, together with the total and the profile file.
+  Stages may overlap: scoring includes llm where an analysis calls the LLM.
+
+Requests that are not profiled pay for one dict lookup per stage.
+"""
+
+import collections
+import cProfile
+import functools
+import hmac
+import logging
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+
+from flask import g, has_app_context, request
+
+from ids import new_id
+
+logger = logging.getLogger(__name__)
+
+PROFILE_ADMIN_TOKEN = os.getenv('PROFILE_ADMIN_TOKEN', '')
+PROFILE_SAMPLE_RATE = float(os.getenv('PROFILE_SAMPLE_RATE', '0'))
+PROFILE_MODE = os.getenv('PROFILE_MODE', 'sampling')
+PROFILE_DIR = os.getenv('PROFILE_DIR', os.path.join(tempfile.gettempdir(), 'bfsi-profiles'))
+PROFILE_INTERVAL_MS = float(os.getenv('PROFILE_INTERVAL_MS', '2'))
+PROFILE_MAX_FILES = int(os.getenv('PROFILE_MAX_FILES', '200'))
+
+TOKEN_HEADER = 'X-Profile-Token'
+UNPROFILED_PATHS = {'/metrics'}
+
+
+class StackSampler:
+    """Samples one thread's Python stack at a fixed interval into folded-stack counts"""
+
+    def __init__(self, thread_id, interval):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.counts = collections.Counter()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name='profile-sampler', daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+                frame = frame.f_back
+            if stack:
+                self.counts[';'.join(reversed(stack))] += 1
+
+    def write(self, path):
+        with open(path, 'w', encoding='utf-8') as f:
+            for stack, count in self.counts.most_common():
+                f.write(f"{stack} {count}\n")
+
+
+def _current_stages():
+    return g.get('profile_stages') if has_app_context() else None
+
+
+def is_profiling():
+    return _current_stages() is not None
+
+
+@contextmanager
+def stage(name):
+    """Time a block as stage `name` of the current request (when it is profiled)"""
+    stages = _current_stages()
+    if stages is None:
+        yield
+        return
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        stages[name] = stages.get(name, 0.0) + time.perf_counter() - started
+
+
+def record(name, seconds):
+    """Add an already measured duration to stage `name` of the current request"""
+    stages = _current_stages()
+    if stages is not None:
+        stages[name] = stages.get(name, 0.0) + seconds
+
+
+def timed(name):
+    """Decorator form of `stage`"""
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with stage(name):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def should_profile():
+    if request.path in UNPROFILED_PATHS:
+        return False
+    token = request.headers.get(TOKEN_HEADER)
+    if token and PROFILE_ADMIN_TOKEN and hmac.compare_digest(token, PROFILE_ADMIN_TOKEN):
+        return True
+    return PROFILE_SAMPLE_RATE > 0 and random.random() < PROFILE_SAMPLE_RATE
+
+
+def server_timing(stages, total, profile_name):
+    """Format stage durations (seconds) as a Server-Timing header value"""
+    entries = [f"{name};dur={seconds * 1000:.2f}" for name, seconds in stages.items()]
+    entries.append(f"total;dur={total * 1000:.2f}")
+    if profile_name:
+        entries.append(f'profile;desc="{profile_name}"')
+    return ', '.join(entries)
+
+
+def _profile_path(extension):
+    os.makedirs(PROFILE_DIR, exist_ok=True)
+    route = request.url_rule.rule if request.url_rule else 'unmatched'
+    slug = route.strip('/').replace('/', '_').replace('<', '').replace('>', '') or 'root'
+    return os.path.join(PROFILE_DIR, f"{new_id()}-{request.method}-{slug}{extension}")
+
+
+def _prune():
+    """Keep at most PROFILE_MAX_FILES profiles, removing the oldest (IDs sort by time)"""
+    try:
+        names = sorted(os.listdir(PROFILE_DIR))
+        for name in names[:max(len(names) - PROFILE_MAX_FILES, 0)]:
+            os.remove(os.path.join(PROFILE_DIR, name))
+    except OSError as e:
+        logger.warning("Could not prune profiles: %s", e)
+
+
+def _stop_profiler():
+    """Stop the request's profiler, if any, and return it"""
+    profiler = g.pop('profiler', None)
+    if isinstance(profiler, StackSampler):
+        profiler.stop()
+    elif profiler is not None:
+        profiler.disable()
+    return profiler
+
+
+def init_app(app):
+    """Register the profiling hooks and time JSON serialization"""
+
+    @app.before_request
+    def _start_profile():
+        if not should_profile():
+            return
+        g.profile_stages = {}
+        g.profile_started = time.perf_counter()
+        if PROFILE_MODE == 'cprofile':
+            g.profiler = cProfile.Profile()
+            g.profiler.enable()
+        else:
+            g.profiler = StackSampler(threading.get_ident(), PROFILE_INTERVAL_MS / 1000)
+            g.profiler.start()
+
+        # Parse the body up front so its cost shows up as its own stage
+        # (Flask caches the result for the view).
+        with stage('parse'):
+            if request.is_json:
+                request.get_json(silent=True)
+            elif request.mimetype in ('multipart/form-data', 'application/x-www-form-urlencoded'):
+                request.form
+                request.files
+
+    @app.after_request
+    def _finish_profile(response):
+        if not is_profiling():
+            return response
+        total = time.perf_counter() - g.profile_started
+        profiler = _stop_profiler()
+        profile_name = None
+        try:
+            if isinstance(profiler, StackSampler):
+                path = _profile_path('.folded')
+                profiler.write(path)
+            else:
+                path = _profile_path('.prof')
+                profiler.dump_stats(path)
+            profile_name = os.path.basename(path)
+            _prune()
+        except OSError as e:
+            logger.error("Could not write profile: %s", e)
+        response.headers['Server-Timing'] = server_timing(g.profile_stages, total, profile_name)
+        logger.info("Profiled %s %s in %.1fms -> %s", request.method, request.path, total * 1000, profile_name)
+        return response
+
+    @app.teardown_request
+    def _cleanup_profile(error):
+        # Requests that failed before after_request still have to stop the profiler
+        _stop_profiler()
+
+    json_response = app.json.response
+
+    def _timed_json_response(*args, **kwargs):
+        with stage('serialization'):
+            return json_response(*args, **kwargs)
+
+    app.json.response = _timed_json_response
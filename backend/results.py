@@ -0,0 +1,178 @@
+"""
+Compact result records for the file security and investment scoring code.
+
+The scoring code records each finding as a short factor code, plus the
+few values its message needs, on a slots dataclass. It does not build a
+dict of English sentences for every file or investment. Codes are
+module-level string constants, which CPython interns, so a batch of a
+thousand files holds a thousand references to the same few strings. The
+messages and the nested response shape are produced once, when
+`to_dict()` renders the response. Duplicate findings across files are
+dropped in first-seen order.
+"""
+
+from dataclasses import dataclass
+
+# Security analysis of uploaded files: code -> message
+FILE_FACTORS = {
+    'size_large': 'File size is unusually large',
+    'size_small': 'File size is suspiciously small',
+    'executable': 'Executable file detected - high security risk',
+    'script': 'Script file detected - potential security risk',
+    'document': 'Document file - scan for malicious content',
+    'suspicious_name': 'Suspicious filename detected'
+}
+FILE_ISSUES = {
+    'executable': 'Executable files should not be uploaded',
+    'suspicious_name': 'Filename contains suspicious keywords'
+}
+
+# Investment analysis: code -> message template (formatted with the factor's values)
+INVESTMENT_FACTORS = {
+    'type': 'Investment type ({0}): {1}',
+    'amount_very_high': 'Investment amount ({0:.1f}% of income) is very high',
+    'amount_high': 'Investment amount ({0:.1f}% of income) is high',
+    'amount_moderate': 'Investment amount ({0:.1f}% of income) is moderate',
+    'income_unknown': 'Income information not available for amount assessment',
+    'duration': 'Investment duration: {0}',
+    'young': 'Young age allows for higher risk tolerance',
+    'older': 'Older age suggests conservative approach',
+    'low_income': 'Low income level increases risk',
+    'high_income': 'High income provides financial cushion',
+    'experience': 'Investment experience level: {0}',
+    'debt_high': 'High debt ratio ({0:.1f}%) increases financial risk',
+    'debt_moderate': 'Moderate debt ratio ({0:.1f}%)',
+    'low_savings': 'Low savings ratio indicates financial vulnerability'
+}
+
+RISK_MITIGATION = (
+    "Diversify across multiple investment types",
+    "Start with smaller amounts and increase gradually",
+    "Set up emergency fund before investing",
+    "Consider professional financial advice",
+    "Regular review and rebalancing of portfolio"
+)
+HIGH_RISK_MITIGATION = (
+    "Consider lower-risk alternatives",
+    "Ensure adequate insurance coverage",
+    "Focus on debt reduction first",
+    "Build emergency fund of 6+ months expenses"
+)
+
+
+def unique(items):
+    """Items without duplicates, in first-seen order"""
+    return list(dict.fromkeys(items))
+
+
+@dataclass(slots=True)
+class FileSecurityResult:
+    """Security score of one uploaded file"""
+
+    filename: str
+    size: int
+    content_type: str
+    extension: str
+    uploaded_at: str
+    risk_score: int = 0
+    # Tuples start as the shared empty tuple, so a clean file allocates nothing for its findings
+    factors: tuple = ()
+    issues: tuple = ()
+
+    def flag(self, points, factor, issue=None):
+        self.risk_score += points
+        self.factors += (factor,)
+        if issue is not None:
+            self.issues += (issue,)
+
+    @property
+    def status(self):
+        return 'safe' if self.risk_score < 3 else 'warning' if self.risk_score < 7 else 'danger'
+
+    def to_dict(self):
+        return {
+            'filename': self.filename,
+            'size': self.size,
+            'type': self.content_type,
+            'extension': self.extension,
+            'uploaded_at': self.uploaded_at,
+            'risk_score': self.risk_score,
+            'risk_factors': [FILE_FACTORS[code] for code in self.factors],
+            'security_issues': [FILE_ISSUES[code] for code in self.issues],
+            'status': self.status
+        }
+
+
+@dataclass(slots=True)
+class InvestmentAssessment:
+    """Risk score of one investment for one profile (see features.ProfileFeatures)"""
+
+    investment_type: str
+    amount: float
+    duration: str
+    expected_return: str
+    profile: object
+    risk_score: int = 0
+    factors: tuple = ()  # (code, values) pairs
+
+    def flag(self, points, factor, *values):
+        self.risk_score += points
+        self.factors += ((factor, values),)
+
+    def rating(self):
+        """(risk level, recommendation, suitability score) of the final score"""
+        if self.risk_score <= 3:
+            return 'low', 'Suitable', 9
+        if self.risk_score <= 5:
+            return 'medium', 'Moderate Risk', 7
+        if self.risk_score <= 7:
+            return 'high', 'High Risk', 5
+        return 'very high', 'Not Suitable', 3
+
+    def to_dict(self):
+        profile = self.profile
+        risk_level, recommendation, suitability_score = self.rating()
+        risk_mitigation = list(RISK_MITIGATION)
+        if self.risk_score > 7:
+            risk_mitigation.extend(HIGH_RISK_MITIGATION)
+        detailed_recommendations = [
+            f"Start with ₹{min(self.amount, 50000)} if new to {self.investment_type}",
+            "Build emergency fund of 6 months expenses first",
+            "Consider SIP approach for equity investments",
+            "Review investment every 6 months",
+            "Consult financial advisor for large amounts"
+        ]
+        if self.amount > 100000:
+            detailed_recommendations.append("Consider professional financial planning for large investments")
+        experience_supports = profile.experience in ('intermediate', 'advanced')
+        return {
+            "risk_assessment": {
+                "overall_risk_score": round(self.risk_score, 1),
+                "risk_level": risk_level,
+                "suitability_score": suitability_score,
+                "recommendation": recommendation,
+                "confidence_level": "high"
+            },
+            "risk_factors": [INVESTMENT_FACTORS[code].format(*values) for code, values in self.factors],
+            "user_profile_analysis": {
+                'age_factor': f"Age {profile.age} suggests {profile.horizon} investment horizon",
+                'income_factor': f"Income level {'supports' if profile.income > 500000 else 'may limit'} this investment amount",
+                'experience_factor': f"Investment experience ({profile.experience}) {'supports' if experience_supports else 'may limit'} this investment",
+                'goal_alignment': f"Investment {'aligns with' if profile.goals else 'needs goal clarification'} financial objectives"
+            },
+            "risk_mitigation": risk_mitigation,
+            "comparison_analysis": {
+                'vs_risk_tolerance': f"Investment risk ({risk_level}) {'aligns with' if risk_level == profile.risk_tolerance else 'differs from'} user tolerance ({profile.risk_tolerance})",
+                'vs_alternatives': "Consider lower-risk alternatives if risk tolerance is conservative",
+                'vs_goals': "Ensure investment timeline matches financial goals",
+                'vs_market_conditions': "Current market conditions may affect investment performance"
+            },
+            "detailed_recommendations": detailed_recommendations,
+            "investment_summary": {
+                "type": self.investment_type,
+                "amount": f"₹{self.amount:,.2f}",
+                "duration": self.duration,
+                "expected_return": self.expected_return,
+                "user_risk_tolerance": profile.risk_tolerance
+            }
+        }
@@ -0,0 +1,217 @@
+"""
+Resumable chunked uploads for files too large or links too flaky for one
+multipart request.
+
+    POST /api/uploads                      {"filename", "size", "purpose", "sha256"?}
+    PUT  /api/uploads/<id>                 raw bytes, X-Upload-Offset + X-Chunk-SHA256 headers
+    GET  /api/uploads/<id>                 current offset, to resume after a dropped connection
+    POST /api/uploads/<id>/complete        hands the file to claim submission / security analysis
+
+Each upload is a metadata file and a data file in `uploads/partial/`. Both
+live on disk, so chunks may land on any gunicorn worker. A chunk must start
+exactly at the current end of the data file. It is streamed straight into
+the file while its SHA-256 is computed. If the hash does not match, or the
+client disconnects, the file is truncated back to the chunk's offset so
+the chunk can simply be sent again. On completion the data file is renamed
+into the purpose directory; it is never read back into memory. When a
+whole-file `sha256` was given at init, the file is streamed once more to
+verify it.
+"""
+
+import hashlib
+import json
+import os
+import re
+import time
+
+import metrics
+import retention
+from ids import new_id
+
+try:
+    import fcntl
+except ImportError:  # Windows: rely on the offset check alone
+    fcntl = None
+
+CHUNK_SIZE = int(os.getenv('UPLOAD_CHUNK_SIZE', str(4 * 1024 * 1024)))
+MAX_CHUNK_SIZE = int(os.getenv('UPLOAD_MAX_CHUNK_SIZE', str(8 * 1024 * 1024)))
+MAX_UPLOAD_SIZE = int(float(os.getenv('UPLOAD_MAX_SIZE_MB', '200')) * 1024 * 1024)
+COPY_BUFFER = 64 * 1024
+
+UPLOAD_ID_PATTERN = re.compile(r'^UPS[0-9A-F]{12,32}$')
+SHA256_PATTERN = r'[0-9a-fA-F]{64}'
+_SHA256 = re.compile(SHA256_PATTERN)
+
+
+class UploadError(Exception):
+    """A request the upload protocol cannot accept; carries the HTTP status"""
+
+    def __init__(self, status, message, offset=None):
+        super().__init__(message)
+        self.status = status
+        self.message = message
+        self.offset = offset
+
+    def to_dict(self):
+        body = {'error': self.message}
+        if self.offset is not None:
+            body['offset'] = self.offset
+        return body
+
+
+def _paths(upload_id):
+    if not UPLOAD_ID_PATTERN.match(upload_id):
+        raise UploadError(404, 'Upload not found or expired')
+    directory = retention.partial_dir()
+    return os.path.join(directory, f'{upload_id}.json'), os.path.join(directory, f'{upload_id}.part')
+
+
+def _locked(handle):
+    if fcntl is not None:
+        fcntl.flock(handle, fcntl.LOCK_EX)
+
+
+def create(filename, size, purpose, sha256=None, content_type=None):
+    """Start an upload; returns its metadata"""
+    upload_id = new_id('UPS')
+    meta_path, data_path = _paths(upload_id)
+    upload = {
+        'upload_id': upload_id,
+        'filename': filename,
+        'size': size,
+        'purpose': purpose,
+        'sha256': sha256.lower() if sha256 else None,
+        'content_type': content_type or 'application/octet-stream',
+        'created_at': time.time()
+    }
+    open(data_path, 'xb').close()
+    with open(meta_path, 'x') as meta:
+        json.dump(upload, meta)
+    return upload
+
+
+def load(upload_id):
+    """Metadata of an upload plus its current `offset`"""
+    meta_path, data_path = _paths(upload_id)
+    try:
+        with open(meta_path) as meta:
+            upload = json.load(meta)
+        upload['offset'] = os.path.getsize(data_path)
+    except FileNotFoundError:
+        raise UploadError(404, 'Upload not found or expired') from None
+    return upload
+
+
+def describe(upload):
+    """Public view of an upload"""
+    return {
+        'upload_id': upload['upload_id'],
+        'filename': upload['filename'],
+        'purpose': upload['purpose'],
+        'size': upload['size'],
+        'offset': upload.get('offset', 0),
+        'chunk_size': CHUNK_SIZE,
+        'max_chunk_size': MAX_CHUNK_SIZE,
+        'expires_in': retention.PARTIAL_TTL
+    }
+
+
+def _reject(result, status, message, offset=None):
+    metrics.UPLOAD_CHUNKS.labels(result).inc()
+    return UploadError(status, message, offset)
+
+
+def write_chunk(upload_id, offset, checksum, stream):
+    """Append one chunk read from `stream` at `offset`; returns the new offset"""
+    upload = load(upload_id)
+    meta_path, data_path = _paths(upload_id)
+    if offset is None or not offset.isdigit():
+        raise _reject('invalid', 400, 'X-Upload-Offset header must be a byte offset')
+    if checksum is None or not _SHA256.fullmatch(checksum):
+        raise _reject('invalid', 400, 'X-Chunk-SHA256 header must be a hex SHA-256 digest')
+    offset = int(offset)
+    limit = min(MAX_CHUNK_SIZE, upload['size'] - offset)
+
+    try:
+        data = open(data_path, 'r+b')
+    except FileNotFoundError:
+        raise UploadError(404, 'Upload not found or expired') from None
+    with data:
+        _locked(data)
+        if not os.path.exists(meta_path):
+            # Completed or expired while this request waited for the lock
+            raise UploadError(404, 'Upload not found or expired')
+        current = os.fstat(data.fileno()).st_size
+        if offset != current:
+            raise _reject('offset_conflict', 409, 'Chunk does not start at the current upload offset', current)
+        data.seek(offset)
+        digest = hashlib.sha256()
+        written = 0
+        try:
+            while True:
+                block = stream.read(COPY_BUFFER)
+                if not block:
+                    break
+                written += len(block)
+                if written > limit:
+                    raise _reject('too_large', 413, 'Chunk exceeds the upload size or the maximum chunk size', offset)
+                digest.update(block)
+                data.write(block)
+            if not written:
+                raise _reject('invalid', 400, 'Chunk is empty', offset)
+            if digest.hexdigest() != checksum.lower():
+                raise _reject('checksum_mismatch', 422, 'Chunk checksum mismatch', offset)
+            data.flush()
+            os.fsync(data.fileno())
+        except BaseException:
+            # Client went away or sent bad data: drop the partial chunk so it can be resent
+            data.truncate(offset)
+            raise
+
+    # Keeps the upload alive for the retention sweeper while chunks arrive
+    os.utime(meta_path)
+    metrics.UPLOAD_CHUNKS.labels('accepted').inc()
+    return offset + written
+
+
+def _file_sha256(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as handle:
+        for block in iter(lambda: handle.read(1024 * 1024), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def discard(upload_id):
+    for path in _paths(upload_id):
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
+
+def complete(upload_id):
+    """Move a fully received upload into its purpose directory
+
+    Returns (upload metadata, stored name, path, size).
+    """
+    upload = load(upload_id)
+    meta_path, data_path = _paths(upload_id)
+    try:
+        data = open(data_path, 'rb')
+    except FileNotFoundError:
+        raise UploadError(404, 'Upload not found or expired') from None
+    with data:
+        _locked(data)
+        if not os.path.exists(meta_path):
+            # Completed concurrently by another request
+            raise UploadError(404, 'Upload not found or expired')
+        received = os.fstat(data.fileno()).st_size
+        if received != upload['size']:
+            raise UploadError(409, 'Upload is incomplete', received)
+        if upload['sha256'] and _file_sha256(data_path) != upload['sha256']:
+            discard(upload_id)
+            raise UploadError(422, 'File checksum mismatch; start the upload again')
+        stored_name, path, size = retention.adopt_upload(data_path, upload['filename'], upload['purpose'])
+        os.remove(meta_path)
+    return upload, stored_name, path, size
@@ -0,0 +1,278 @@
+"""
+Upload retention: per-purpose TTLs, a disk quota and a background sweeper.
+
+Uploads are stored as `UPLOAD_FOLDER/<purpose>/<unique id>_<filename>`:
+
+- `security_scan` files are only needed while they are analyzed and expire
+  after `UPLOAD_TTL_SECURITY_SCAN` seconds (default 1 day).
+- `claim` evidence expires after `UPLOAD_TTL_CLAIM` (default 90 days), as do
+  files left in the folder root by older versions.
+- Unfinished resumable uploads (`partial/`) are dropped once they have been
+  idle for `UPLOAD_TTL_PARTIAL` seconds (default 1 day). An upload's
+  metadata and data files are expired and evicted together, never one
+  without the other.
+- When the folder holds more than `UPLOAD_QUOTA_MB`, files of the purposes
+  in `UPLOAD_QUOTA_EVICT` are evicted, purpose by purpose in that order and
+  oldest first within a purpose, until usage is back under 90% of the
+  quota. By default only scratch files are evicted (security scans, then
+  unfinished uploads). Claim evidence is referenced by stored claims and
+  the document index, so it only leaves by TTL unless listed explicitly.
+  Files younger than `UPLOAD_MIN_AGE` seconds are never evicted because
+  they may still be in use.
+
+Each worker runs a daemon sweeper thread every `UPLOAD_SWEEP_INTERVAL`
+seconds, and earlier when its own writes may have pushed usage over the
+quota. A non-blocking lock file makes workers take turns, and a sweep is
+skipped when another worker swept recently. Every stat/unlink counts
+against `UPLOAD_SWEEP_MAX_OPS` per second, so a large backlog is drained
+gradually instead of saturating the disk. Reclaimed files and bytes are
+counted in Prometheus by purpose and reason (expired / quota).
+"""
+
+import logging
+import os
+import threading
+import time
+
+import metrics
+from ids import new_id
+
+try:
+    import fcntl
+except ImportError:  # Windows: no cross-process lock, workers may sweep concurrently
+    fcntl = None
+
+UPLOAD_FOLDER = 'uploads'
+DAY = 24 * 60 * 60
+
+PURPOSE_TTLS = {
+    'security_scan': int(os.getenv('UPLOAD_TTL_SECURITY_SCAN', str(DAY))),
+    'claim': int(os.getenv('UPLOAD_TTL_CLAIM', str(90 * DAY)))
+}
+LEGACY_PURPOSE = 'legacy'  # files saved directly in UPLOAD_FOLDER
+LEGACY_TTL = PURPOSE_TTLS['claim']
+PARTIAL_PURPOSE = 'partial'  # resumable uploads in progress (resumable.py)
+PARTIAL_TTL = int(os.getenv('UPLOAD_TTL_PARTIAL', str(DAY)))
+
+QUOTA_BYTES = int(float(os.getenv('UPLOAD_QUOTA_MB', '1024')) * 1024 * 1024)
+QUOTA_LOW_WATERMARK = 0.9
+# Purposes the quota may evict, first to last
+QUOTA_EVICT_ORDER = tuple(
+    purpose.strip() for purpose in
+    os.getenv('UPLOAD_QUOTA_EVICT', f'security_scan,{PARTIAL_PURPOSE}').split(',') if purpose.strip()
+)
+MIN_AGE = int(os.getenv('UPLOAD_MIN_AGE', '300'))
+SWEEP_INTERVAL = int(os.getenv('UPLOAD_SWEEP_INTERVAL', '600'))
+SWEEP_MAX_OPS = int(os.getenv('UPLOAD_SWEEP_MAX_OPS', '200'))
+
+LOCK_FILE = '.sweep.lock'
+
+logger = logging.getLogger(__name__)
+
+_sweeper = None
+_sweeper_lock = threading.Lock()
+_wake = threading.Event()
+_usage = 0  # bytes at the last sweep plus bytes written since (this worker only, approximate)
+_over_quota = False
+
+
+def purpose_dir(purpose):
+    if purpose not in PURPOSE_TTLS:
+        raise ValueError(f'Unknown upload purpose: {purpose}')
+    path = os.path.join(UPLOAD_FOLDER, purpose)
+    os.makedirs(path, exist_ok=True)
+    return path
+
+
+def partial_dir():
+    path = os.path.join(UPLOAD_FOLDER, PARTIAL_PURPOSE)
+    os.makedirs(path, exist_ok=True)
+    return path
+
+
+def save_upload(file, filename, purpose):
+    """Store an uploaded file under a unique name; returns (stored name, path, size)"""
+    stored_name = f"{new_id('UPL')}_{filename}"
+    path = os.path.join(purpose_dir(purpose), stored_name)
+    file.save(path)
+    return _stored(stored_name, path, purpose)
+
+
+def adopt_upload(source, filename, purpose):
+    """Move a file assembled elsewhere in UPLOAD_FOLDER into place (a rename, no copy)"""
+    stored_name = f"{new_id('UPL')}_{filename}"
+    path = os.path.join(purpose_dir(purpose), stored_name)
+    os.replace(source, path)
+    return _stored(stored_name, path, purpose)
+
+
+def _stored(stored_name, path, purpose):
+    global _usage, _over_quota
+    size = os.path.getsize(path)
+    metrics.observe_upload(purpose, size)
+
+    start_sweeper()
+    _usage += size
+    if QUOTA_BYTES and _usage > QUOTA_BYTES:
+        _over_quota = True
+        _wake.set()
+    return stored_name, path, size
+
+
+class _Pacer:
+    """Sleeps as needed to keep filesystem operations under `rate` per second"""
+
+    def __init__(self, rate):
+        self.rate = rate
+        self.ops = 0
+        self.started = time.monotonic()
+
+    def __call__(self):
+        if self.rate <= 0:
+            return
+        self.ops += 1
+        ahead = self.ops / self.rate - (time.monotonic() - self.started)
+        if ahead > 0:
+            time.sleep(ahead)
+
+
+def _reclaim(path, size, purpose, reason, stats):
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        return
+    metrics.UPLOAD_RECLAIMED_FILES.labels(purpose, reason).inc()
+    metrics.UPLOAD_RECLAIMED_BYTES.labels(purpose, reason).inc(size)
+    stats[reason] += 1
+    stats['bytes'] += size
+
+
+def _units(purpose, directory, pace):
+    """[newest mtime, total size, [(path, size)]] of each file, or of each resumable upload"""
+    try:
+        entries = list(os.scandir(directory))
+    except FileNotFoundError:
+        return []
+    units = {}
+    for entry in entries:
+        if entry.name.startswith('.') or not entry.is_file(follow_symlinks=False):
+            continue
+        pace()
+        try:
+            stat = entry.stat(follow_symlinks=False)
+        except FileNotFoundError:
+            continue
+        # <upload id>.json and <upload id>.part belong together
+        key = os.path.splitext(entry.path)[0] if purpose == PARTIAL_PURPOSE else entry.path
+        unit = units.setdefault(key, [0.0, 0, []])
+        unit[0] = max(unit[0], stat.st_mtime)
+        unit[1] += stat.st_size
+        unit[2].append((entry.path, stat.st_size))
+    return units.values()
+
+
+def _reclaim_unit(files, purpose, reason, stats, pace):
+    # Sorted, the .json metadata goes before the .part data, so writers waiting on the data see the upload gone
+    for path, size in sorted(files):
+        pace()
+        _reclaim(path, size, purpose, reason, stats)
+
+
+def _directories():
+    yield LEGACY_PURPOSE, UPLOAD_FOLDER, LEGACY_TTL
+    for purpose, ttl in PURPOSE_TTLS.items():
+        yield purpose, os.path.join(UPLOAD_FOLDER, purpose), ttl
+    yield PARTIAL_PURPOSE, os.path.join(UPLOAD_FOLDER, PARTIAL_PURPOSE), PARTIAL_TTL
+
+
+def sweep(now=None, max_ops=SWEEP_MAX_OPS):
+    """Delete expired files, then evict scratch purposes oldest-first down to the quota"""
+    global _usage
+    now = time.time() if now is None else now
+    pace = _Pacer(max_ops)
+    stats = {'expired': 0, 'quota': 0, 'bytes': 0, 'kept_bytes': 0}
+    usage = 0
+    evictable = []  # (eviction rank, mtime, size, files, purpose)
+
+    for purpose, directory, ttl in _directories():
+        for mtime, size, files in _units(purpose, directory, pace):
+            if now - mtime > ttl:
+                _reclaim_unit(files, purpose, 'expired', stats, pace)
+                continue
+            usage += size
+            if purpose in QUOTA_EVICT_ORDER:
+                evictable.append((QUOTA_EVICT_ORDER.index(purpose), mtime, size, files, purpose))
+
+    if QUOTA_BYTES and usage > QUOTA_BYTES:
+        target = QUOTA_BYTES * QUOTA_LOW_WATERMARK
+        evictable.sort()
+        for _, mtime, size, files, purpose in evictable:
+            if usage <= target:
+                break
+            if now - mtime < MIN_AGE:
+                continue
+            _reclaim_unit(files, purpose, 'quota', stats, pace)
+            usage -= size
+        if usage > QUOTA_BYTES:
+            logger.warning("Uploads still use %d bytes (quota %d) after evicting %s files",
+                           usage, QUOTA_BYTES, ', '.join(QUOTA_EVICT_ORDER) or 'no')
+
+    _usage = usage
+    stats['kept_bytes'] = usage
+    return stats
+
+
+def sweep_if_due(force=False):
+    """Sweep unless another worker is sweeping, or (unless forced) swept within half an interval"""
+    os.makedirs(UPLOAD_FOLDER, exist_ok=True)
+    lock_path = os.path.join(UPLOAD_FOLDER, LOCK_FILE)
+    with open(lock_path, 'a') as lock:
+        if fcntl is not None:
+            try:
+                fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                return None
+        try:
+            # A non-empty lock file's mtime records when the last sweep finished
+            info = os.fstat(lock.fileno())
+            if not force and info.st_size and time.time() - info.st_mtime < SWEEP_INTERVAL / 2:
+                return None
+            started = time.monotonic()
+            stats = sweep()
+            if not info.st_size:
+                lock.write('.')
+                lock.flush()
+            os.utime(lock_path)
+        finally:
+            if fcntl is not None:
+                fcntl.flock(lock, fcntl.LOCK_UN)
+
+    if stats['expired'] or stats['quota']:
+        logger.info("Upload sweep reclaimed %d expired and %d over-quota files (%d bytes) in %.1fs",
+                    stats['expired'], stats['quota'], stats['bytes'], time.monotonic() - started)
+    return stats
+
+
+def _run():
+    global _over_quota
+    while True:
+        _wake.wait(SWEEP_INTERVAL)
+        _wake.clear()
+        force, _over_quota = _over_quota, False
+        try:
+            sweep_if_due(force)
+        except Exception as e:
+            logger.error("Upload sweep failed: %s", e)
+
+
+def start_sweeper():
+    """Start this process's sweeper thread (idempotent; a no-op when UPLOAD_SWEEP_INTERVAL=0)"""
+    global _sweeper
+    if SWEEP_INTERVAL <= 0 or (_sweeper is not None and _sweeper.is_alive()):
+        return
+    with _sweeper_lock:
+        if _sweeper is None or not _sweeper.is_alive():
+            _sweeper = threading.Thread(target=_run, name='upload-sweeper', daemon=True)
+            _sweeper.start()
+            # Sweep soon after boot rather than one full interval later
+            _wake.set()
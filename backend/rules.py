@@ -0,0 +1,304 @@
+"""
+Declarative recommendation rules.
+
+Rules live in `data/recommendation_rules.json` (or `RECOMMENDATION_RULES_PATH`,
+which may also point to a YAML file when PyYAML is installed). Each rule has
+an id, a list of conditions ``{"field", "op", "value"}`` that must all hold,
+and the recommendation it produces.
+
+Rules are compiled into an index keyed by the fields they test: each rule is
+filed under one of its conditions - an equality bucket when it has one,
+otherwise a sorted threshold list per field and comparison - so evaluating a
+profile only looks at rules whose indexed condition already matches and
+checks their remaining conditions. The file is re-read when it changes, and
+every worker keeps per-rule hit counters. Callers that memoize evaluations
+report the matched rules of a cached result through `record_hits`, so the
+counters cover every evaluation, not just cache misses.
+"""
+
+import hashlib
+import json
+import logging
+import operator
+import os
+import threading
+import time
+from bisect import bisect_left, bisect_right
+
+logger = logging.getLogger(__name__)
+
+RULES_PATH = os.getenv(
+    'RECOMMENDATION_RULES_PATH',
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data', 'recommendation_rules.json')
+)
+# How often (seconds) a worker checks the rules file for changes
+RELOAD_INTERVAL = float(os.getenv('RULES_RELOAD_INTERVAL', '5'))
+
+COMPARISONS = {
+    '==': operator.eq,
+    '!=': operator.ne,
+    '<': operator.lt,
+    '<=': operator.le,
+    '>': operator.gt,
+    '>=': operator.ge,
+    'in': lambda value, options: value in options,
+    'not_in': lambda value, options: value not in options
+}
+RANGE_OPS = ('<', '<=', '>', '>=')
+
+
+class RuleError(ValueError):
+    """Raised when a rules file cannot be compiled"""
+
+
+def _number(value):
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def _check_rule(position, rule):
+    """Raise RuleError unless `rule` has the shape _add() relies on"""
+    if not isinstance(rule, dict):
+        raise RuleError(f"Rule {position} must be an object")
+    name = rule.get('id') or f"rule-{position}"
+    if not isinstance(rule.get('recommendation'), dict):
+        raise RuleError(f"Rule '{name}' needs a recommendation object")
+    conditions = rule.get('conditions', [])
+    if not isinstance(conditions, list):
+        raise RuleError(f"Rule '{name}' conditions must be a list")
+    for condition in conditions:
+        if not isinstance(condition, dict) or 'field' not in condition or 'op' not in condition:
+            raise RuleError(f"Rule '{name}' has a condition without a field and op")
+        field, op, value = condition['field'], condition['op'], condition.get('value')
+        if not isinstance(field, str):
+            raise RuleError(f"Rule '{name}' has a non-string field name")
+        if op in ('in', 'not_in') and not isinstance(value, list):
+            raise RuleError(f"Operator '{op}' on field '{field}' needs a list value")
+        if op in ('in', '==') and any(isinstance(item, (dict, list)) for item in (value if op == 'in' else [value])):
+            raise RuleError(f"Operator '{op}' on field '{field}' needs scalar values")
+
+
+def _compile_condition(condition):
+    field, op, expected = condition['field'], condition['op'], condition.get('value')
+    if op not in COMPARISONS:
+        raise RuleError(f"Unsupported operator '{op}' on field '{field}'")
+    compare = COMPARISONS[op]
+    if op in RANGE_OPS:
+        expected = _number(expected)
+        if expected is None:
+            raise RuleError(f"Operator '{op}' on field '{field}' needs a numeric value")
+
+        def check(profile):
+            value = _number(profile.get(field))
+            return value is not None and compare(value, expected)
+    elif op in ('in', 'not_in'):
+        expected = frozenset(expected or ())
+
+        def check(profile):
+            return compare(profile.get(field), expected)
+    else:
+        def check(profile):
+            return compare(profile.get(field), expected)
+    return check
+
+
+def _load_file(path):
+    with open(path, encoding='utf-8') as f:
+        if path.endswith(('.yaml', '.yml')):
+            try:
+                import yaml
+            except ImportError as e:
+                raise RuleError('PyYAML is required for YAML rule files') from e
+            return yaml.safe_load(f)
+        return json.load(f)
+
+
+class CompiledRules:
+    """An immutable, indexed rule set"""
+
+    def __init__(self, spec):
+        if not isinstance(spec, dict) or not isinstance(spec.get('rules', []), list):
+            raise RuleError("Rules file must be an object with a 'rules' list")
+        if not isinstance(spec.get('defaults', {}), dict):
+            raise RuleError("Rule 'defaults' must be an object")
+        self.version = spec.get('version')
+        self.defaults = spec.get('defaults', {})
+        # Identifies the rule set across workers, e.g. for caching evaluations
+        self.fingerprint = hashlib.sha1(json.dumps(spec, sort_keys=True, default=str).encode()).hexdigest()[:16]
+        self.fields = set()  # profile fields any rule looks at
+        self.rules = []
+        self.recommendations = []
+        self._residual = []  # conditions still to check after the index matched
+
+        self._equals = {}       # field -> value -> [rule index]
+        self._lower = {}        # (field, op) for > / >= -> (sorted thresholds, rule indexes)
+        self._upper = {}        # (field, op) for < / <= -> (sorted thresholds, rule indexes)
+        self._unindexed = []
+
+        seen = set()
+        for position, rule in enumerate(spec.get('rules', [])):
+            _check_rule(position, rule)
+            rule_id = rule.get('id') or f"rule-{position}"
+            if rule_id in seen:
+                raise RuleError(f"Duplicate rule id '{rule_id}'")
+            seen.add(rule_id)
+            self._add(rule_id, rule)
+
+        self._lower = {key: self._sorted(entries) for key, entries in self._lower.items()}
+        self._upper = {key: self._sorted(entries) for key, entries in self._upper.items()}
+
+    @staticmethod
+    def _sorted(entries):
+        entries.sort()
+        return [threshold for threshold, _ in entries], [index for _, index in entries]
+
+    def _add(self, rule_id, rule):
+        index = len(self.rules)
+        conditions = rule.get('conditions', [])
+        compiled = [_compile_condition(condition) for condition in conditions]
+        self.fields.update(condition['field'] for condition in conditions)
+
+        # Prefer an equality condition for the index, then a range condition
+        key_position = next((i for i, c in enumerate(conditions) if c['op'] in ('==', 'in')), None)
+        if key_position is None:
+            key_position = next((i for i, c in enumerate(conditions) if c['op'] in RANGE_OPS), None)
+
+        if key_position is None:
+            self._unindexed.append(index)
+        else:
+            condition = conditions[key_position]
+            field, op = condition['field'], condition['op']
+            if op == '==':
+                self._equals.setdefault(field, {}).setdefault(condition['value'], []).append(index)
+            elif op == 'in':
+                # A value listed twice must not file (and so match) the rule twice
+                for value in dict.fromkeys(condition['value']):
+                    self._equals.setdefault(field, {}).setdefault(value, []).append(index)
+            elif op in ('>', '>='):
+                self._lower.setdefault((field, op), []).append((_number(condition['value']), index))
+            else:
+                self._upper.setdefault((field, op), []).append((_number(condition['value']), index))
+            del compiled[key_position]
+
+        self.rules.append(rule_id)
+        self.recommendations.append(rule['recommendation'])
+        self._residual.append(tuple(compiled))
+
+    def candidates(self, profile):
+        """Rule indexes whose indexed condition matches the profile"""
+        found = list(self._unindexed)
+        for field, buckets in self._equals.items():
+            value = profile.get(field)
+            try:
+                found.extend(buckets.get(value, ()))
+            except TypeError:  # unhashable profile value
+                continue
+        for (field, op), (thresholds, indexes) in self._lower.items():
+            value = _number(profile.get(field))
+            if value is not None:
+                # value > threshold  <=>  threshold < value
+                end = bisect_left(thresholds, value) if op == '>' else bisect_right(thresholds, value)
+                found.extend(indexes[:end])
+        for (field, op), (thresholds, indexes) in self._upper.items():
+            value = _number(profile.get(field))
+            if value is not None:
+                start = bisect_right(thresholds, value) if op == '<' else bisect_left(thresholds, value)
+                found.extend(indexes[start:])
+        return found
+
+    def match(self, profile):
+        """Return indexes of all matching rules in file order"""
+        profile = {**self.defaults, **{k: v for k, v in profile.items() if v is not None}}
+        return sorted(index for index in self.candidates(profile)
+                      if all(check(profile) for check in self._residual[index]))
+
+
+class RuleEngine:
+    """Hot-reloading wrapper around the compiled rules with hit counters"""
+
+    def __init__(self, path=RULES_PATH, reload_interval=RELOAD_INTERVAL):
+        self.path = path
+        self.reload_interval = reload_interval
+        self._lock = threading.Lock()
+        self._hits = {}
+        self._mtime = None
+        self._checked_at = 0.0
+        self.loaded_at = None
+        self.compiled = None
+        self._reload()
+
+    def _reload(self):
+        mtime = os.stat(self.path).st_mtime
+        compiled = CompiledRules(_load_file(self.path))
+        with self._lock:
+            self.compiled = compiled
+            self._mtime = mtime
+            self.loaded_at = time.time()
+            # Keep counters for rules that survive the reload
+            self._hits = {rule_id: self._hits.get(rule_id, 0) for rule_id in compiled.rules}
+        logger.info("Loaded %d recommendation rules from %s", len(compiled.rules), self.path)
+
+    def maybe_reload(self):
+        now = time.monotonic()
+        if now - self._checked_at < self.reload_interval:
+            return
+        self._checked_at = now
+        try:
+            mtime = os.stat(self.path).st_mtime
+        except OSError as e:
+            logger.error("Recommendation rules file unavailable: %s", e)
+            return
+        if mtime == self._mtime:
+            return
+        try:
+            self._reload()
+        except (OSError, ValueError, KeyError, TypeError) as e:
+            # Keep serving the last good rule set; the bad file is not re-read until it changes again
+            logger.error("Recommendation rules reload failed: %s", e)
+            self._mtime = mtime
+
+    def current(self):
+        """The rule set in force, reloaded first if the file changed"""
+        self.maybe_reload()
+        return self.compiled
+
+    def evaluate(self, profile, compiled=None):
+        """Return the recommendations produced by a user profile (against `compiled` if given)"""
+        if compiled is None:
+            compiled = self.current()
+        matched = compiled.match(profile)
+        self.record_hits(compiled.rules[index] for index in matched)
+        return [dict(compiled.recommendations[index]) for index in matched]
+
+    def record_hits(self, rule_ids):
+        """Count a match of each rule, e.g. when serving a memoized evaluation"""
+        with self._lock:
+            for rule_id in rule_ids:
+                if rule_id in self._hits:
+                    self._hits[rule_id] += 1
+
+    def stats(self):
+        with self._lock:
+            hits = dict(self._hits)
+        return {
+            'version': self.compiled.version,
+            'rule_count': len(self.compiled.rules),
+            'loaded_at': self.loaded_at,
+            'hits': hits
+        }
+
+
+_engine = None
+_engine_lock = threading.Lock()
+
+
+def get_engine():
+    """Return the process-wide rule engine, compiling the rules on first use"""
+    global _engine
+    if _engine is None:
+        with _engine_lock:
+            if _engine is None:
+                _engine = RuleEngine()
+    return _engine
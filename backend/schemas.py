@@ -0,0 +1,360 @@
+"""
+Declarative request schemas.
+
+Each JSON route declares the shape of its body with `Schema` and `Field`.
+The declarations below are compiled into chains of small checker functions
+when this module is imported, so validating a request is one pass over the
+declared fields with no per-request interpretation of the declaration.
+
+`@validate(SCHEMA)` parses the body, checks and coerces it, and calls the
+view with the cleaned body as `data`. It sits above `@admission.limit`, so
+malformed requests are answered before they take a pool slot or reach any
+business logic:
+
+    400 {"error": "investment_details.amount must be greater than 0",
+         "details": [{"field": "investment_details.amount", "message": "must be greater than 0"}]}
+
+Coercion is as lenient as the frontend needs (numeric strings become
+numbers, numbers become strings). Missing, null and empty-string fields
+count as absent: required ones are reported, optional ones are dropped so
+handler defaults apply (a form left blank sends ""). Undeclared keys pass
+through untouched.
+"""
+
+import math
+import re
+from functools import wraps
+
+from flask import jsonify, request
+
+import metrics
+import resumable
+import retention
+import underwriting
+
+MISSING = object()
+
+MAX_MESSAGE_LENGTH = 4000
+MAX_HISTORY_ITEMS = 50
+MAX_IMPORT_POLICIES = 1000
+
+
+class Invalid(Exception):
+    """A value failed one of its field's checks"""
+
+
+def _number(value):
+    if isinstance(value, bool):
+        raise Invalid('must be a number')
+    if isinstance(value, (int, float)):
+        number = value
+    elif isinstance(value, str):
+        try:
+            number = float(value)
+        except ValueError:
+            raise Invalid('must be a number') from None
+    else:
+        raise Invalid('must be a number')
+    if not math.isfinite(number):
+        raise Invalid('must be a finite number')
+    return number
+
+
+def _integer(value):
+    if isinstance(value, int) and not isinstance(value, bool):
+        return value
+    number = _number(value)
+    if not float(number).is_integer():
+        raise Invalid('must be an integer')
+    return int(number)
+
+
+def _string(value):
+    if isinstance(value, str):
+        return value
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return str(value)
+    raise Invalid('must be a string')
+
+
+def _boolean(value):
+    if isinstance(value, bool):
+        return value
+    if value in ('true', 'false'):
+        return value == 'true'
+    raise Invalid('must be a boolean')
+
+
+def _instance(kind, name):
+    def coerce(value):
+        if not isinstance(value, kind):
+            raise Invalid(f'must be {name}')
+        return value
+    return coerce
+
+
+COERCERS = {
+    'number': _number,
+    'integer': _integer,
+    'string': _string,
+    'boolean': _boolean,
+    'object': _instance(dict, 'an object'),
+    'list': _instance(list, 'a list'),
+    'any': None
+}
+
+
+def _constraint(predicate, message):
+    def step(value):
+        if not predicate(value):
+            raise Invalid(message)
+        return value
+    return step
+
+
+class Field:
+    """One declared value: its type, presence and constraints"""
+
+    def __init__(self, kind='any', required=False, default=MISSING, minimum=None, maximum=None,
+                 greater_than=None, choices=None, max_length=None, min_items=None, max_items=None,
+                 pattern=None, lower=False, schema=None, items=None):
+        if kind not in COERCERS:
+            raise ValueError(f'Unknown field type: {kind}')
+        self.kind = kind
+        self.required = required
+        self.default = default
+        self.minimum = minimum
+        self.maximum = maximum
+        self.greater_than = greater_than
+        self.choices = choices
+        self.max_length = max_length
+        self.min_items = min_items
+        self.max_items = max_items
+        self.pattern = pattern
+        self.lower = lower
+        self.schema = schema
+        self.items = items
+
+    def compile(self):
+        """Return check(value, path, errors) -> cleaned value (None after an error)"""
+        steps = []
+        if COERCERS[self.kind] is not None:
+            steps.append(COERCERS[self.kind])
+        if self.lower:
+            steps.append(str.lower)
+        if self.minimum is not None:
+            minimum = self.minimum
+            steps.append(_constraint(lambda value: value >= minimum, f'must be at least {minimum}'))
+        if self.maximum is not None:
+            maximum = self.maximum
+            steps.append(_constraint(lambda value: value <= maximum, f'must be at most {maximum}'))
+        if self.greater_than is not None:
+            bound = self.greater_than
+            steps.append(_constraint(lambda value: value > bound, f'must be greater than {bound}'))
+        if self.choices is not None:
+            choices = frozenset(self.choices)
+            steps.append(_constraint(lambda value: value in choices,
+                                     f'must be one of: {", ".join(sorted(choices))}'))
+        if self.max_length is not None:
+            max_length = self.max_length
+            steps.append(_constraint(lambda value: len(value) <= max_length,
+                                     f'must be at most {max_length} characters'))
+        if self.pattern is not None:
+            regex = re.compile(self.pattern)
+            steps.append(_constraint(lambda value: regex.fullmatch(value) is not None, 'has an invalid format'))
+        if self.min_items is not None:
+            min_items = self.min_items
+            steps.append(_constraint(lambda value: len(value) >= min_items,
+                                     f'must have at least {min_items} item(s)'))
+        if self.max_items is not None:
+            max_items = self.max_items
+            steps.append(_constraint(lambda value: len(value) <= max_items,
+                                     f'must have at most {max_items} items'))
+        steps = tuple(steps)
+        nested = self.schema.compile() if self.schema is not None else None
+        item_check = self.items.compile() if self.items is not None else None
+
+        def check(value, path, errors):
+            try:
+                for step in steps:
+                    value = step(value)
+            except Invalid as e:
+                errors.append({'field': path, 'message': str(e)})
+                return None
+            if nested is not None:
+                value = nested(value, path, errors)
+            if item_check is not None:
+                value = [item_check(item, f'{path}[{index}]', errors) for index, item in enumerate(value)]
+            return value
+        return check
+
+
+class Schema:
+    """The declared fields of a JSON object"""
+
+    def __init__(self, fields):
+        self.fields = fields
+
+    def compile(self):
+        """Return check(obj, path, errors) -> cleaned copy of obj"""
+        plan = tuple(
+            (name, field.required, field.default, field.compile())
+            for name, field in self.fields.items()
+        )
+
+        def check(obj, path, errors):
+            cleaned = dict(obj)
+            for name, required, default, field_check in plan:
+                value = obj.get(name)
+                if value is None or value == '':
+                    cleaned.pop(name, None)
+                    if required:
+                        errors.append({'field': f'{path}.{name}' if path else name, 'message': 'is required'})
+                    elif default is not MISSING:
+                        cleaned[name] = default()
+                    continue
+                cleaned[name] = field_check(value, f'{path}.{name}' if path else name, errors)
+            return cleaned
+        return check
+
+
+def invalid(errors):
+    """400 response listing every failed field"""
+    if request.url_rule is not None:
+        metrics.VALIDATION_ERRORS.labels(request.url_rule.rule).inc()
+    first = errors[0]
+    response = jsonify({'error': f"{first['field']} {first['message']}", 'details': errors})
+    response.status_code = 400
+    return response
+
+
+def validate(schema):
+    """Validate the JSON body against `schema` and pass the cleaned body to the view as `data`"""
+    check = schema.compile()
+
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            body = request.get_json(force=True, silent=True)
+            if not isinstance(body, dict):
+                return invalid([{'field': 'body', 'message': 'must be a JSON object'}])
+            errors = []
+            data = check(body, '', errors)
+            if errors:
+                return invalid(errors)
+            return view(*args, data=data, **kwargs)
+        return wrapper
+    return decorator
+
+
+# Shared pieces
+
+PROFILE = Schema({
+    'age': Field('integer', minimum=0, maximum=underwriting.MAX_AGE),
+    'income': Field('number', minimum=0),
+    'savings': Field('number', minimum=0),
+    'debt': Field('number', minimum=0),
+    'emergencyFund': Field('number', minimum=0),
+    'dependents': Field('integer', minimum=0),
+    'riskTolerance': Field('string'),
+    'investmentExperience': Field('string'),
+    'financialGoals': Field('list')
+})
+
+POLICY_DATA = Schema({
+    'policy_type': Field('string'),
+    'applicant_age': Field('integer', minimum=0, maximum=underwriting.MAX_AGE),
+    'coverage_amount': Field('number', greater_than=0),
+    'term': Field('integer', greater_than=0, maximum=underwriting.MAX_TERM)
+})
+
+POLICY = Schema({
+    'policy_type': Field('string', required=True),
+    'coverage_amount': Field('number', required=True, greater_than=0),
+    'term': Field('integer', required=True, greater_than=0, maximum=underwriting.MAX_TERM),
+    'user_id': Field('string')
+})
+
+
+def _profile(required=False):
+    return Field('object', required=required, default=dict, schema=PROFILE)
+
+
+APPLICATION = Schema({
+    'policy_data': Field('object', default=dict, schema=POLICY_DATA),
+    'user_profile': _profile()
+})
+
+
+# Route schemas
+
+CHAT = Schema({
+    'message': Field('string', required=True, max_length=MAX_MESSAGE_LENGTH),
+    'history': Field('list', default=list, max_items=MAX_HISTORY_ITEMS),
+    'user_profile': _profile()
+})
+
+FRAUD_DETECTION = Schema({
+    'claim_data': Field('object', required=True, schema=Schema({
+        'claim_id': Field('string', max_length=64),
+        'amount': Field('number', minimum=0)
+    })),
+    'documents': Field('list', default=list),
+    'user_profile': _profile()
+})
+
+FINANCIAL_ANALYSIS = Schema({
+    'user_profile': _profile()
+})
+
+RECOMMENDATIONS = Schema({
+    'user_profile': _profile()
+})
+
+UNDERWRITING = Schema({
+    'policy_data': Field('object', required=True, schema=POLICY_DATA),
+    'user_profile': _profile()
+})
+
+BATCH_UNDERWRITING = Schema({
+    'applicants': Field('list', required=True, min_items=1, max_items=underwriting.MAX_BATCH_SIZE,
+                        items=Field('object', schema=APPLICATION))
+})
+
+QUOTE_GRID = Schema({
+    'coverage': Field(required=True),
+    'term': Field(required=True),
+    'policy_data': Field('object', default=dict, schema=POLICY_DATA),
+    'user_profile': _profile()
+})
+
+NEW_POLICY = POLICY
+
+POLICY_IMPORT = Schema({
+    'policies': Field('list', required=True, min_items=1, max_items=MAX_IMPORT_POLICIES,
+                      items=Field('object', schema=POLICY)),
+    'user_id': Field('string')
+})
+
+INVESTMENT_ANALYSIS = Schema({
+    'investment_details': Field('object', required=True, schema=Schema({
+        'type': Field('string', required=True, lower=True),
+        'amount': Field('number', required=True, greater_than=0),
+        'duration': Field('string', required=True, lower=True),
+        'risk_level': Field('string', lower=True)
+    })),
+    'user_profile': _profile()
+})
+
+UPLOAD_INIT = Schema({
+    'filename': Field('string', required=True, max_length=255),
+    'size': Field('integer', required=True, greater_than=0, maximum=resumable.MAX_UPLOAD_SIZE),
+    'purpose': Field('string', required=True, choices=retention.PURPOSE_TTLS),
+    'sha256': Field('string', pattern=resumable.SHA256_PATTERN),
+    'content_type': Field('string', max_length=255)
+})
+
+UPLOAD_COMPLETE = Schema({
+    'claim_data': Field('object', default=dict),
+    'user_profile': _profile()
+})
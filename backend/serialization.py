@@ -0,0 +1,92 @@
+"""
+orjson-backed JSON for all API responses.
+
+`OrjsonProvider` replaces Flask's stdlib-json provider, so `jsonify`,
+`request.get_json` and `app.json` all go through orjson. datetime/date/UUID,
+dataclasses and NumPy arrays/scalars are serialized natively; sets, Decimals,
+Markup and objects with a `to_dict()` method go through `default`.
+
+Differences from Flask's default provider: keys keep insertion order
+(`sort_keys` can still be turned on), datetimes are ISO 8601 rather than HTTP
+dates and NaN/Infinity become null instead of invalid JSON.
+
+`stream_json` sends a large array as a chunked response instead of building
+the whole document in memory first.
+"""
+
+import decimal
+
+import orjson
+from flask import Response
+from flask.json.provider import JSONProvider
+
+BASE_OPTIONS = orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS
+STREAM_CHUNK_SIZE = 64 * 1024
+# Arrays shorter than this are cheaper to send in one piece
+STREAM_MIN_ITEMS = 100
+
+
+def default(obj):
+    """Serialize types orjson does not handle itself"""
+    if isinstance(obj, (set, frozenset)):
+        return list(obj)
+    if isinstance(obj, decimal.Decimal):
+        return float(obj)
+    if hasattr(obj, 'to_dict'):
+        return obj.to_dict()
+    if hasattr(obj, '__html__'):
+        return str(obj.__html__())
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
+
+def dumps_bytes(obj, indent=False, sort_keys=False):
+    options = BASE_OPTIONS
+    if indent:
+        options |= orjson.OPT_INDENT_2
+    if sort_keys:
+        options |= orjson.OPT_SORT_KEYS
+    return orjson.dumps(obj, default=default, option=options)
+
+
+class OrjsonProvider(JSONProvider):
+    """Flask JSON provider using orjson"""
+
+    sort_keys = False
+    compact = None
+    mimetype = 'application/json'
+
+    def dumps(self, obj, **kwargs):
+        return dumps_bytes(obj, indent=bool(kwargs.get('indent')),
+                           sort_keys=kwargs.get('sort_keys', self.sort_keys)).decode()
+
+    def loads(self, s, **kwargs):
+        return orjson.loads(s)
+
+    def response(self, *args, **kwargs):
+        obj = self._prepare_response_obj(args, kwargs)
+        indent = self.compact is False or (self.compact is None and self._app.debug)
+        # Bytes go straight into the response, no str round trip
+        body = dumps_bytes(obj, indent=indent, sort_keys=self.sort_keys) + b'\n'
+        return self._app.response_class(body, mimetype=self.mimetype)
+
+
+def iter_json(array_key, items, fields=None, chunk_size=STREAM_CHUNK_SIZE):
+    """Yield `{array_key: [items...], **fields}` as JSON in chunks of about `chunk_size` bytes"""
+    buffer = bytearray(b'{' + orjson.dumps(array_key) + b':[')
+    for index, item in enumerate(items):
+        if index:
+            buffer += b','
+        buffer += dumps_bytes(item)
+        if len(buffer) >= chunk_size:
+            yield bytes(buffer)
+            buffer.clear()
+    buffer += b']'
+    for key, value in (fields or {}).items():
+        buffer += b',' + orjson.dumps(key) + b':' + dumps_bytes(value)
+    buffer += b'}\n'
+    yield bytes(buffer)
+
+
+def stream_json(array_key, items, fields=None):
+    """Chunked JSON response for a large array (`fields` are appended after it)"""
+    return Response(iter_json(array_key, items, fields), mimetype='application/json')
@@ -0,0 +1,84 @@
+"""
+In-process request coalescing ("single flight").
+
+Concurrent calls with the same key share one execution: the first caller
+(the leader) runs the function, later callers wait for it and get the same
+result - or the same exception. A waiter that gives up after `timeout`
+seconds gets `CoalesceTimeout`; the leader keeps running and its result is
+still delivered to the other waiters. Nothing is cached: once the call
+finishes, the next caller with that key starts a new one.
+
+This coalesces threads of one worker (gthread workers); across workers use
+`cache.TieredCache.get_or_compute`.
+"""
+
+import hashlib
+import threading
+
+import metrics
+
+
+class CoalesceTimeout(TimeoutError):
+    """Raised to a waiter whose leader did not finish in time"""
+
+
+class _Call:
+    __slots__ = ('done', 'result', 'error', 'waiters')
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+        self.waiters = 0
+
+
+def fingerprint(*parts):
+    """Key for a call made of strings, e.g. a model name and a prompt"""
+    digest = hashlib.sha256()
+    for part in parts:
+        digest.update(part.encode('utf-8'))
+        digest.update(b'\0')
+    return digest.hexdigest()
+
+
+class SingleFlight:
+    """A group of coalesced calls, named for metrics"""
+
+    def __init__(self, name):
+        self.name = name
+        self._calls = {}
+        self._lock = threading.Lock()
+
+    def do(self, key, func, timeout=None):
+        """Run `func()` once for all concurrent callers with the same `key`"""
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+            else:
+                call.waiters += 1
+
+        if leader:
+            try:
+                call.result = func()
+                return call.result
+            except BaseException as e:
+                call.error = e
+                raise
+            finally:
+                with self._lock:
+                    del self._calls[key]
+                call.done.set()
+
+        metrics.COALESCED_CALLS.labels(self.name).inc()
+        if not call.done.wait(timeout):
+            metrics.COALESCE_TIMEOUTS.labels(self.name).inc()
+            raise CoalesceTimeout(f"{self.name} call did not finish within {timeout}s")
+        if call.error is not None:
+            raise call.error
+        return call.result
+
+    def in_flight(self):
+        with self._lock:
+            return len(self._calls)
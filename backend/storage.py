@@ -0,0 +1,211 @@
+"""
+SQLite-backed storage for policies and claims.
+
+The database runs in WAL mode so gunicorn workers can read while another
+worker writes. Connections are pooled per process and every query uses a
+fixed SQL string, which lets sqlite3's statement cache reuse the prepared
+statement. Listing is keyset paginated on the (k-sortable) record id and
+backed by composite indexes, so pages never need a full scan or sort.
+"""
+
+import json
+import os
+import queue
+import sqlite3
+from contextlib import contextmanager
+
+DATABASE_PATH = os.getenv('DATABASE_PATH', 'bfsi.db')
+POOL_SIZE = int(os.getenv('DATABASE_POOL_SIZE', '8'))
+
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 200
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS policies (
+    id TEXT PRIMARY KEY,
+    user_id TEXT,
+    type TEXT NOT NULL,
+    status TEXT NOT NULL,
+    created_at TEXT NOT NULL,
+    data TEXT NOT NULL
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS idx_policies_user ON policies (user_id, id);
+CREATE INDEX IF NOT EXISTS idx_policies_type ON policies (type, id);
+CREATE INDEX IF NOT EXISTS idx_policies_status ON policies (status, id);
+CREATE INDEX IF NOT EXISTS idx_policies_user_status ON policies (user_id, status, id);
+CREATE INDEX IF NOT EXISTS idx_policies_type_status ON policies (type, status, id);
+
+CREATE TABLE IF NOT EXISTS claims (
+    id TEXT PRIMARY KEY,
+    user_id TEXT,
+    type TEXT,
+    status TEXT NOT NULL,
+    created_at TEXT NOT NULL,
+    data TEXT NOT NULL
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS idx_claims_user ON claims (user_id, id);
+CREATE INDEX IF NOT EXISTS idx_claims_type ON claims (type, id);
+CREATE INDEX IF NOT EXISTS idx_claims_status ON claims (status, id);
+CREATE INDEX IF NOT EXISTS idx_claims_user_status ON claims (user_id, status, id);
+CREATE INDEX IF NOT EXISTS idx_claims_type_status ON claims (type, status, id);
+"""
+
+# Columns that can be filtered on; single filters and the common
+# (user|type, status) pairs each have a matching (..., id) index
+FILTER_COLUMNS = ('user_id', 'type', 'status')
+
+
+class ConnectionPool:
+    """Small per-process pool of SQLite connections"""
+
+    def __init__(self, path, size):
+        self.path = path
+        self.size = size
+        self._idle = queue.LifoQueue(maxsize=size)
+
+    def _connect(self):
+        conn = sqlite3.connect(
+            self.path,
+            timeout=10,
+            isolation_level=None,  # autocommit; transactions are explicit
+            check_same_thread=False,
+            cached_statements=256
+        )
+        conn.execute('PRAGMA journal_mode=WAL')
+        conn.execute('PRAGMA synchronous=NORMAL')
+        conn.execute('PRAGMA foreign_keys=ON')
+        return conn
+
+    @contextmanager
+    def connection(self):
+        try:
+            conn = self._idle.get_nowait()
+        except queue.Empty:
+            conn = self._connect()
+        try:
+            yield conn
+        finally:
+            try:
+                self._idle.put_nowait(conn)
+            except queue.Full:
+                conn.close()
+
+    def reset(self):
+        """Drop pooled connections (they must not be shared across fork)"""
+        self._idle = queue.LifoQueue(maxsize=self.size)
+
+
+pool = ConnectionPool(DATABASE_PATH, POOL_SIZE)
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=pool.reset)
+
+
+def init_db():
+    """Create tables and indexes if they do not exist yet"""
+    with pool.connection() as conn:
+        conn.executescript(SCHEMA)
+
+
+@contextmanager
+def transaction(conn):
+    conn.execute('BEGIN IMMEDIATE')
+    try:
+        yield conn
+    except Exception:
+        conn.execute('ROLLBACK')
+        raise
+    conn.execute('COMMIT')
+
+
+def _row_params(record, user_id=None):
+    return (
+        record['id'],
+        user_id or record.get('user_id'),
+        record.get('type'),
+        record.get('status', 'active'),
+        record['created_at'],
+        json.dumps(record)
+    )
+
+
+def _insert_sql(table):
+    return f"INSERT INTO {table} (id, user_id, type, status, created_at, data) VALUES (?, ?, ?, ?, ?, ?)"
+
+
+def _list_sql(table, filters, with_cursor):
+    # Only a handful of filter combinations exist, so every variant is a
+    # fixed string and stays in sqlite3's prepared statement cache.
+    clauses = [f"{column} = ?" for column in filters]
+    if with_cursor:
+        clauses.append("id < ?")
+    where = f"WHERE {' AND '.join(clauses)}" if clauses else ''
+    return f"SELECT data FROM {table} {where} ORDER BY id DESC LIMIT ?"
+
+
+def _insert(table, record, user_id=None):
+    with pool.connection() as conn:
+        conn.execute(_insert_sql(table), _row_params(record, user_id))
+    return record
+
+
+def _bulk_insert(table, records, user_id=None):
+    rows = [_row_params(record, user_id) for record in records]
+    with pool.connection() as conn, transaction(conn):
+        conn.executemany(_insert_sql(table), rows)
+    return len(rows)
+
+
+def _get(table, record_id):
+    with pool.connection() as conn:
+        row = conn.execute(f"SELECT data FROM {table} WHERE id = ?", (record_id,)).fetchone()
+    return json.loads(row[0]) if row else None
+
+
+def _list(table, filters=None, cursor=None, limit=DEFAULT_PAGE_SIZE):
+    """Return one page of records (newest first) and the cursor for the next page"""
+    filters = {column: value for column, value in (filters or {}).items()
+               if column in FILTER_COLUMNS and value not in (None, '')}
+    columns = [column for column in FILTER_COLUMNS if column in filters]
+    limit = max(1, min(int(limit), MAX_PAGE_SIZE))
+
+    params = [filters[column] for column in columns]
+    if cursor:
+        params.append(cursor)
+    # Fetch one extra row to know whether another page exists
+    params.append(limit + 1)
+
+    with pool.connection() as conn:
+        rows = conn.execute(_list_sql(table, columns, bool(cursor)), params).fetchall()
+
+    records = [json.loads(row[0]) for row in rows[:limit]]
+    next_cursor = records[-1]['id'] if len(rows) > limit else None
+    return records, next_cursor
+
+
+def save_policy(policy, user_id=None):
+    return _insert('policies', policy, user_id)
+
+
+def bulk_insert_policies(policies, user_id=None):
+    return _bulk_insert('policies', policies, user_id)
+
+
+def get_policy(policy_id):
+    return _get('policies', policy_id)
+
+
+def list_policies(filters=None, cursor=None, limit=DEFAULT_PAGE_SIZE):
+    return _list('policies', filters, cursor, limit)
+
+
+def save_claim(claim, user_id=None):
+    return _insert('claims', claim, user_id)
+
+
+def get_claim(claim_id):
+    return _get('claims', claim_id)
+
+
+def list_claims(filters=None, cursor=None, limit=DEFAULT_PAGE_SIZE):
+    return _list('claims', filters, cursor, limit)
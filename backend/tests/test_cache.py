@@ -0,0 +1,33 @@
+import pytest
+
+import cache
+from benchmarks.mock_redis import MockRedisServer
+
+
+@pytest.fixture(params=['memory', 'sqlite', 'redis'])
+def backend(request, tmp_path):
+    if request.param == 'memory':
+        yield cache.MemoryBackend()
+    elif request.param == 'sqlite':
+        yield cache.SQLiteBackend(path=str(tmp_path / 'cache.db'))
+    else:
+        server = MockRedisServer().start()
+        yield cache.RedisBackend(url=server.url, prefix='test:')
+        server.stop()
+
+
+def test_delete_if_only_drops_a_matching_value(backend):
+    backend.set('lock', b'mine', 10)
+    backend.delete_if('lock', b'theirs')
+    assert backend.get('lock') == b'mine'
+    backend.delete_if('lock', b'mine')
+    assert backend.get('lock') is None
+
+
+def test_release_leaves_a_lock_taken_over_by_another_worker(backend):
+    tiered = cache.TieredCache('test', backend)
+    backend.set('lock', b'other-token', 10)
+    tiered._release('lock', b'my-token')
+    assert backend.get('lock') == b'other-token'
+    tiered._release('lock', b'other-token')
+    assert backend.get('lock') is None
@@ -0,0 +1,67 @@
+import struct
+
+import pytest
+from PIL import Image, ImageFile
+
+import extraction
+import image_checks
+
+
+@pytest.fixture
+def decodes(monkeypatch):
+    """Count full pixel decodes of opened images"""
+    calls = []
+    load = ImageFile.ImageFile.load
+
+    def counting_load(self):
+        if self._im is None:
+            calls.append(self.format)
+        return load(self)
+    monkeypatch.setattr(ImageFile.ImageFile, 'load', counting_load)
+    return calls
+
+
+def png_with_trailing_exif(path, size):
+    """A PNG whose eXIf chunk follows the image data, as some editors write it"""
+    exif = Image.Exif()
+    exif[306] = '2024:01:02 03:04:05'
+    Image.new('RGB', size, 'red').save(path, exif=exif)
+    data = path.read_bytes()
+    chunks, position = [], 8
+    while position < len(data):
+        length, kind = struct.unpack('>I4s', data[position:position + 8])
+        chunks.append((kind, data[position:position + length + 12]))
+        position += length + 12
+    order = [b'IHDR', b'IDAT', b'eXIf', b'IEND']
+    chunks.sort(key=lambda chunk: order.index(chunk[0]) if chunk[0] in order else 1)
+    path.write_bytes(data[:8] + b''.join(chunk for _, chunk in chunks))
+
+
+def test_large_non_jpeg_is_not_decoded(tmp_path, decodes):
+    path = tmp_path / 'large.png'
+    Image.new('L', (5000, 3000), 128).save(path, compress_level=1)
+    assert 5000 * 3000 > image_checks.IMAGE_MAX_DECODE_PIXELS
+
+    result = image_checks.analyze(str(path))
+    assert decodes == []
+    assert result['phash'] is None and result['analyzed_size'] is None
+    assert result['indicators'] == ['Photo is too large to check (not a JPEG)']
+
+
+def test_non_jpeg_is_checked_at_analysis_size(tmp_path, decodes):
+    path = tmp_path / 'photo.png'
+    png_with_trailing_exif(path, (1600, 1200))
+
+    result = image_checks.analyze(str(path))
+    assert decodes == ['PNG']  # once, for the thumbnail; reading EXIF does not decode
+    assert max(result['analyzed_size']) <= image_checks.IMAGE_ANALYSIS_SIZE
+    assert result['phash'] and result['exif']['modified_at'] == '2024-01-02T03:04:05'
+
+
+def test_png_exif_after_image_data_is_read_without_decoding(tmp_path, decodes):
+    path = tmp_path / 'photo.png'
+    png_with_trailing_exif(path, (64, 48))
+
+    _, metadata = extraction.extract_image(str(path))
+    assert decodes == []
+    assert metadata['datetime'] == '2024:01:02 03:04:05' and metadata['has_exif']
@@ -0,0 +1,114 @@
+import os
+import random
+
+import pytest
+
+import phash_index
+from phash_index import PhashIndex
+
+DISTANCE = 8
+
+
+def hex64(value):
+    return f'{value:016x}'
+
+
+def digest(number):
+    return f'{number:064x}'
+
+
+def flip(value, bits, rng):
+    for bit in rng.sample(range(64), bits):
+        value ^= 1 << bit
+    return value
+
+
+def brute_force(entries, query, max_distance, exclude=None):
+    return sorted(
+        (sha256, bin(int(phash, 16) ^ query).count('1')) for sha256, phash, _ in entries
+        if bin(int(phash, 16) ^ query).count('1') <= max_distance and sha256 != exclude
+    )
+
+
+@pytest.fixture
+def entries():
+    """Random hashes plus near-duplicates (1-8 bits away) of the first 20"""
+    rng = random.Random(7)
+    values = [rng.getrandbits(64) for _ in range(300)]
+    values += [flip(values[i % 20], 1 + i % DISTANCE, rng) for i in range(60)]
+    return [(digest(number), hex64(value), hex64(value)) for number, value in enumerate(values)]
+
+
+@pytest.fixture
+def index_path(tmp_path, monkeypatch):
+    # A small threshold exercises both the chunk tables and the brute-forced tail
+    monkeypatch.setattr(phash_index, 'MERGE_THRESHOLD', 100)
+    return str(tmp_path / 'phash.bin')
+
+
+def assert_matches_brute_force(index, entries):
+    for _, phash, _ in entries[:20] + entries[-20:]:
+        query = int(phash, 16)
+        for max_distance in (0, 3, DISTANCE):
+            assert sorted(index.search(phash, max_distance)) == brute_force(entries, query, max_distance)
+
+
+def test_search_matches_brute_force_across_merges(index_path, entries):
+    index = PhashIndex(index_path)
+    index.add_many(entries[:250])
+    assert index._merged == 250
+    for entry in entries[250:300]:
+        index.add(*entry)
+    assert (index._merged, index.count) == (250, 300)
+    assert_matches_brute_force(index, entries[:300])
+
+    # The 100th unmerged record triggers a rebuild; the last 10 stay in the tail
+    for entry in entries[300:]:
+        index.add(*entry)
+    assert (index._merged, index.count) == (350, 360)
+    assert_matches_brute_force(index, entries)
+
+
+def test_results_are_closest_first_and_exclude_the_query(index_path, entries):
+    index = PhashIndex(index_path)
+    index.add_many(entries)
+    sha256, phash, _ = entries[0]
+    found = index.search(phash, DISTANCE, exclude=sha256)
+    assert sha256 not in dict(found)
+    assert [gap for _, gap in found] == sorted(gap for _, gap in found)
+    assert sorted(found) == brute_force(entries, int(phash, 16), DISTANCE, exclude=sha256)
+
+
+def test_dhash_filter(index_path):
+    index = PhashIndex(index_path)
+    index.add_many([(digest(1), hex64(0), hex64(0)), (digest(2), hex64(1), hex64(2 ** 64 - 1))])
+    assert index.search(hex64(0), 4) == [(digest(1), 0), (digest(2), 1)]
+    assert index.search(hex64(0), 4, dhash=hex64(0), dhash_max_distance=10) == [(digest(1), 0)]
+
+
+def test_other_workers_see_appended_records(index_path, entries):
+    writer, reader = PhashIndex(index_path), PhashIndex(index_path)
+    writer.add_many(entries)
+    assert_matches_brute_force(reader, entries)
+
+
+def test_torn_append_is_cut_off(index_path, entries):
+    index = PhashIndex(index_path)
+    index.add_many(entries[:5])
+    with open(index_path, 'ab') as handle:
+        handle.write(b'\x00' * 10)
+    index.add(*entries[5])
+    assert os.path.getsize(index_path) == 6 * phash_index.RECORD_SIZE
+    assert PhashIndex(index_path).count == 6
+
+
+def test_seeding_only_fills_an_empty_index(index_path, entries):
+    index = PhashIndex(index_path)
+    index.add_many(entries[:3], only_if_empty=True)
+    index.add_many(entries[3:6], only_if_empty=True)
+    assert index.count == 3
+    assert index.search(entries[4][1], 0) == []
+
+
+def test_empty_index(index_path):
+    assert PhashIndex(index_path).search(hex64(123), DISTANCE) == []
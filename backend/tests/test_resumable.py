@@ -0,0 +1,124 @@
+import hashlib
+import io
+import os
+
+import pytest
+
+import resumable
+import retention
+from resumable import UploadError
+
+CONTENT = b'0123456789' * 10
+
+
+def sha(data):
+    return hashlib.sha256(data).hexdigest()
+
+
+def send(upload_id, offset, data, checksum=None):
+    return resumable.write_chunk(upload_id, str(offset), checksum or sha(data), io.BytesIO(data))
+
+
+@pytest.fixture(autouse=True)
+def upload_folder(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(retention, 'SWEEP_INTERVAL', 0)
+    return tmp_path / retention.UPLOAD_FOLDER
+
+
+@pytest.fixture
+def upload():
+    return resumable.create('bill.pdf', len(CONTENT), 'claim', sha256=sha(CONTENT))
+
+
+def test_chunks_are_appended_and_completed(upload, upload_folder):
+    upload_id = upload['upload_id']
+    assert send(upload_id, 0, CONTENT[:40]) == 40
+    assert send(upload_id, 40, CONTENT[40:]) == len(CONTENT)
+
+    _, stored_name, path, size = resumable.complete(upload_id)
+    assert size == len(CONTENT)
+    assert stored_name.endswith('_bill.pdf')
+    assert open(path, 'rb').read() == CONTENT
+    assert os.listdir(upload_folder / retention.PARTIAL_PURPOSE) == []
+    with pytest.raises(UploadError) as error:
+        resumable.load(upload_id)
+    assert error.value.status == 404
+
+
+def test_offset_mismatch_reports_current_offset_for_resume(upload):
+    upload_id = upload['upload_id']
+    send(upload_id, 0, CONTENT[:30])
+
+    for stale in (0, 50):
+        with pytest.raises(UploadError) as error:
+            send(upload_id, stale, CONTENT[stale:stale + 10])
+        assert (error.value.status, error.value.offset) == (409, 30)
+
+    # Resume from the offset the server reports
+    offset = resumable.load(upload_id)['offset']
+    assert offset == 30
+    assert send(upload_id, offset, CONTENT[offset:]) == len(CONTENT)
+    assert resumable.complete(upload_id)[3] == len(CONTENT)
+
+
+def test_bad_checksum_rolls_the_chunk_back(upload):
+    upload_id = upload['upload_id']
+    send(upload_id, 0, CONTENT[:20])
+    with pytest.raises(UploadError) as error:
+        send(upload_id, 20, CONTENT[20:40], checksum=sha(b'something else'))
+    assert (error.value.status, error.value.offset) == (422, 20)
+    assert resumable.load(upload_id)['offset'] == 20
+    assert send(upload_id, 20, CONTENT[20:40]) == 40
+
+
+def test_interrupted_chunk_is_truncated(upload):
+    class Dropped(io.BytesIO):
+        def read(self, size=-1):
+            if self.tell():
+                raise OSError('client disconnected')
+            return super().read(5)
+
+    upload_id = upload['upload_id']
+    with pytest.raises(OSError):
+        resumable.write_chunk(upload_id, '0', sha(CONTENT[:10]), Dropped(CONTENT[:10]))
+    assert resumable.load(upload_id)['offset'] == 0
+
+
+def test_chunk_past_the_declared_size_is_rejected(upload):
+    with pytest.raises(UploadError) as error:
+        send(upload['upload_id'], 0, CONTENT + b'x')
+    assert error.value.status == 413
+    assert resumable.load(upload['upload_id'])['offset'] == 0
+
+
+@pytest.mark.parametrize('offset, checksum', [(None, 'a' * 64), ('-1', 'a' * 64), ('0', 'not-a-digest')])
+def test_malformed_headers_are_rejected(upload, offset, checksum):
+    with pytest.raises(UploadError) as error:
+        resumable.write_chunk(upload['upload_id'], offset, checksum, io.BytesIO(b'data'))
+    assert error.value.status == 400
+
+
+def test_incomplete_upload_cannot_be_completed(upload):
+    send(upload['upload_id'], 0, CONTENT[:10])
+    with pytest.raises(UploadError) as error:
+        resumable.complete(upload['upload_id'])
+    assert (error.value.status, error.value.offset) == (409, 10)
+
+
+def test_whole_file_checksum_mismatch_discards_the_upload():
+    upload = resumable.create('bill.pdf', len(CONTENT), 'claim', sha256=sha(b'other'))
+    send(upload['upload_id'], 0, CONTENT)
+    with pytest.raises(UploadError) as error:
+        resumable.complete(upload['upload_id'])
+    assert error.value.status == 422
+    with pytest.raises(UploadError) as error:
+        resumable.load(upload['upload_id'])
+    assert error.value.status == 404
+
+
+@pytest.mark.parametrize('upload_id', ['UPS123', '../../etc/passwd', 'UPS' + '0' * 12])
+def test_unknown_or_malformed_ids_are_not_found(upload_id):
+    with pytest.raises(UploadError) as error:
+        resumable.load(upload_id)
+    assert error.value.status == 404
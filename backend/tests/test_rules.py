@@ -0,0 +1,128 @@
+import json
+import os
+
+import pytest
+
+import rules
+from rules import CompiledRules, RuleEngine, RuleError
+
+
+def rule(rule_id, *conditions):
+    return {
+        'id': rule_id,
+        'conditions': [{'field': field, 'op': op, 'value': value} for field, op, value in conditions],
+        'recommendation': {'title': rule_id}
+    }
+
+
+def matched(rules, profile, defaults=None):
+    compiled = CompiledRules({'defaults': defaults or {}, 'rules': rules})
+    return [compiled.rules[index] for index in compiled.match(profile)]
+
+
+@pytest.mark.parametrize('op, threshold, hits', [
+    ('<', 30, [20]),
+    ('<=', 30, [20, 30]),
+    ('>', 30, [40]),
+    ('>=', 30, [30, 40]),
+    ('==', 30, [30]),
+    ('!=', 30, [20, 40]),
+])
+def test_comparison_operators(op, threshold, hits):
+    rules = [rule('r', ('age', op, threshold))]
+    assert [age for age in (20, 30, 40) if matched(rules, {'age': age})] == hits
+
+
+def test_range_thresholds_are_bisected_per_rule():
+    rules = [rule(f'over-{limit}', ('income', '>', limit)) for limit in (100, 500, 300)]
+    assert matched(rules, {'income': 400}) == ['over-100', 'over-300']
+    assert matched(rules, {'income': 500}) == ['over-100', 'over-300']
+    assert matched(rules, {'income': '600'}) == ['over-100', 'over-500', 'over-300']
+    assert matched(rules, {'income': 'unknown'}) == []
+
+
+def test_in_and_not_in():
+    rules = [
+        rule('in', ('riskTolerance', 'in', ['moderate', 'aggressive'])),
+        rule('not-in', ('riskTolerance', 'not_in', ['conservative']))
+    ]
+    assert matched(rules, {'riskTolerance': 'moderate'}) == ['in', 'not-in']
+    assert matched(rules, {'riskTolerance': 'conservative'}) == []
+    assert matched(rules, {'riskTolerance': 'unknown'}) == ['not-in']
+
+
+def test_in_with_repeated_values_matches_once():
+    rules = [rule('dup', ('riskTolerance', 'in', ['moderate', 'moderate', 'aggressive']))]
+    assert matched(rules, {'riskTolerance': 'moderate'}) == ['dup']
+
+
+def test_residual_conditions_must_all_hold():
+    rules = [rule('young-saver', ('age', '<', 30), ('riskTolerance', '==', 'moderate'), ('savings', '>=', 1000))]
+    assert matched(rules, {'age': 25, 'riskTolerance': 'moderate', 'savings': 1000}) == ['young-saver']
+    assert matched(rules, {'age': 25, 'riskTolerance': 'moderate', 'savings': 999}) == []
+    assert matched(rules, {'age': 35, 'riskTolerance': 'moderate', 'savings': 5000}) == []
+
+
+def test_unindexed_rules_and_file_order():
+    rules = [
+        rule('not-conservative', ('riskTolerance', '!=', 'conservative')),
+        rule('young', ('age', '<', 30)),
+        rule('always')
+    ]
+    assert matched(rules, {'age': 20}) == ['not-conservative', 'young', 'always']
+
+
+def test_defaults_fill_missing_and_null_fields():
+    rules = [rule('moderate', ('riskTolerance', '==', 'moderate'))]
+    assert matched(rules, {'riskTolerance': None}, defaults={'riskTolerance': 'moderate'}) == ['moderate']
+    assert matched(rules, {}, defaults={'riskTolerance': 'moderate'}) == ['moderate']
+
+
+def test_unhashable_profile_values_do_not_match_equality():
+    rules = [rule('goal', ('financialGoals', '==', 'retirement'))]
+    assert matched(rules, {'financialGoals': ['retirement']}) == []
+
+
+@pytest.mark.parametrize('rules, message', [
+    ([rule('a'), rule('a')], "Duplicate rule id 'a'"),
+    ([rule('a', ('age', '~', 1))], "Unsupported operator '~'"),
+    ([rule('a', ('age', '>', 'old'))], 'needs a numeric value'),
+])
+def test_invalid_rule_sets_are_rejected(rules, message):
+    with pytest.raises(RuleError, match=message):
+        CompiledRules({'rules': rules})
+
+
+def test_engine_counts_evaluated_and_recorded_hits(tmp_path):
+    path = tmp_path / 'rules.json'
+    path.write_text(json.dumps({'rules': [rule('young', ('age', '<', 30)), rule('old', ('age', '>', 60))]}))
+    engine = RuleEngine(str(path), reload_interval=0)
+
+    assert engine.evaluate({'age': 20}) == [{'title': 'young'}]
+    engine.record_hits(['young', 'removed-rule'])
+    assert engine.stats()['hits'] == {'young': 2, 'old': 0}
+
+
+@pytest.mark.parametrize('bad_rule', [
+    {'id': 'no-recommendation', 'conditions': []},
+    {'id': 'no-op', 'conditions': [{'field': 'age', 'value': 1}], 'recommendation': {}},
+    {'id': 'no-field', 'conditions': [{'op': '==', 'value': 1}], 'recommendation': {}},
+    {'id': 'in-scalar', 'conditions': [{'field': 'age', 'op': 'in', 'value': 30}], 'recommendation': {}},
+    {'id': 'unhashable', 'conditions': [{'field': 'age', 'op': '==', 'value': [30]}], 'recommendation': {}},
+    'not-a-rule',
+])
+def test_malformed_reload_keeps_the_last_good_rules(tmp_path, monkeypatch, bad_rule):
+    path = tmp_path / 'rules.json'
+    path.write_text(json.dumps({'rules': [rule('young', ('age', '<', 30))]}))
+    engine = RuleEngine(str(path), reload_interval=0)
+
+    path.write_text(json.dumps({'rules': [bad_rule]}))
+    stat = os.stat(path)
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10 ** 9))
+    loads = []
+    load_file = rules._load_file
+    monkeypatch.setattr(rules, '_load_file', lambda name: loads.append(name) or load_file(name))
+
+    for _ in range(2):
+        assert engine.evaluate({'age': 20}) == [{'title': 'young'}]
+    assert len(loads) == 1  # the bad file is parsed once, not on every request
@@ -0,0 +1,116 @@
+import pytest
+from flask import Flask
+
+import schemas
+from schemas import Field, Schema
+
+
+def check(schema, body):
+    errors = []
+    cleaned = schema.compile()(body, '', errors)
+    return cleaned, errors
+
+
+@pytest.mark.parametrize('kind, raw, expected', [
+    ('number', '12.5', 12.5),
+    ('number', 7, 7),
+    ('integer', '42', 42),
+    ('integer', 42.0, 42),
+    ('string', 123, '123'),
+    ('boolean', 'true', True),
+])
+def test_lenient_coercion(kind, raw, expected):
+    cleaned, errors = check(Schema({'value': Field(kind)}), {'value': raw})
+    assert errors == []
+    assert cleaned['value'] == expected
+    assert type(cleaned['value']) is type(expected)
+
+
+@pytest.mark.parametrize('field, raw, message', [
+    (Field('number'), 'abc', 'must be a number'),
+    (Field('number'), True, 'must be a number'),
+    (Field('number'), 'nan', 'must be a finite number'),
+    (Field('integer'), 2.5, 'must be an integer'),
+    (Field('boolean'), 'yes', 'must be a boolean'),
+    (Field('object'), [], 'must be an object'),
+    (Field('number', minimum=0), -1, 'must be at least 0'),
+    (Field('number', greater_than=0), 0, 'must be greater than 0'),
+    (Field('integer', maximum=10), 11, 'must be at most 10'),
+    (Field('string', choices=('a', 'b')), 'c', 'must be one of: a, b'),
+    (Field('string', max_length=3), 'abcd', 'must be at most 3 characters'),
+    (Field('string', pattern='[0-9]+'), '12a', 'has an invalid format'),
+    (Field('list', min_items=1), [], 'must have at least 1 item(s)'),
+    (Field('list', max_items=1), [1, 2], 'must have at most 1 items'),
+])
+def test_rejections(field, raw, message):
+    _, errors = check(Schema({'value': field}), {'value': raw})
+    assert errors == [{'field': 'value', 'message': message}]
+
+
+def test_missing_null_and_default_fields():
+    schema = Schema({
+        'required': Field('string', required=True),
+        'optional': Field('number'),
+        'defaulted': Field('list', default=list)
+    })
+    cleaned, errors = check(schema, {'required': '', 'optional': None, 'extra': 1})
+    assert errors == [{'field': 'required', 'message': 'is required'}]
+    assert cleaned == {'defaulted': [], 'extra': 1}
+
+
+def test_blank_optional_fields_count_as_absent():
+    schema = Schema({
+        'amount': Field('number', minimum=0),
+        'goals': Field('list', default=list)
+    })
+    cleaned, errors = check(schema, {'amount': '', 'goals': ''})
+    assert errors == []
+    assert cleaned == {'goals': []}
+
+
+def test_lower_runs_after_coercion():
+    cleaned, errors = check(Schema({'type': Field('string', lower=True)}), {'type': 'Mutual Fund'})
+    assert errors == [] and cleaned['type'] == 'mutual fund'
+
+
+def test_nested_paths_and_every_error_reported():
+    cleaned, errors = check(schemas.POLICY_IMPORT, {'policies': [
+        {'policy_type': 'term', 'coverage_amount': '1000000', 'term': '20'},
+        {'policy_type': 'term', 'coverage_amount': 0}
+    ]})
+    assert cleaned['policies'][0] == {'policy_type': 'term', 'coverage_amount': 1000000.0, 'term': 20}
+    assert errors == [
+        {'field': 'policies[1].coverage_amount', 'message': 'must be greater than 0'},
+        {'field': 'policies[1].term', 'message': 'is required'}
+    ]
+
+
+@pytest.fixture
+def client():
+    app = Flask(__name__)
+
+    @app.route('/invest', methods=['POST'])
+    @schemas.validate(schemas.INVESTMENT_ANALYSIS)
+    def invest(data):
+        return {'data': data}
+
+    return app.test_client()
+
+
+def test_validate_passes_cleaned_body_to_view(client):
+    response = client.post('/invest', json={'investment_details': {'type': 'SIP', 'amount': '5000', 'duration': 'Long'}})
+    assert response.status_code == 200
+    assert response.get_json()['data'] == {
+        'investment_details': {'type': 'sip', 'amount': 5000.0, 'duration': 'long'},
+        'user_profile': {}
+    }
+
+
+def test_validate_rejects_with_400(client):
+    response = client.post('/invest', json={'investment_details': {'type': 'sip', 'amount': -5, 'duration': 'long'}})
+    assert response.status_code == 400
+    assert response.get_json()['error'] == 'investment_details.amount must be greater than 0'
+
+    response = client.post('/invest', data='[1, 2]', content_type='application/json')
+    assert response.status_code == 400
+    assert response.get_json()['details'] == [{'field': 'body', 'message': 'must be a JSON object'}]
@@ -0,0 +1,281 @@
+"""
+Deterministic, table-driven underwriting.
+
+Premium rates come from `data/rate_tables.json` (or `RATE_TABLES_PATH`):
+a base rate per policy type, age band and coverage band, scaled by a term
+factor and by loadings for smoking, declared health conditions and
+hazardous occupations. Tables are loaded once per process and age/term
+bands are precomputed into lookup lists, so a quote is a handful of list
+indexes and multiplications - the same inputs always give the same quote.
+
+`premium_rate` is the annual premium as a percentage of coverage.
+"""
+
+import json
+import os
+from bisect import bisect_right
+
+RATE_TABLES_PATH = os.getenv(
+    'RATE_TABLES_PATH',
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data', 'rate_tables.json')
+)
+
+MAX_AGE = 120
+MAX_TERM = 100
+MAX_BATCH_SIZE = 1000
+MAX_GRID_CELLS = 5000
+
+SMOKER_VALUES = {'smoker', 'yes', 'true', 'regular', 'occasional'}
+
+
+def _band_lookup(bounds, upper):
+    """Precompute band index for every integer 0..upper (-1 below the first bound)"""
+    return [bisect_right(bounds, value) - 1 for value in range(upper + 1)]
+
+
+def _band_label(bounds, index):
+    low = bounds[index]
+    return f"{low}+" if index == len(bounds) - 1 else f"{low}-{bounds[index + 1] - 1}"
+
+
+def grid_axis(spec):
+    """Expand a grid axis given as a list of values or {'start', 'stop', 'step'} (stop inclusive)"""
+    if isinstance(spec, list):
+        return [float(value) for value in spec]
+    if not isinstance(spec, dict):
+        raise ValueError('grid axis must be a list or a {start, stop, step} range')
+    start, stop = float(spec['start']), float(spec['stop'])
+    step = float(spec.get('step') or (stop - start) or 1)
+    if step <= 0 or stop < start:
+        raise ValueError('grid range needs start <= stop and a positive step')
+    count = int((stop - start) / step + 1e-9) + 1
+    if count > MAX_GRID_CELLS:
+        raise ValueError(f'grid axis has more than {MAX_GRID_CELLS} values')
+    return [start + step * index for index in range(count)]
+
+
+class UnderwritingEngine:
+    """Rate-table underwriting engine; build once and reuse"""
+
+    def __init__(self, tables):
+        self.version = tables.get('version', 'unversioned')
+        self.age_bands = tables['age_bands']
+        self.coverage_bands = tables['coverage_bands']
+        self.term_bands = tables['term_bands']
+        self.term_factors = tables['term_factors']
+        self.policy_types = tables['policy_types']
+        self.default_type = tables['default_type']
+        self.type_aliases = tables.get('type_aliases', {})
+        self.age_band_risk = tables['age_band_risk']
+        self.loadings = tables['risk_loadings']
+        self.max_health_conditions = tables['max_health_conditions']
+        self.hazardous_occupations = tuple(tables['hazardous_occupations'])
+        self.risk_levels = tables['risk_levels']
+
+        self._age_band = _band_lookup(self.age_bands, MAX_AGE)
+        self._term_band = _band_lookup(self.term_bands, MAX_TERM)
+        self._rate_arrays = {}
+
+    @classmethod
+    def from_file(cls, path=RATE_TABLES_PATH):
+        with open(path, encoding='utf-8') as f:
+            return cls(json.load(f))
+
+    def policy_type(self, raw_type):
+        """Map a free-form policy type ("Term", "term_insurance", ...) to a rate table"""
+        key = str(raw_type or '').strip().lower()
+        key = self.type_aliases.get(key, key)
+        return key if key in self.policy_types else self.default_type
+
+    def age_band(self, age):
+        return self._age_band[min(max(age, 0), MAX_AGE)]
+
+    def coverage_band(self, coverage):
+        return max(bisect_right(self.coverage_bands, coverage) - 1, 0)
+
+    def term_factor(self, term):
+        return self.term_factors[max(self._term_band[min(max(term, 0), MAX_TERM)], 0)]
+
+    def risk_loading(self, user_profile):
+        """Return (loading multiplier, notes, health condition count) for an applicant"""
+        loading = 1.0
+        notes = []
+
+        smoking = user_profile.get('smoking_status', user_profile.get('smoker', ''))
+        if smoking is True or str(smoking).strip().lower() in SMOKER_VALUES:
+            loading *= self.loadings['smoker']
+            notes.append(f"Smoker loading x{self.loadings['smoker']}")
+
+        conditions = user_profile.get('health_conditions') or []
+        if isinstance(conditions, str):
+            conditions = [conditions]
+        counted = min(len(conditions), self.max_health_conditions)
+        if counted:
+            loading *= self.loadings['health_condition'] ** counted
+            notes.append(f"{len(conditions)} declared health condition(s) loading x{self.loadings['health_condition']} each")
+
+        occupation = str(user_profile.get('occupation', '')).lower().replace('_', ' ')
+        if occupation and any(keyword in occupation for keyword in self.hazardous_occupations):
+            loading *= self.loadings['hazardous_occupation']
+            notes.append(f"Hazardous occupation loading x{self.loadings['hazardous_occupation']}")
+
+        return loading, notes, len(conditions)
+
+    def risk_assessment(self, age_band, loading):
+        points = self.age_band_risk[age_band] + round((loading - 1.0) / 0.25)
+        if points <= self.risk_levels['low']:
+            return 'low'
+        if points <= self.risk_levels['medium']:
+            return 'medium'
+        return 'high'
+
+    def quote(self, policy_data, user_profile=None):
+        """Underwrite one application; raises ValueError on non-numeric input"""
+        user_profile = user_profile or {}
+        policy_type = self.policy_type(policy_data.get('policy_type'))
+        table = self.policy_types[policy_type]
+
+        age = int(policy_data.get('applicant_age', user_profile.get('age', 30)))
+        coverage = float(policy_data.get('coverage_amount', 1000000))
+        term = int(policy_data.get('term', 20))
+        income = float(user_profile.get('income', 0) or 0)
+
+        analysis = []
+        recommendations = []
+        decision = 'approved'
+
+        age_band = self.age_band(age)
+        if age_band < 0 or age > table['max_entry_age']:
+            return self._declined(policy_type, f"Applicant age {age} is outside the entry age range "
+                                               f"{self.age_bands[0]}-{table['max_entry_age']}")
+        if age + term > table['max_maturity_age']:
+            return self._declined(policy_type, f"Policy would mature at age {age + term}, above "
+                                               f"the maximum of {table['max_maturity_age']}")
+
+        coverage_band = self.coverage_band(coverage)
+        base_rate = table['rates'][age_band][coverage_band]
+        term_factor = self.term_factor(term)
+        loading, loading_notes, condition_count = self.risk_loading(user_profile)
+
+        premium_rate = base_rate * term_factor * loading
+        analysis.append(f"Age band {_band_label(self.age_bands, age_band)}, coverage band "
+                        f"{_band_label(self.coverage_bands, coverage_band)}: base rate {base_rate}%")
+        analysis.append(f"Term of {term} years: factor x{term_factor}")
+        analysis.extend(loading_notes)
+
+        max_multiple = table.get('max_income_multiple')
+        if max_multiple and income > 0 and coverage > income * max_multiple:
+            decision = 'referred'
+            analysis.append(f"Coverage exceeds {max_multiple}x annual income")
+            recommendations.append(f"Reduce coverage to at most {income * max_multiple:,.0f} or provide income proof")
+        if condition_count > self.max_health_conditions:
+            decision = 'referred'
+            recommendations.append('Medical examination required before approval')
+
+        risk_assessment = self.risk_assessment(age_band, loading)
+        if decision == 'approved':
+            recommendations.append('Standard underwriting approved' if loading == 1.0
+                                   else 'Approved with risk loading applied')
+
+        return {
+            'risk_assessment': risk_assessment,
+            'premium_rate': round(premium_rate, 4),
+            'annual_premium': round(coverage * premium_rate / 100, 2),
+            'coverage_approved': decision == 'approved',
+            'decision': decision,
+            'policy_type': policy_type,
+            'ai_analysis': analysis,
+            'recommendations': recommendations,
+            'rate_table_version': self.version
+        }
+
+    def quote_many(self, applicants):
+        """Underwrite a batch of {'policy_data', 'user_profile'} applications"""
+        return [self.quote(item.get('policy_data', {}), item.get('user_profile', {})) for item in applicants]
+
+    def quote_grid(self, policy_data, user_profile, coverages, terms):
+        """Quote every (coverage, term) pair for one applicant in a single vectorized pass
+
+        Returns row-per-coverage, column-per-term matrices; cells that are not
+        available (policy would mature past the maximum age) are None.
+        """
+        import numpy as np
+
+        user_profile = user_profile or {}
+        policy_type = self.policy_type(policy_data.get('policy_type'))
+        table = self.policy_types[policy_type]
+        age = int(policy_data.get('applicant_age', user_profile.get('age', 30)))
+        income = float(user_profile.get('income', 0) or 0)
+
+        age_band = self.age_band(age)
+        if age_band < 0 or age > table['max_entry_age']:
+            declined = self._declined(policy_type, f"Applicant age {age} is outside the entry age range "
+                                                   f"{self.age_bands[0]}-{table['max_entry_age']}")
+            declined.update({'coverages': list(coverages), 'terms': list(terms)})
+            return declined
+
+        coverage_values = np.asarray(coverages, dtype=float)
+        term_values = np.asarray(terms, dtype=int)
+
+        rates = self._rate_arrays.get(policy_type)
+        if rates is None:
+            rates = self._rate_arrays[policy_type] = np.asarray(table['rates'], dtype=float)
+        coverage_index = np.clip(np.searchsorted(self.coverage_bands, coverage_values, side='right') - 1, 0, None)
+        term_index = np.clip(np.searchsorted(self.term_bands, np.clip(term_values, 0, MAX_TERM), side='right') - 1, 0, None)
+        loading, loading_notes, condition_count = self.risk_loading(user_profile)
+
+        # (coverages x terms) premium rate matrix
+        premium_rate = np.outer(rates[age_band, coverage_index],
+                                np.asarray(self.term_factors, dtype=float)[term_index]) * loading
+        annual_premium = premium_rate * coverage_values[:, None] / 100
+        available_terms = (age + term_values) <= table['max_maturity_age']
+
+        max_multiple = table.get('max_income_multiple')
+        if max_multiple and income > 0:
+            referred = coverage_values > income * max_multiple
+        else:
+            referred = np.zeros(len(coverage_values), dtype=bool)
+        if condition_count > self.max_health_conditions:
+            referred[:] = True
+
+        def _matrix(values, decimals):
+            rounded = np.round(values, decimals).tolist()
+            available = available_terms.tolist()
+            return [[cell if available[column] else None for column, cell in enumerate(row)]
+                    for row in rounded]
+
+        return {
+            'risk_assessment': self.risk_assessment(age_band, loading),
+            'policy_type': policy_type,
+            'coverages': coverage_values.tolist(),
+            'terms': term_values.tolist(),
+            'premium_rate': _matrix(premium_rate, 4),
+            'annual_premium': _matrix(annual_premium, 2),
+            'referred': referred.tolist(),
+            'ai_analysis': loading_notes,
+            'rate_table_version': self.version
+        }
+
+    def _declined(self, policy_type, reason):
+        return {
+            'risk_assessment': 'high',
+            'premium_rate': None,
+            'annual_premium': None,
+            'coverage_approved': False,
+            'decision': 'declined',
+            'policy_type': policy_type,
+            'ai_analysis': [reason],
+            'recommendations': ['Application cannot be accepted on standard terms'],
+            'rate_table_version': self.version
+        }
+
+
+_engine = None
+
+
+def get_engine():
+    """Return the process-wide engine, loading rate tables on first use"""
+    global _engine
+    if _engine is None:
+        _engine = UnderwritingEngine.from_file()
+    return _engine